@@ -1,7 +1,114 @@
-# requirements.txt
-Flask
-numpy
-pandas
-sqlite3
-tempfile
-```
\ No newline at end of file
+import os
+import time
+
+# Set by gunicorn.conf.py when the master starts; otherwise this import is the start
+BOOT_STARTED = float(os.environ.get('APP_BOOT_STARTED') or time.time())
+
+import logging
+import threading
+
+from flask import Flask, jsonify
+
+from config import Config
+from utils.database_utils import database_fingerprint, pool
+from utils.metrics import metrics
+from utils.profiling import profiler
+from utils.reports import reports
+from utils.uploads import uploads
+
+log = logging.getLogger('app.boot')
+
+
+def recent_databases(folder, limit):
+    """The most recently used uploaded databases, newest first"""
+    try:
+        entries = [entry for entry in os.scandir(folder) if entry.name.endswith('.db') and entry.is_file()]
+    except OSError:
+        return []
+    entries.sort(key=lambda entry: max(entry.stat().st_atime, entry.stat().st_mtime), reverse=True)
+    return [entry.path for entry in entries[:limit]]
+
+
+def warm_caches(app, limit=None):
+    """Load the analytics datasets of recently used databases before serving.
+
+    Run in the gunicorn master with preload, the datasets are inherited by
+    every worker. SQLite connections must not cross a fork, so the pooled
+    connections opened here are closed again. Returns the warmed paths.
+    """
+    limit = app.config['WARM_DATABASES'] if limit is None else limit
+    # Deferred: pandas is only imported when there is something to warm
+    paths = recent_databases(app.config['UPLOAD_FOLDER'], limit)
+    if paths:
+        from utils.analytics import get_sales_data
+    warmed = []
+    for path in paths:
+        start = time.perf_counter()
+        try:
+            get_sales_data(path)
+        except Exception as e:
+            log.warning("Could not warm %s: %s", path, e)
+            continue
+        warmed.append(path)
+        log.info("Warmed %s (%s) in %.2fs", os.path.basename(path), database_fingerprint(path)[:8],
+                 time.perf_counter() - start)
+    pool.close_all()
+    return warmed
+
+
+def create_app(config_class=Config):
+    """Application factory: config, profiling, blueprints and boot timing"""
+    app = Flask(__name__)
+    app.config.from_object(config_class)
+    gunicorn_log = logging.getLogger('gunicorn.error')
+    if gunicorn_log.handlers:
+        # Under gunicorn, boot and warm-up timings go to its error log
+        log.handlers = gunicorn_log.handlers
+        log.setLevel(gunicorn_log.level)
+    os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+
+    if app.config['SQL_PROFILING']:
+        profiler.enable(app.config['SLOW_QUERY_SECONDS'], app.config['SLOW_QUERY_LOG'])
+
+    app.register_blueprint(uploads)
+    app.register_blueprint(reports)
+    app.register_blueprint(metrics)
+
+    boot = app.extensions['boot'] = {
+        'started': BOOT_STARTED,
+        'app_ready_seconds': None,
+        'warmed': [],
+        'first_response_seconds': None,
+        'pid': None,
+    }
+    first_response = threading.Lock()
+
+    @app.after_request
+    def record_first_response(response):
+        # Each worker reports its own first response, measured from master start
+        if boot['pid'] != os.getpid() and first_response.acquire(blocking=False):
+            try:
+                if boot['pid'] != os.getpid():
+                    boot['pid'] = os.getpid()
+                    boot['first_response_seconds'] = time.time() - BOOT_STARTED
+                    log.info("Worker %d first response %.2fs after boot", boot['pid'],
+                             boot['first_response_seconds'])
+            finally:
+                first_response.release()
+        return response
+
+    @app.route('/healthz')
+    def healthz():
+        return jsonify(status='ok', pid=os.getpid(), **{key: value for key, value in boot.items() if key != 'pid'})
+
+    if app.config['WARM_CACHES']:
+        boot['warmed'] = warm_caches(app)
+    boot['app_ready_seconds'] = time.time() - BOOT_STARTED
+    log.info("App ready %.2fs after boot (%d databases warmed)", boot['app_ready_seconds'], len(boot['warmed']))
+    return app
+
+
+if __name__ == '__main__':
+    # Development server; production runs `gunicorn wsgi:app` (see gunicorn.conf.py)
+    logging.basicConfig(level=logging.INFO)
+    create_app().run(host='0.0.0.0', port=int(os.environ.get('PORT', 5000)))
@@ -1,24 +1,170 @@
-import sqlite3
-import os
-import shutil
-from datetime import datetime
-
-def backup_database():
-    """Create a backup of the database"""
-    if not os.path.exists('database/picknpay.db'):
-        print("Database file not found")
-        return
-    
-    # Create backups directory
-    os.makedirs('database/backups', exist_ok=True)
-    
-    # Create timestamped backup
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    backup_file = f'database/backups/picknpay_backup_{timestamp}.db'
-    
-    # Copy database file
-    shutil.copy2('database/picknpay.db', backup_file)
-    print(f"Database backed up to: {backup_file}")
-
-if __name__ == '__main__':
-    backup_database()
\ No newline at end of file
+import sqlite3
+import argparse
+import os
+import re
+import shutil
+import threading
+import time
+from datetime import datetime
+
+from export_to_sql import COMPRESSION_SUFFIXES, open_output
+
+DB_PATH = 'database/picknpay.db'
+BACKUP_DIR = 'database/backups'
+
+PAGES_PER_STEP = 256    # pages copied per backup step
+STEP_SLEEP = 0.01       # seconds to pause between steps so other connections get I/O
+KEEP_HOURLY = 24
+KEEP_DAILY = 30
+
+BACKUP_NAME_RE = re.compile(r'^picknpay_backup_(\d{8}_\d{6})\.db(\.gz|\.zst)?$')
+
+
+def online_backup(db_path, backup_path, pages=PAGES_PER_STEP, sleep=STEP_SLEEP):
+    """Copy a live database with the SQLite backup API.
+
+    Pages are copied in steps of `pages`, pausing `sleep` seconds between
+    steps, and the copy is a consistent snapshot even if the database is
+    written meanwhile.
+    """
+    def pause(status, remaining, total):
+        if remaining:
+            time.sleep(sleep)
+
+    source = sqlite3.connect(f'file:{os.path.abspath(db_path)}?mode=ro', uri=True)
+    target = sqlite3.connect(backup_path)
+    try:
+        source.backup(target, pages=pages, progress=pause)
+    finally:
+        target.close()
+        source.close()
+
+
+def check_integrity(db_path):
+    """Return True if PRAGMA integrity_check reports ok"""
+    conn = sqlite3.connect(f'file:{os.path.abspath(db_path)}?mode=ro', uri=True)
+    try:
+        result = conn.execute('PRAGMA integrity_check').fetchall()
+    finally:
+        conn.close()
+    return result == [('ok',)]
+
+
+def compress_file(path, output_path, compression):
+    """Stream a file into a compressed copy"""
+    with open(path, 'rb') as source, open_output(output_path, compression, 'wb') as target:
+        shutil.copyfileobj(source, target, 1024 * 1024)
+
+
+def list_backups(backup_dir=BACKUP_DIR):
+    """Return [(datetime, path)] for full backups, newest first"""
+    if not os.path.isdir(backup_dir):
+        return []
+    backups = []
+    for name in os.listdir(backup_dir):
+        match = BACKUP_NAME_RE.match(name)
+        if match:
+            taken = datetime.strptime(match.group(1), '%Y%m%d_%H%M%S')
+            backups.append((taken, os.path.join(backup_dir, name)))
+    return sorted(backups, reverse=True)
+
+
+def apply_retention(backup_dir=BACKUP_DIR, keep_hourly=KEEP_HOURLY, keep_daily=KEEP_DAILY):
+    """Delete backups outside the retention policy.
+
+    The newest backup of each of the last `keep_hourly` hours and of each
+    of the last `keep_daily` days is kept. Returns the deleted paths.
+    """
+    backups = list_backups(backup_dir)
+    keep = set(path for _, path in backups[:1])
+    for bucket_format, limit in (('%Y%m%d%H', keep_hourly), ('%Y%m%d', keep_daily)):
+        seen = []
+        for taken, path in backups:
+            bucket = taken.strftime(bucket_format)
+            if bucket not in seen:
+                if len(seen) >= limit:
+                    break
+                seen.append(bucket)
+                keep.add(path)
+
+    deleted = []
+    for _, path in backups:
+        if path not in keep:
+            os.remove(path)
+            deleted.append(path)
+    return deleted
+
+
+def backup_database(db_path=DB_PATH, backup_dir=BACKUP_DIR, compression='gzip',
+                    pages=PAGES_PER_STEP, sleep=STEP_SLEEP,
+                    keep_hourly=KEEP_HOURLY, keep_daily=KEEP_DAILY):
+    """Create a backup of the database
+
+    The live database is copied with the online backup API, checked with
+    PRAGMA integrity_check, compressed and then the retention policy is
+    applied. Returns the backup path, or None if it failed.
+    """
+    if not os.path.exists(db_path):
+        print("Database file not found")
+        return
+
+    # Create backups directory
+    os.makedirs(backup_dir, exist_ok=True)
+
+    # Create timestamped backup
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    backup_file = os.path.join(backup_dir, f'picknpay_backup_{timestamp}.db')
+    tmp_file = backup_file + '.tmp'
+
+    try:
+        online_backup(db_path, tmp_file, pages, sleep)
+        if not check_integrity(tmp_file):
+            print(f"Integrity check failed, backup discarded: {backup_file}")
+            return
+
+        backup_file += COMPRESSION_SUFFIXES[compression]
+        if compression:
+            compress_file(tmp_file, backup_file + '.part', compression)
+            os.replace(backup_file + '.part', backup_file)
+        else:
+            os.replace(tmp_file, backup_file)
+    finally:
+        for leftover in (tmp_file, backup_file + '.part'):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+
+    print(f"Database backed up to: {backup_file}")
+    for path in apply_retention(backup_dir, keep_hourly, keep_daily):
+        print(f"Removed old backup: {path}")
+    return backup_file
+
+
+def start_backup_schedule(interval_seconds=3600, **backup_options):
+    """Run backup_database every interval_seconds in a daemon thread.
+
+    Returns an Event; set it to stop the schedule.
+    """
+    stop = threading.Event()
+
+    def run():
+        while not stop.wait(interval_seconds):
+            try:
+                backup_database(**backup_options)
+            except Exception as e:
+                print(f"Scheduled backup failed: {e}")
+
+    threading.Thread(target=run, name='database-backup', daemon=True).start()
+    return stop
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Back up the database')
+    parser.add_argument('--db', default=DB_PATH, help='database file to back up')
+    parser.add_argument('--backup-dir', default=BACKUP_DIR, help='directory for backups')
+    parser.add_argument('--compress', choices=['gzip', 'zstd', 'none'], default='gzip')
+    parser.add_argument('--pages', type=int, default=PAGES_PER_STEP, help='pages copied per step')
+    parser.add_argument('--sleep', type=float, default=STEP_SLEEP, help='seconds between steps')
+    parser.add_argument('--keep-hourly', type=int, default=KEEP_HOURLY)
+    parser.add_argument('--keep-daily', type=int, default=KEEP_DAILY)
+    args = parser.parse_args()
+    backup_database(args.db, args.backup_dir, None if args.compress == 'none' else args.compress,
+                    args.pages, args.sleep, args.keep_hourly, args.keep_daily)
@@ -0,0 +1,232 @@
+import argparse
+import contextlib
+import io
+import json
+import math
+import multiprocessing
+import os
+import platform
+import resource
+import shutil
+import sqlite3
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+
+BENCH_DIR = 'database/benchmarks'
+BASELINE_PATH = os.path.join(BENCH_DIR, 'baseline.json')
+SCALES = {'10k': 10_000, '100k': 100_000, '1m': 1_000_000, '10m': 10_000_000}
+DEFAULT_SCALES = ['10k', '100k']
+TOLERANCE = 0.20                        # slowdown (or RSS growth) flagged as a regression
+# Differences below these are timer or allocator noise, never regressions
+MIN_DIFFERENCE = {'wall_seconds': 0.05, 'peak_rss_mb': 5.0}
+SEED = 42
+
+VIEWS = ['Customer_Purchase_Summary', 'Product_Sales_Performance',
+         'Monthly_Sales_Analysis', 'Seasonal_Product_Performance']
+INIT_DB_PER_DAY = 75                    # mean of init_db.py's 50-100 transactions a day
+
+
+def count_rows(db_path, table):
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+    finally:
+        conn.close()
+
+
+def total_rows(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        tables = [name for (name,) in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite\\_%' ESCAPE '\\'")]
+        return sum(conn.execute(f'SELECT COUNT(*) FROM "{name}"').fetchone()[0] for name in tables)
+    finally:
+        conn.close()
+
+
+def generator_stores(transactions):
+    """Stores needed for create_picknpay_db.py to produce about `transactions` rows"""
+    import create_picknpay_db as gen
+    days = [gen.START_DATE + timedelta(days=i) for i in range((gen.END_DATE - gen.START_DATE).days + 1)]
+    per_store = sum((low + high) / 2 * factor for low, high, factor in map(gen.daily_traffic, days))
+    return max(1, math.ceil(transactions * gen.REFERENCE_STORES / per_store))
+
+
+# Benchmark cases. Each runs in a fresh process and returns the number of
+# rows it processed; wall time and peak RSS are measured around it.
+
+def case_generator(scale, paths):
+    from create_picknpay_db import create_database
+    create_database(paths['picknpay'], seed=SEED, n_stores=generator_stores(scale),
+                    n_customers=max(1000, scale // 20))
+    return count_rows(paths['picknpay'], 'Transactions')
+
+
+def case_init_db(scale, paths):
+    from init_db import init_database
+    init_database(seed=SEED, end_date=datetime(2025, 9, 30), db_path=paths['init_db'],
+                  n_days=max(1, round(scale / INIT_DB_PER_DAY)))
+    return count_rows(paths['init_db'], 'transactions')
+
+
+def case_view(view):
+    def run(scale, paths):
+        conn = sqlite3.connect(paths['picknpay'])
+        try:
+            rows = 0
+            cursor = conn.execute(f'SELECT * FROM {view}')
+            while True:
+                batch = cursor.fetchmany(10_000)
+                if not batch:
+                    return rows
+                rows += len(batch)
+        finally:
+            conn.close()
+    return run
+
+
+def case_export(scale, paths):
+    from export_to_sql import export_database_to_sql
+    export_database_to_sql(paths['picknpay'], paths['export'])
+    return total_rows(paths['picknpay'])
+
+
+def case_backup(scale, paths):
+    from backup_database import backup_database
+    backup_database(paths['picknpay'], paths['backups'], compression='gzip', sleep=0)
+    return total_rows(paths['picknpay'])
+
+
+CASES = [('init_database', case_init_db), ('create_picknpay_db', case_generator)] + \
+        [(f'view:{view}', case_view(view)) for view in VIEWS] + \
+        [('export_database_to_sql', case_export), ('backup_database', case_backup)]
+
+
+def _run_case(name, scale, paths):
+    """Child process body: run one case with its output silenced"""
+    case = dict(CASES)[name]
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        rows = case(scale, paths)
+        wall = time.perf_counter() - start
+    # ru_maxrss is in KiB on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    peak_mb = peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+    return {'rows': rows, 'wall_seconds': wall, 'peak_rss_mb': peak_mb}
+
+
+def run_case(name, scale, paths):
+    """Run a case in a fresh spawned process, so peak RSS is its own"""
+    with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context('spawn')) as executor:
+        result = executor.submit(_run_case, name, scale, paths).result()
+    result['rows_per_second'] = result['rows'] / result['wall_seconds'] if result['wall_seconds'] else None
+    return result
+
+
+def fixture_paths(label, work_dir):
+    return {
+        'picknpay': os.path.join(work_dir, f'picknpay_{label}.db'),
+        'init_db': os.path.join(work_dir, f'init_db_{label}.db'),
+        'export': os.path.join(work_dir, f'picknpay_{label}.sql'),
+        'backups': os.path.join(work_dir, f'backups_{label}'),
+    }
+
+
+def run_benchmarks(scales=DEFAULT_SCALES, cases=None, work_dir=BENCH_DIR, reuse=False):
+    """Run the selected cases at each scale and return the results document.
+
+    The generator case builds the fixture the view, export and backup cases
+    read; with reuse=True an existing fixture is kept and the generator is
+    not timed again.
+    """
+    os.makedirs(work_dir, exist_ok=True)
+    selected = [name for name, _ in CASES if not cases or any(name.startswith(c) for c in cases)]
+    results = []
+    for label in scales:
+        scale = SCALES[label]
+        paths = fixture_paths(label, work_dir)
+        for name in selected:
+            if name == 'create_picknpay_db' and reuse and os.path.exists(paths['picknpay']):
+                continue
+            if name not in ('init_database', 'create_picknpay_db') and not os.path.exists(paths['picknpay']):
+                run_case('create_picknpay_db', scale, paths)
+            result = run_case(name, scale, paths)
+            result.update(case=name, scale=label)
+            results.append(result)
+            rate = f"{result['rows_per_second']:,.0f} rows/s" if result['rows_per_second'] else ''
+            print(f"⏱️  {label:>5} {name:<45} {result['wall_seconds']:8.2f}s {rate:>18} "
+                  f"{result['peak_rss_mb']:8.1f} MB")
+        for leftover in (paths['export'], paths['backups'], paths['init_db']):
+            if os.path.isdir(leftover):
+                shutil.rmtree(leftover)
+            elif os.path.exists(leftover):
+                os.remove(leftover)
+
+    return {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'results': results,
+    }
+
+
+def compare(report, baseline, tolerance=TOLERANCE):
+    """Results that are slower or use more memory than the baseline beyond tolerance"""
+    previous = {(r['case'], r['scale']): r for r in baseline.get('results', [])}
+    regressions = []
+    for result in report['results']:
+        base = previous.get((result['case'], result['scale']))
+        if base is None:
+            continue
+        for metric in ('wall_seconds', 'peak_rss_mb'):
+            if (base[metric] and result[metric] > base[metric] * (1 + tolerance)
+                    and result[metric] - base[metric] > MIN_DIFFERENCE[metric]):
+                regressions.append({
+                    'case': result['case'], 'scale': result['scale'], 'metric': metric,
+                    'baseline': base[metric], 'current': result[metric],
+                    'change': result[metric] / base[metric] - 1,
+                })
+    return regressions
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the generators, views, export and backup')
+    parser.add_argument('--scales', default=','.join(DEFAULT_SCALES),
+                        help=f"comma-separated transaction scales ({', '.join(SCALES)})")
+    parser.add_argument('--cases', help='comma-separated case name prefixes, e.g. view,export')
+    parser.add_argument('--output', help='results JSON (default: database/benchmarks/results_<time>.json)')
+    parser.add_argument('--baseline', default=BASELINE_PATH, help='baseline JSON to compare against')
+    parser.add_argument('--save-baseline', action='store_true', help='store these results as the baseline')
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE, help='allowed slowdown, e.g. 0.2 for 20%%')
+    parser.add_argument('--reuse', action='store_true', help='reuse existing fixture databases')
+    args = parser.parse_args()
+
+    scales = [label.strip().lower() for label in args.scales.split(',')]
+    unknown = [label for label in scales if label not in SCALES]
+    if unknown:
+        parser.error(f"unknown scale: {', '.join(unknown)}")
+
+    report = run_benchmarks(scales, args.cases.split(',') if args.cases else None, reuse=args.reuse)
+    output = args.output or os.path.join(BENCH_DIR, f"results_{datetime.now():%Y%m%d_%H%M%S}.json")
+    with open(output, 'w', encoding='utf-8') as results_file:
+        json.dump(report, results_file, indent=2)
+    print(f"📄 Results written to {output}")
+
+    status = 0
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as baseline_file:
+            json.dump(report, baseline_file, indent=2)
+        print(f"📌 Baseline saved to {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline, encoding='utf-8') as baseline_file:
+            regressions = compare(report, json.load(baseline_file), args.tolerance)
+        for r in regressions:
+            print(f"❌ {r['scale']} {r['case']}: {r['metric']} {r['baseline']:.2f} -> {r['current']:.2f} "
+                  f"(+{r['change']:.0%})")
+        if not regressions:
+            print("✅ No regressions against the baseline")
+        status = 1 if regressions else 0
+    sys.exit(status)
@@ -1,4 +1,20 @@
+import os
+
+
 class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'your_default_secret_key'
     UPLOAD_FOLDER = os.environ.get('UPLOAD_FOLDER') or 'uploads'
-    MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16 MB limit for uploaded files
\ No newline at end of file
+    # Uploads are streamed to disk in chunks, so this only bounds disk use
+    MAX_CONTENT_LENGTH = int(os.environ.get('MAX_CONTENT_LENGTH') or 4 * 1024 * 1024 * 1024)  # 4 GB limit for uploaded files
+    UPLOAD_CHUNK_SIZE = 1024 * 1024  # bytes read from the request at a time
+    # Resumable uploads with no new chunk for this long are removed
+    UPLOAD_PARTIAL_TTL = int(os.environ.get('UPLOAD_PARTIAL_TTL') or 24 * 3600)
+    # SQL profiling behind /metrics; statements slower than SLOW_QUERY_SECONDS
+    # are logged with their query plan (to SLOW_QUERY_LOG when set)
+    SQL_PROFILING = os.environ.get('SQL_PROFILING', '1') == '1'
+    SLOW_QUERY_SECONDS = float(os.environ.get('SLOW_QUERY_SECONDS') or 0.25)
+    SLOW_QUERY_LOG = os.environ.get('SLOW_QUERY_LOG')
+    # Load the analytics data of the WARM_DATABASES most recently used uploads
+    # at startup, before the first request (in the gunicorn master with preload)
+    WARM_CACHES = os.environ.get('WARM_CACHES', '0') == '1'
+    WARM_DATABASES = int(os.environ.get('WARM_DATABASES') or 4)
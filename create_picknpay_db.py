@@ -1,397 +1,668 @@
-import sqlite3
-import random
-from datetime import datetime, timedelta
-import os
-
-# Remove existing database file if it exists
-if os.path.exists('picknpay_zimbabwe.db'):
-    os.remove('picknpay_zimbabwe.db')
-
-# Connect to SQLite database
-conn = sqlite3.connect('picknpay_zimbabwe.db')
-cursor = conn.cursor()
-
-print("🛒 Creating Pick n Pay Zimbabwe Database (July-Sept 2025)...")
-
-# Create Tables
-cursor.executescript('''
-CREATE TABLE Customers (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    name TEXT NOT NULL,
-    gender TEXT,
-    location TEXT,
-    loyalty_tier TEXT
-);
-
-CREATE TABLE Products (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    name TEXT NOT NULL,
-    category TEXT NOT NULL,
-    price REAL NOT NULL
-);
-
-CREATE TABLE Transactions (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    customer_id INTEGER,
-    timestamp TEXT NOT NULL,
-    total_amount REAL NOT NULL,
-    payment_method TEXT NOT NULL,
-    store_id INTEGER NOT NULL,
-    FOREIGN KEY (customer_id) REFERENCES Customers(id)
-);
-
-CREATE TABLE Transaction_Items (
-    transaction_id INTEGER,
-    product_id INTEGER,
-    quantity INTEGER NOT NULL,
-    unit_price REAL NOT NULL,
-    PRIMARY KEY (transaction_id, product_id),
-    FOREIGN KEY (transaction_id) REFERENCES Transactions(id),
-    FOREIGN KEY (product_id) REFERENCES Products(id)
-);
-''')
-
-# Zimbabwean Names Data
-zimbabwean_names = [
-    ('Tendai Moyo', 'Male', 'Harare'), ('Rumbidzai Chiweshe', 'Female', 'Harare'),
-    ('Takudzwa Ndlovu', 'Male', 'Bulawayo'), ('Shamiso Marufu', 'Female', 'Mutare'),
-    ('Tinashe Sibanda', 'Male', 'Gweru'), ('Nyasha Machona', 'Female', 'Harare'),
-    ('Farai Banda', 'Male', 'Bulawayo'), ('Rutendo Gumbo', 'Female', 'Masvingo'),
-    ('Kudakwashe Hove', 'Male', 'Harare'), ('Chengetai Mapfumo', 'Female', 'Chitungwiza'),
-    ('Blessing Mugabe', 'Male', 'Harare'), ('Precious Nkomo', 'Female', 'Bulawayo'),
-    ('Tawanda Chirinda', 'Male', 'Kadoma'), ('Memory Dube', 'Female', 'Gweru'),
-    ('Innocent Zulu', 'Male', 'Harare'), ('Sibongile Ncube', 'Female', 'Bulawayo'),
-    ('Justice Maphosa', 'Male', 'Harare'), ('Fadzai Tshuma', 'Female', 'Victoria Falls'),
-    ('Munyaradzi Chidziva', 'Male', 'Marondera'), ('Vongai Makoni', 'Female', 'Chegutu'),
-    ('Tongai Chigumba', 'Male', 'Harare'), ('Yolanda Muzenda', 'Female', 'Bulawayo'),
-    ('Godfrey Chidhakwa', 'Male', 'Mutare'), ('Beatrice Zhou', 'Female', 'Gweru'),
-    ('Edmore Katsande', 'Male', 'Kwekwe'), ('Chiedza Mupfumi', 'Female', 'Harare'),
-    ('Wellington Masakadza', 'Male', 'Bulawayo'), ('Patience Nyathi', 'Female', 'Masvingo'),
-    ('Simbarashe Maruma', 'Male', 'Harare'), ('Ruvimbo Tshuma', 'Female', 'Chitungwiza'),
-    ('Tafadzwa Machingauta', 'Male', 'Bindura'), ('Anesu Gumbo', 'Female', 'Norton'),
-    ('Blessing Chinemhuka', 'Male', 'Harare'), ('Rudo Moyo', 'Female', 'Bulawayo'),
-    ('Tawanda Muti', 'Male', 'Gweru'), ('Makanaka Sithole', 'Female', 'Mutare')
-]
-
-loyalty_tiers = ['Bronze', 'Silver', 'Gold', 'Platinum']
-
-# Insert Customers
-for name, gender, location in zimbabwean_names:
-    loyalty_tier = random.choice(loyalty_tiers)
-    cursor.execute(
-        "INSERT INTO Customers (name, gender, location, loyalty_tier) VALUES (?, ?, ?, ?)",
-        (name, gender, location, loyalty_tier)
-    )
-
-# Pick n Pay Zimbabwe Products (updated with USD prices - approximately ZAR prices divided by 18.5)
-products = [
-    # Bakery (USD prices)
-    ('Brown Bread 700g', 'Bakery', 0.68), ('White Bread 700g', 'Bakery', 0.62),
-    ('Croissants 4pk', 'Bakery', 2.03), ('Rusks 250g', 'Bakery', 2.43),
-    ('Buns 6pk', 'Bakery', 1.35), ('Cake Slice', 'Bakery', 0.97),
-    
-    # Dairy (USD prices)
-    ('Lacto 500ml', 'Dairy', 1.05), ('Anchor Milk 1L', 'Dairy', 1.49),
-    ('Cheddar Cheese 250g', 'Dairy', 2.84), ('Yoghurt 500ml', 'Dairy', 1.32),
-    ('Butter 250g', 'Dairy', 2.08), ('Maas 500ml', 'Dairy', 0.89),
-    
-    # Meat & Poultry (USD prices)
-    ('Chicken Breast 1kg', 'Meat', 5.14), ('Beef Steak 500g', 'Meat', 7.16),
-    ('Boerewors 500g', 'Meat', 3.86), ('Pork Chops 500g', 'Meat', 4.19),
-    ('Fish Fillets 500g', 'Meat', 4.46), ('Mince Meat 500g', 'Meat', 3.51),
-    
-    # Groceries (USD prices)
-    ('Sugar 2kg', 'Groceries', 1.86), ('Cooking Oil 750ml', 'Groceries', 2.62),
-    ('Mealie Meal 10kg', 'Groceries', 5.00), ('Rice 2kg', 'Groceries', 3.05),
-    ('Baked Beans 410g', 'Groceries', 1.05), ('Flour 2kg', 'Groceries', 2.19),
-    ('Tea Bags 100pk', 'Groceries', 2.03), ('Coffee 250g', 'Groceries', 3.51),
-    
-    # Produce (USD prices)
-    ('Tomatoes 1kg', 'Produce', 1.54), ('Onions 1kg', 'Produce', 1.05),
-    ('Potatoes 2kg', 'Produce', 1.92), ('Bananas 1kg', 'Produce', 1.22),
-    ('Apples 1kg', 'Produce', 2.68), ('Oranges 1kg', 'Produce', 1.76),
-    ('Carrots 1kg', 'Produce', 1.16), ('Cabbage each', 'Produce', 0.95),
-    ('Spinach Bunch', 'Produce', 0.68), ('Green Beans 500g', 'Produce', 1.49),
-    
-    # Beverages (USD prices)
-    ('Coca Cola 2L', 'Beverages', 1.32), ('Sprite 2L', 'Beverages', 1.32),
-    ('Maheu 500ml', 'Beverages', 0.62), ('Still Water 1.5L', 'Beverages', 0.73),
-    ('Orange Juice 1L', 'Beverages', 1.76), ('Apple Juice 1L', 'Beverages', 1.86),
-    
-    # Personal Care (USD prices)
-    ('Colgate Toothpaste', 'Personal Care', 2.08), ('Protex Soap', 'Personal Care', 0.73),
-    ('Surf Washing Powder', 'Personal Care', 2.78), ('Vaseline 100ml', 'Personal Care', 1.65),
-    ('Shampoo 400ml', 'Personal Care', 2.57), ('Deodorant 150ml', 'Personal Care', 2.14),
-    
-    # Snacks (USD prices)
-    ('Lays Chips 100g', 'Snacks', 1.05), ('Biscuits 200g', 'Snacks', 1.32),
-    ('Chocolate Bar', 'Snacks', 0.89), ('Peanuts 200g', 'Snacks', 1.22),
-    ('Popcorn 200g', 'Snacks', 1.00), ('Crisps 150g', 'Snacks', 1.16),
-    
-    # Frozen Foods (USD prices)
-    ('Ice Cream 2L', 'Frozen', 4.84), ('Frozen Vegetables 500g', 'Frozen', 1.76),
-    ('Frozen Chicken Pieces 1kg', 'Frozen', 4.24), ('Frozen Fish Fingers 500g', 'Frozen', 3.49)
-]
-
-# Insert Products
-for product in products:
-    cursor.execute(
-        "INSERT INTO Products (name, category, price) VALUES (?, ?, ?)",
-        product
-    )
-
-# Generate 3 months of transactions (July - September 2025)
-print("📊 Generating 3 months of transaction data (July-Sept 2025)...")
-
-payment_methods = ['Ecocash', 'Cash', 'Credit Card', 'Debit Card']
-stores = [1, 2, 3]  # Store IDs
-
-# Generate dates for 3 months (July 1 - September 30, 2025)
-start_date = datetime(2025, 7, 1)
-end_date = datetime(2025, 9, 30)
-current_date = start_date
-
-transaction_id = 1
-seasonal_patterns = {
-    7: {'name': 'July', 'factor': 1.0},  # Normal month
-    8: {'name': 'August', 'factor': 1.2},  # Higher sales - Heroes Day, Women's Day
-    9: {'name': 'September', 'factor': 1.3}  # Highest - Spring, end of winter
-}
-
-while current_date <= end_date:
-    month_factor = seasonal_patterns[current_date.month]['factor']
-    
-    # More transactions on weekends and paydays (15th and 30th/31st)
-    day_of_week = current_date.weekday()
-    is_weekend = day_of_week >= 5
-    is_payday = current_date.day in [15, 30, 31]
-    
-    # Special days with higher traffic
-    is_heroes_day = current_date.month == 8 and current_date.day in [11, 12]  # Heroes Day weekend
-    is_spring_start = current_date.month == 9 and current_date.day in [1, 2]  # Spring beginning
-    
-    if is_heroes_day or is_spring_start:
-        base_transactions = random.randint(25, 35)
-    elif is_weekend or is_payday:
-        base_transactions = random.randint(15, 25)
-    else:
-        base_transactions = random.randint(8, 15)
-    
-    # Apply monthly seasonal factor
-    daily_transactions = int(base_transactions * month_factor)
-    
-    for _ in range(daily_transactions):
-        # Generate random time between 7 AM and 9 PM
-        hour = random.randint(7, 21)
-        minute = random.randint(0, 59)
-        timestamp = current_date.replace(hour=hour, minute=minute, second=0)
-        
-        customer_id = random.randint(1, len(zimbabwean_names))
-        payment_method = random.choice(payment_methods)
-        store_id = random.choice(stores)
-        
-        # Insert transaction
-        cursor.execute(
-            "INSERT INTO Transactions (customer_id, timestamp, total_amount, payment_method, store_id) VALUES (?, ?, ?, ?, ?)",
-            (customer_id, timestamp.strftime('%Y-%m-%d %H:%M:%S'), 0, payment_method, store_id)
-        )
-        
-        # Add transaction items with seasonal variations
-        num_items = random.randint(1, 8)
-        transaction_total = 0
-        
-        # Seasonal product preferences
-        seasonal_products = {
-            7: ['Coffee', 'Tea Bags', 'Butter', 'Bread', 'Soup'],  # Winter items
-            8: ['Chicken', 'Meat', 'Maheu', 'Snacks', 'Beverages'],  # Holiday cooking
-            9: ['Fruits', 'Vegetables', 'Juice', 'Ice Cream', 'Spinach']  # Spring fresh items
-        }
-        
-        preferred_categories = seasonal_products[current_date.month]
-        
-        # Use a set to track used product IDs for this transaction to avoid duplicates
-        used_product_ids = set()
-        
-        for _ in range(num_items):
-            # Bias towards seasonal products
-            if random.random() < 0.3:  # 30% chance to pick seasonal product
-                seasonal_product_ids = [i+1 for i, p in enumerate(products) 
-                                     if any(cat in p[0] for cat in preferred_categories)]
-                available_seasonal = [pid for pid in seasonal_product_ids if pid not in used_product_ids]
-                if available_seasonal:
-                    product_id = random.choice(available_seasonal)
-                else:
-                    # If no seasonal products available, pick any available product
-                    available_products = [pid for pid in range(1, len(products)+1) if pid not in used_product_ids]
-                    if available_products:
-                        product_id = random.choice(available_products)
-                    else:
-                        break  # No more unique products available
-            else:
-                available_products = [pid for pid in range(1, len(products)+1) if pid not in used_product_ids]
-                if available_products:
-                    product_id = random.choice(available_products)
-                else:
-                    break  # No more unique products available
-            
-            used_product_ids.add(product_id)
-            
-            quantity = random.randint(1, 3)
-            unit_price = products[product_id-1][2]  # Get price from products list
-            
-            # Occasionally apply promotions (more in September for spring cleaning)
-            promo_chance = 0.15 if current_date.month == 9 else 0.1
-            if random.random() < promo_chance:
-                unit_price *= random.uniform(0.7, 0.85)  # 15-30% discount
-            
-            cursor.execute(
-                "INSERT INTO Transaction_Items (transaction_id, product_id, quantity, unit_price) VALUES (?, ?, ?, ?)",
-                (transaction_id, product_id, quantity, round(unit_price, 2))
-            )
-            
-            transaction_total += quantity * unit_price
-        
-        # Update transaction total
-        cursor.execute(
-            "UPDATE Transactions SET total_amount = ? WHERE id = ?",
-            (round(transaction_total, 2), transaction_id)
-        )
-        
-        transaction_id += 1
-    
-    # Progress indicator
-    if current_date.day == 1:
-        month_name = seasonal_patterns[current_date.month]['name']
-        print(f"   Generating {month_name} 2025 data...")
-    
-    current_date += timedelta(days=1)
-
-# Create indexes for better performance
-cursor.executescript('''
-CREATE INDEX idx_transactions_customer_id ON Transactions(customer_id);
-CREATE INDEX idx_transactions_timestamp ON Transactions(timestamp);
-CREATE INDEX idx_transactions_store_id ON Transactions(store_id);
-CREATE INDEX idx_products_category ON Products(category);
-CREATE INDEX idx_transaction_items_transaction_id ON Transaction_Items(transaction_id);
-CREATE INDEX idx_transaction_items_product_id ON Transaction_Items(product_id);
-''')
-
-# Create useful views
-cursor.executescript('''
-CREATE VIEW Customer_Purchase_Summary AS
-SELECT 
-    c.id AS customer_id,
-    c.name,
-    c.location,
-    c.loyalty_tier,
-    COUNT(t.id) AS total_transactions,
-    SUM(t.total_amount) AS total_spent,
-    AVG(t.total_amount) AS avg_transaction_value,
-    MAX(t.timestamp) AS last_purchase_date
-FROM Customers c
-LEFT JOIN Transactions t ON c.id = t.customer_id
-GROUP BY c.id, c.name, c.location, c.loyalty_tier;
-
-CREATE VIEW Product_Sales_Performance AS
-SELECT 
-    p.id AS product_id,
-    p.name,
-    p.category,
-    SUM(ti.quantity) AS total_quantity_sold,
-    SUM(ti.quantity * ti.unit_price) AS total_revenue,
-    COUNT(DISTINCT ti.transaction_id) AS transaction_count,
-    AVG(ti.quantity) AS avg_quantity_per_transaction
-FROM Products p
-JOIN Transaction_Items ti ON p.id = ti.product_id
-GROUP BY p.id, p.name, p.category;
-
-CREATE VIEW Monthly_Sales_Analysis AS
-SELECT 
-    strftime('%Y-%m', timestamp) as month,
-    store_id,
-    COUNT(*) as transaction_count,
-    SUM(total_amount) as total_revenue,
-    AVG(total_amount) as avg_transaction_value,
-    COUNT(DISTINCT customer_id) as unique_customers
-FROM Transactions
-GROUP BY strftime('%Y-%m', timestamp), store_id;
-
-CREATE VIEW Seasonal_Product_Performance AS
-SELECT 
-    p.category,
-    strftime('%Y-%m', t.timestamp) as month,
-    SUM(ti.quantity) as total_quantity,
-    SUM(ti.quantity * ti.unit_price) as total_revenue
-FROM Products p
-JOIN Transaction_Items ti ON p.id = ti.product_id
-JOIN Transactions t ON ti.transaction_id = t.id
-GROUP BY p.category, strftime('%Y-%m', t.timestamp)
-ORDER BY month, total_revenue DESC;
-''')
-
-# Commit changes and close connection
-conn.commit()
-
-# Print summary
-print("\n✅ Database Created Successfully!")
-print("📁 File: picknpay_zimbabwe.db")
-
-# Display statistics
-cursor.execute("SELECT COUNT(*) FROM Customers")
-print(f"👥 Customers: {cursor.fetchone()[0]}")
-
-cursor.execute("SELECT COUNT(*) FROM Products")
-print(f"🛍️ Products: {cursor.fetchone()[0]}")
-
-cursor.execute("SELECT COUNT(*) FROM Transactions")
-transactions_count = cursor.fetchone()[0]
-print(f"🧾 Transactions: {transactions_count}")
-
-cursor.execute("SELECT COUNT(*) FROM Transaction_Items")
-transaction_items_count = cursor.fetchone()[0]
-print(f"📦 Transaction Items: {transaction_items_count}")
-
-cursor.execute("SELECT MIN(timestamp), MAX(timestamp) FROM Transactions")
-min_date, max_date = cursor.fetchone()
-print(f"📅 Date Range: {min_date} to {max_date}")
-
-cursor.execute("SELECT SUM(total_amount) FROM Transactions")
-total_revenue = cursor.fetchone()[0]
-print(f"💰 Total Revenue: ${total_revenue:,.2f} USD")  # Changed to USD
-
-# Monthly breakdown
-cursor.execute('''
-SELECT strftime('%Y-%m', timestamp) as month, 
-       COUNT(*) as transactions,
-       SUM(total_amount) as revenue,
-       AVG(total_amount) as avg_transaction
-FROM Transactions 
-GROUP BY strftime('%Y-%m', timestamp)
-ORDER BY month
-''')
-print("\n📈 Monthly Breakdown (July-Sept 2025):")
-for month, transactions, revenue, avg_trans in cursor.fetchall():
-    print(f"   {month}: {transactions:>3} transactions, ${revenue:>8,.2f} revenue, ${avg_trans:>5.2f} avg")
-
-# Top selling categories by month
-cursor.execute('''
-SELECT month, category, total_revenue 
-FROM Seasonal_Product_Performance 
-WHERE month IN ('2025-07', '2025-08', '2025-09')
-ORDER BY month, total_revenue DESC
-LIMIT 15
-''')
-print("\n🏆 Top Categories by Month:")
-current_month = None
-for month, category, revenue in cursor.fetchall():
-    if month != current_month:
-        print(f"   {month}:")
-        current_month = month
-    print(f"     - {category}: ${revenue:,.2f}")
-
-conn.close()
-
-print(f"\n🎯 Database is ready for ShopTrend Analytics!")
-print("💡 You can now use this .db file in your application.")
-print("📊 Features: Seasonal patterns, realistic Zimbabwean data, 3 months of transactions")
-print("💰 All prices and revenue in USD")
\ No newline at end of file
+import sqlite3
+import argparse
+import calendar
+from datetime import date, timedelta
+import os
+
+import numpy as np
+
+from rollups import create_rollups, refresh_rollups
+from schema_migrations import date_key, migrate_date_keys
+from shard_generation import generate_sharded, plan_shards, record_units
+
+DB_FILE = 'picknpay_zimbabwe.db'
+
+SCHEMA_SQL = '''
+CREATE TABLE Customers (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    gender TEXT,
+    location TEXT,
+    loyalty_tier TEXT
+);
+
+CREATE TABLE Products (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    category TEXT NOT NULL,
+    price REAL NOT NULL
+);
+
+CREATE TABLE Transactions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    customer_id INTEGER,
+    timestamp TEXT NOT NULL,
+    total_amount REAL NOT NULL,
+    payment_method TEXT NOT NULL,
+    store_id INTEGER NOT NULL,
+    date_key INTEGER,
+    hour_key INTEGER,
+    FOREIGN KEY (customer_id) REFERENCES Customers(id)
+);
+
+CREATE TABLE Transaction_Items (
+    transaction_id INTEGER,
+    product_id INTEGER,
+    quantity INTEGER NOT NULL,
+    unit_price REAL NOT NULL,
+    PRIMARY KEY (transaction_id, product_id),
+    FOREIGN KEY (transaction_id) REFERENCES Transactions(id),
+    FOREIGN KEY (product_id) REFERENCES Products(id)
+);
+'''
+
+# Indexes for better performance
+INDEXES_SQL = '''
+CREATE INDEX idx_transactions_customer_id ON Transactions(customer_id);
+CREATE INDEX idx_transactions_timestamp ON Transactions(timestamp);
+CREATE INDEX idx_transactions_store_id ON Transactions(store_id);
+CREATE INDEX idx_products_category ON Products(category);
+CREATE INDEX idx_transaction_items_transaction_id ON Transaction_Items(transaction_id);
+CREATE INDEX idx_transaction_items_product_id ON Transaction_Items(product_id);
+'''
+
+# Zimbabwean Names Data
+zimbabwean_names = [
+    ('Tendai Moyo', 'Male', 'Harare'), ('Rumbidzai Chiweshe', 'Female', 'Harare'),
+    ('Takudzwa Ndlovu', 'Male', 'Bulawayo'), ('Shamiso Marufu', 'Female', 'Mutare'),
+    ('Tinashe Sibanda', 'Male', 'Gweru'), ('Nyasha Machona', 'Female', 'Harare'),
+    ('Farai Banda', 'Male', 'Bulawayo'), ('Rutendo Gumbo', 'Female', 'Masvingo'),
+    ('Kudakwashe Hove', 'Male', 'Harare'), ('Chengetai Mapfumo', 'Female', 'Chitungwiza'),
+    ('Blessing Mugabe', 'Male', 'Harare'), ('Precious Nkomo', 'Female', 'Bulawayo'),
+    ('Tawanda Chirinda', 'Male', 'Kadoma'), ('Memory Dube', 'Female', 'Gweru'),
+    ('Innocent Zulu', 'Male', 'Harare'), ('Sibongile Ncube', 'Female', 'Bulawayo'),
+    ('Justice Maphosa', 'Male', 'Harare'), ('Fadzai Tshuma', 'Female', 'Victoria Falls'),
+    ('Munyaradzi Chidziva', 'Male', 'Marondera'), ('Vongai Makoni', 'Female', 'Chegutu'),
+    ('Tongai Chigumba', 'Male', 'Harare'), ('Yolanda Muzenda', 'Female', 'Bulawayo'),
+    ('Godfrey Chidhakwa', 'Male', 'Mutare'), ('Beatrice Zhou', 'Female', 'Gweru'),
+    ('Edmore Katsande', 'Male', 'Kwekwe'), ('Chiedza Mupfumi', 'Female', 'Harare'),
+    ('Wellington Masakadza', 'Male', 'Bulawayo'), ('Patience Nyathi', 'Female', 'Masvingo'),
+    ('Simbarashe Maruma', 'Male', 'Harare'), ('Ruvimbo Tshuma', 'Female', 'Chitungwiza'),
+    ('Tafadzwa Machingauta', 'Male', 'Bindura'), ('Anesu Gumbo', 'Female', 'Norton'),
+    ('Blessing Chinemhuka', 'Male', 'Harare'), ('Rudo Moyo', 'Female', 'Bulawayo'),
+    ('Tawanda Muti', 'Male', 'Gweru'), ('Makanaka Sithole', 'Female', 'Mutare')
+]
+
+loyalty_tiers = ['Bronze', 'Silver', 'Gold', 'Platinum']
+
+# Pick n Pay Zimbabwe Products (updated with USD prices - approximately ZAR prices divided by 18.5)
+products = [
+    # Bakery (USD prices)
+    ('Brown Bread 700g', 'Bakery', 0.68), ('White Bread 700g', 'Bakery', 0.62),
+    ('Croissants 4pk', 'Bakery', 2.03), ('Rusks 250g', 'Bakery', 2.43),
+    ('Buns 6pk', 'Bakery', 1.35), ('Cake Slice', 'Bakery', 0.97),
+    
+    # Dairy (USD prices)
+    ('Lacto 500ml', 'Dairy', 1.05), ('Anchor Milk 1L', 'Dairy', 1.49),
+    ('Cheddar Cheese 250g', 'Dairy', 2.84), ('Yoghurt 500ml', 'Dairy', 1.32),
+    ('Butter 250g', 'Dairy', 2.08), ('Maas 500ml', 'Dairy', 0.89),
+    
+    # Meat & Poultry (USD prices)
+    ('Chicken Breast 1kg', 'Meat', 5.14), ('Beef Steak 500g', 'Meat', 7.16),
+    ('Boerewors 500g', 'Meat', 3.86), ('Pork Chops 500g', 'Meat', 4.19),
+    ('Fish Fillets 500g', 'Meat', 4.46), ('Mince Meat 500g', 'Meat', 3.51),
+    
+    # Groceries (USD prices)
+    ('Sugar 2kg', 'Groceries', 1.86), ('Cooking Oil 750ml', 'Groceries', 2.62),
+    ('Mealie Meal 10kg', 'Groceries', 5.00), ('Rice 2kg', 'Groceries', 3.05),
+    ('Baked Beans 410g', 'Groceries', 1.05), ('Flour 2kg', 'Groceries', 2.19),
+    ('Tea Bags 100pk', 'Groceries', 2.03), ('Coffee 250g', 'Groceries', 3.51),
+    
+    # Produce (USD prices)
+    ('Tomatoes 1kg', 'Produce', 1.54), ('Onions 1kg', 'Produce', 1.05),
+    ('Potatoes 2kg', 'Produce', 1.92), ('Bananas 1kg', 'Produce', 1.22),
+    ('Apples 1kg', 'Produce', 2.68), ('Oranges 1kg', 'Produce', 1.76),
+    ('Carrots 1kg', 'Produce', 1.16), ('Cabbage each', 'Produce', 0.95),
+    ('Spinach Bunch', 'Produce', 0.68), ('Green Beans 500g', 'Produce', 1.49),
+    
+    # Beverages (USD prices)
+    ('Coca Cola 2L', 'Beverages', 1.32), ('Sprite 2L', 'Beverages', 1.32),
+    ('Maheu 500ml', 'Beverages', 0.62), ('Still Water 1.5L', 'Beverages', 0.73),
+    ('Orange Juice 1L', 'Beverages', 1.76), ('Apple Juice 1L', 'Beverages', 1.86),
+    
+    # Personal Care (USD prices)
+    ('Colgate Toothpaste', 'Personal Care', 2.08), ('Protex Soap', 'Personal Care', 0.73),
+    ('Surf Washing Powder', 'Personal Care', 2.78), ('Vaseline 100ml', 'Personal Care', 1.65),
+    ('Shampoo 400ml', 'Personal Care', 2.57), ('Deodorant 150ml', 'Personal Care', 2.14),
+    
+    # Snacks (USD prices)
+    ('Lays Chips 100g', 'Snacks', 1.05), ('Biscuits 200g', 'Snacks', 1.32),
+    ('Chocolate Bar', 'Snacks', 0.89), ('Peanuts 200g', 'Snacks', 1.22),
+    ('Popcorn 200g', 'Snacks', 1.00), ('Crisps 150g', 'Snacks', 1.16),
+    
+    # Frozen Foods (USD prices)
+    ('Ice Cream 2L', 'Frozen', 4.84), ('Frozen Vegetables 500g', 'Frozen', 1.76),
+    ('Frozen Chicken Pieces 1kg', 'Frozen', 4.24), ('Frozen Fish Fingers 500g', 'Frozen', 3.49)
+]
+
+payment_methods = ['Ecocash', 'Cash', 'Credit Card', 'Debit Card']
+stores = [1, 2, 3]  # Store IDs
+
+# Default range: 3 months (July 1 - September 30, 2025)
+START_DATE = date(2025, 7, 1)
+END_DATE = date(2025, 9, 30)
+
+seasonal_patterns = {
+    7: {'name': 'July', 'factor': 1.0},  # Normal month
+    8: {'name': 'August', 'factor': 1.2},  # Higher sales - Heroes Day, Women's Day
+    9: {'name': 'September', 'factor': 1.3}  # Highest - Spring, end of winter
+}
+
+# Seasonal product preferences
+seasonal_products = {
+    7: ['Coffee', 'Tea Bags', 'Butter', 'Bread', 'Soup'],  # Winter items
+    8: ['Chicken', 'Meat', 'Maheu', 'Snacks', 'Beverages'],  # Holiday cooking
+    9: ['Fruits', 'Vegetables', 'Juice', 'Ice Cream', 'Spinach']  # Spring fresh items
+}
+
+SEASONAL_PICK_CHANCE = 0.3  # chance that a basket slot goes to a seasonal product
+MAX_BASKET_SIZE = 8
+
+# Daily traffic was tuned for the three original stores; additional stores get
+# the same per-store share of it.
+REFERENCE_STORES = len(stores)
+
+# Stores are generated in fixed blocks, each with its own random stream, so a
+# given seed always yields the same rows no matter how the work is split up.
+STORE_BLOCK = 64
+INSERT_CHUNK = 50_000
+APPEND_DAYS = 7  # days added by --append when no end date is given
+
+TRANSACTION_COLUMNS = ['id', 'customer_id', 'timestamp', 'total_amount', 'payment_method', 'store_id',
+                       'date_key', 'hour_key']
+ITEM_COLUMNS = ['transaction_id', 'product_id', 'quantity', 'unit_price']
+
+PRODUCT_NAMES = [p[0] for p in products]
+PRODUCT_PRICES = np.array([p[2] for p in products])
+TIME_OF_DAY = np.array([f'{h:02d}:{m:02d}:00' for h in range(24) for m in range(60)])
+
+_product_weights = {}
+
+
+def product_weights(month):
+    """Sampling weights that give seasonal products their 30% basket share"""
+    if month not in _product_weights:
+        preferred = seasonal_products.get(month, [])
+        seasonal = np.array([any(cat in name for cat in preferred) for name in PRODUCT_NAMES])
+        weights = np.ones(len(products))
+        n_seasonal = int(seasonal.sum())
+        if 0 < n_seasonal < len(products):
+            # Probability that a single pick is seasonal under the original rule:
+            # a 30% seasonal draw plus the seasonal share of the uniform draw.
+            p = SEASONAL_PICK_CHANCE + (1 - SEASONAL_PICK_CHANCE) * n_seasonal / len(products)
+            weights[seasonal] = p * (len(products) - n_seasonal) / (n_seasonal * (1 - p))
+        _product_weights[month] = weights
+    return _product_weights[month]
+
+
+def daily_traffic(day):
+    """Return (low, high, month factor) for the number of transactions on a day"""
+    is_weekend = day.weekday() >= 5
+    is_payday = day.day in [15, 30, 31]
+
+    # Special days with higher traffic
+    is_heroes_day = day.month == 8 and day.day in [11, 12]  # Heroes Day weekend
+    is_spring_start = day.month == 9 and day.day in [1, 2]  # Spring beginning
+
+    if is_heroes_day or is_spring_start:
+        low, high = 25, 35
+    elif is_weekend or is_payday:
+        low, high = 15, 25
+    else:
+        low, high = 8, 15
+
+    factor = seasonal_patterns.get(day.month, {'factor': 1.0})['factor']
+    return low, high, factor
+
+
+def generate_unit(seed, day, block, store_ids, n_customers, max_basket):
+    """Generate one day of transactions for one block of stores.
+
+    Everything is drawn as whole arrays from a random stream keyed by
+    (seed, day, block). Transactions are returned sorted by time of day and
+    items reference them by their position in the returned arrays.
+    """
+    rng = np.random.default_rng([seed, day.toordinal(), block])
+    store_ids = np.asarray(store_ids)
+
+    low, high, factor = daily_traffic(day)
+    base = rng.integers(low, high + 1, size=len(store_ids))
+    counts = rng.poisson(base * factor / REFERENCE_STORES)
+    n = int(counts.sum())
+
+    store_id = np.repeat(store_ids, counts)
+    minute_of_day = rng.integers(7, 22, size=n) * 60 + rng.integers(0, 60, size=n)
+    customer_id = rng.integers(1, n_customers + 1, size=n)
+    payment = rng.integers(0, len(payment_methods), size=n)
+
+    order = np.argsort(minute_of_day, kind='stable')
+    store_id, minute_of_day = store_id[order], minute_of_day[order]
+    customer_id, payment = customer_id[order], payment[order]
+
+    # Unique products per basket: weighted sampling without replacement via
+    # exponential keys, taking the smallest `num_items` keys of each row.
+    num_items = rng.integers(1, min(max_basket, len(products)) + 1, size=n)
+    keys = rng.exponential(size=(n, len(products))) / product_weights(day.month)
+    ranked = np.argsort(keys, axis=1)
+    product_index = ranked[np.arange(len(products)) < num_items[:, None]]
+    tx_index = np.repeat(np.arange(n), num_items)
+
+    m = len(product_index)
+    quantity = rng.integers(1, 4, size=m)
+    unit_price = PRODUCT_PRICES[product_index]
+
+    # Occasionally apply promotions (more in September for spring cleaning)
+    promo_chance = 0.15 if day.month == 9 else 0.1
+    promo = rng.random(m) < promo_chance
+    discount = rng.uniform(0.7, 0.85, size=m)  # 15-30% discount
+    unit_price = np.round(np.where(promo, unit_price * discount, unit_price), 2)
+
+    total_amount = np.round(np.bincount(tx_index, weights=quantity * unit_price, minlength=n), 2)
+
+    return {
+        'customer_id': customer_id,
+        'minute_of_day': minute_of_day,
+        'payment': payment,
+        'store_id': store_id,
+        'total_amount': total_amount,
+        'item_tx_index': tx_index,
+        'product_id': product_index + 1,
+        'quantity': quantity,
+        'unit_price': unit_price,
+    }
+
+
+def store_blocks(store_ids):
+    """Split store ids into the fixed blocks used for random streams"""
+    store_ids = sorted(store_ids)
+    blocks = {}
+    for store_id in store_ids:
+        blocks.setdefault((store_id - 1) // STORE_BLOCK, []).append(store_id)
+    return sorted(blocks.items())
+
+
+def generate_block(seed, days, store_ids, n_customers, max_basket=MAX_BASKET_SIZE,
+                   first_id=1):
+    """Generate a block of days (typically a month) as column arrays.
+
+    Returns (transactions, items, units) where transactions and items are
+    dicts of NumPy columns ready for insertion and units lists
+    (day, block, first_id, count) for every generated unit in id order.
+    """
+    parts = []
+    units = []
+    next_id = first_id
+    for day in days:
+        day_str = day.strftime('%Y-%m-%d ')
+        for block, block_stores in store_blocks(store_ids):
+            unit = generate_unit(seed, day, block, block_stores, n_customers, max_basket)
+            n = len(unit['customer_id'])
+            unit['id'] = np.arange(next_id, next_id + n)
+            unit['timestamp'] = np.char.add(day_str, TIME_OF_DAY[unit['minute_of_day']])
+            unit['date_key'] = np.full(n, date_key(day))
+            unit['hour_key'] = unit['minute_of_day'] // 60
+            units.append((day, block, next_id, n))
+            parts.append(unit)
+            next_id += n
+
+    def column(key):
+        return np.concatenate([p[key] for p in parts]) if parts else np.array([])
+
+    transactions = {
+        'id': column('id'),
+        'customer_id': column('customer_id'),
+        'timestamp': column('timestamp'),
+        'total_amount': column('total_amount'),
+        'payment_method': np.array(payment_methods)[column('payment').astype(int)],
+        'store_id': column('store_id'),
+        'date_key': column('date_key'),
+        'hour_key': column('hour_key'),
+    }
+    items = {
+        'transaction_id': np.concatenate([p['id'][p['item_tx_index']] for p in parts])
+        if parts else np.array([]),
+        'product_id': column('product_id'),
+        'quantity': column('quantity'),
+        'unit_price': column('unit_price'),
+    }
+    return transactions, items, units
+
+
+def insert_rows(cursor, sql, columns, chunk_size=INSERT_CHUNK):
+    """Insert column arrays with executemany in fixed-size chunks"""
+    n = len(columns[0])
+    for start in range(0, n, chunk_size):
+        chunk = [col[start:start + chunk_size].tolist() for col in columns]
+        cursor.executemany(sql, zip(*chunk))
+    return n
+
+
+def insert_block(cursor, transactions, items, chunk_size=INSERT_CHUNK):
+    """Write a generated block; totals are already final so no UPDATE is needed"""
+    n_tx = insert_rows(
+        cursor,
+        f"INSERT INTO Transactions ({', '.join(TRANSACTION_COLUMNS)}) VALUES ({', '.join('?' * len(TRANSACTION_COLUMNS))})",
+        [transactions[k] for k in TRANSACTION_COLUMNS],
+        chunk_size
+    )
+    n_items = insert_rows(
+        cursor,
+        f"INSERT INTO Transaction_Items ({', '.join(ITEM_COLUMNS)}) VALUES (?, ?, ?, ?)",
+        [items[k] for k in ITEM_COLUMNS],
+        chunk_size
+    )
+    return n_tx, n_items
+
+
+def date_blocks(start_date, end_date, block_days=None):
+    """Split a date range into calendar months, or into runs of block_days"""
+    days = [start_date + timedelta(days=i) for i in range((end_date - start_date).days + 1)]
+    blocks = []
+    for day in days:
+        if blocks and (
+            len(blocks[-1]) < block_days if block_days
+            else (blocks[-1][0].year, blocks[-1][0].month) == (day.year, day.month)
+        ):
+            blocks[-1].append(day)
+        else:
+            blocks.append([day])
+    return blocks
+
+
+def insert_customers(cursor, seed, n_customers):
+    """Insert customers, cycling through the name list when scaled up"""
+    rng = np.random.default_rng([seed, 0])
+    tiers = rng.integers(0, len(loyalty_tiers), size=n_customers)
+    rows = []
+    for i in range(n_customers):
+        name, gender, location = zimbabwean_names[i % len(zimbabwean_names)]
+        rows.append((name, gender, location, loyalty_tiers[tiers[i]]))
+    cursor.executemany(
+        "INSERT INTO Customers (name, gender, location, loyalty_tier) VALUES (?, ?, ?, ?)",
+        rows
+    )
+
+
+def create_schema(cursor, seed, n_customers):
+    """Create the tables and insert customers and products"""
+    cursor.executescript(SCHEMA_SQL)
+    insert_customers(cursor, seed, n_customers)
+    cursor.executemany(
+        "INSERT INTO Products (name, category, price) VALUES (?, ?, ?)",
+        products
+    )
+
+
+def generate_transactions(conn, seed, start_date=START_DATE, end_date=END_DATE,
+                          store_ids=stores, n_customers=len(zimbabwean_names),
+                          max_basket=MAX_BASKET_SIZE, block_days=None,
+                          chunk_size=INSERT_CHUNK, first_id=1, verbose=True):
+    """Generate and insert transactions for a date range, one block at a time.
+
+    Returns (transactions, items) counts.
+    """
+    cursor = conn.cursor()
+    next_id = first_id
+    n_tx = n_items = 0
+    for days in date_blocks(start_date, end_date, block_days):
+        if verbose and days[0].day == 1:
+            print(f"   Generating {calendar.month_name[days[0].month]} {days[0].year} data...")
+        transactions, items, _ = generate_block(
+            seed, days, store_ids, n_customers, max_basket, next_id
+        )
+        block_tx, block_items = insert_block(cursor, transactions, items, chunk_size)
+        next_id += block_tx
+        n_tx += block_tx
+        n_items += block_items
+    return n_tx, n_items
+
+
+def generate_shard(shard_path, seed, days, store_ids, n_customers, max_basket,
+                   chunk_size=INSERT_CHUNK):
+    """Generate one shard into its own database file (runs in a worker process)"""
+    conn = sqlite3.connect(shard_path)
+    conn.executescript(SCHEMA_SQL)
+    cursor = conn.cursor()
+    rows = 0
+    next_id = 1
+    for block_days in date_blocks(days[0], days[-1]):
+        transactions, items, units = generate_block(
+            seed, block_days, store_ids, n_customers, max_basket, next_id
+        )
+        n_tx, n_items = insert_block(cursor, transactions, items, chunk_size)
+        record_units(conn, [
+            (day.isoformat(), block, first_id, count, 0, 0)
+            for day, block, first_id, count in units
+        ])
+        next_id += n_tx
+        rows += n_tx + n_items
+    conn.commit()
+    conn.close()
+    return rows
+
+
+def generate_transactions_sharded(conn, seed, start_date, end_date, store_ids,
+                                  n_customers, max_basket, workers,
+                                  chunk_size=INSERT_CHUNK, tmp_parent=None):
+    """Generate transactions in a process pool and merge the shards into conn.
+
+    The result is identical to generate_transactions for the same seed.
+    """
+    days = [start_date + timedelta(days=i) for i in range((end_date - start_date).days + 1)]
+    store_groups = [block_stores for _, block_stores in store_blocks(store_ids)]
+    shards = plan_shards(days, store_groups, workers)
+    print(f"   Splitting into {len(shards)} shards across {workers} workers...")
+    return generate_sharded(
+        conn, generate_shard,
+        [(seed, shard_days, shard_stores, n_customers, max_basket, chunk_size)
+         for shard_days, shard_stores in shards],
+        workers,
+        ('Transactions', TRANSACTION_COLUMNS, 'Transaction_Items', ITEM_COLUMNS),
+        tmp_parent
+    )
+
+
+def print_summary(cursor, db_path=DB_FILE):
+    """Print row counts and a monthly breakdown of the generated database"""
+    print("\n✅ Database Created Successfully!")
+    print(f"📁 File: {db_path}")
+
+    # Display statistics
+    cursor.execute("SELECT COUNT(*) FROM Customers")
+    print(f"👥 Customers: {cursor.fetchone()[0]}")
+
+    cursor.execute("SELECT COUNT(*) FROM Products")
+    print(f"🛍️ Products: {cursor.fetchone()[0]}")
+
+    cursor.execute("SELECT COUNT(*) FROM Transactions")
+    transactions_count = cursor.fetchone()[0]
+    print(f"🧾 Transactions: {transactions_count}")
+
+    cursor.execute("SELECT COUNT(*) FROM Transaction_Items")
+    transaction_items_count = cursor.fetchone()[0]
+    print(f"📦 Transaction Items: {transaction_items_count}")
+
+    cursor.execute("SELECT MIN(timestamp), MAX(timestamp) FROM Transactions")
+    min_date, max_date = cursor.fetchone()
+    print(f"📅 Date Range: {min_date} to {max_date}")
+
+    cursor.execute("SELECT SUM(total_amount) FROM Transactions")
+    total_revenue = cursor.fetchone()[0] or 0
+    print(f"💰 Total Revenue: ${total_revenue:,.2f} USD")
+
+    # Monthly breakdown
+    cursor.execute('''
+    SELECT printf('%04d-%02d', date_key / 10000, date_key / 100 % 100) as month,
+           COUNT(*) as transactions,
+           SUM(total_amount) as revenue,
+           AVG(total_amount) as avg_transaction
+    FROM Transactions 
+    GROUP BY date_key / 100
+    ORDER BY date_key / 100
+    ''')
+    print("\n📈 Monthly Breakdown:")
+    for month, transactions, revenue, avg_trans in cursor.fetchall():
+        print(f"   {month}: {transactions:>3} transactions, ${revenue:>8,.2f} revenue, ${avg_trans:>5.2f} avg")
+
+    # Top selling categories by month
+    cursor.execute('''
+    SELECT month, category, total_revenue 
+    FROM Seasonal_Product_Performance 
+    ORDER BY month, total_revenue DESC
+    LIMIT 15
+    ''')
+    print("\n🏆 Top Categories by Month:")
+    current_month = None
+    for month, category, revenue in cursor.fetchall():
+        if month != current_month:
+            print(f"   {month}:")
+            current_month = month
+        print(f"     - {category}: ${revenue:,.2f}")
+
+
+def create_database(db_path=DB_FILE, seed=None, n_stores=len(stores),
+                    n_customers=len(zimbabwean_names), n_days=None,
+                    max_basket=MAX_BASKET_SIZE, start_date=START_DATE,
+                    block_days=None, chunk_size=INSERT_CHUNK, workers=1):
+    """Build the Pick n Pay database from scratch.
+
+    seed makes the output reproducible; n_stores, n_customers, n_days and
+    max_basket scale the generated data. With workers > 1 the data is
+    generated in shards by a process pool and merged, giving the same
+    database. Returns the seed that was used.
+    """
+    if seed is None:
+        seed = int(np.random.SeedSequence().entropy % 2**32)
+    end_date = start_date + timedelta(days=n_days - 1) if n_days else END_DATE
+
+    # Remove existing database file if it exists
+    if os.path.exists(db_path):
+        os.remove(db_path)
+
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+
+    print("🛒 Creating Pick n Pay Zimbabwe Database...")
+    print(f"🎲 Seed: {seed}")
+    create_schema(cursor, seed, n_customers)
+
+    print(f"📊 Generating transaction data ({start_date} to {end_date})...")
+    store_ids = list(range(1, n_stores + 1))
+    if workers > 1:
+        conn.commit()
+        generate_transactions_sharded(
+            conn, seed, start_date, end_date, store_ids, n_customers, max_basket,
+            workers, chunk_size, os.path.dirname(os.path.abspath(db_path))
+        )
+    else:
+        generate_transactions(
+            conn, seed, start_date, end_date, store_ids,
+            n_customers, max_basket, block_days, chunk_size
+        )
+
+    cursor.executescript(INDEXES_SQL)
+    migrate_date_keys(conn)
+
+    # Analytic views read daily rollup tables instead of the raw rows
+    create_rollups(conn)
+    refresh_rollups(conn)
+
+    print_summary(cursor, db_path)
+    # Readers of the finished database never block on a later append
+    conn.execute('PRAGMA journal_mode = WAL')
+    conn.close()
+    return seed
+
+
+def append_database(db_path=DB_FILE, seed=None, start_date=None, end_date=None, n_days=None,
+                    max_basket=MAX_BASKET_SIZE, chunk_size=INSERT_CHUNK):
+    """Extend an existing database with new days instead of rebuilding it.
+
+    Generation resumes on the day after MAX(timestamp) with the ids after
+    the highest transaction id, for the database's own stores and customers.
+    The range runs from start_date (default: the resume day) to end_date, or
+    for n_days; days it shares with the existing data are skipped, so running
+    again for the same range adds nothing. The new rows and the rollup
+    refresh for just the new days are committed as one transaction, and
+    indexes and views are left as they are. With the seed the database was
+    created with, the rows match generating the longer range from scratch.
+    Returns (transactions, items) added.
+    """
+    if not os.path.exists(db_path):
+        raise FileNotFoundError(f"{db_path} does not exist; create it before appending")
+    if seed is None:
+        seed = int(np.random.SeedSequence().entropy % 2**32)
+
+    conn = sqlite3.connect(db_path)
+    try:
+        # Databases made before the date keys existed get them first, as in create_database
+        migrate_date_keys(conn)
+        last_timestamp, max_id, n_stores = conn.execute(
+            'SELECT MAX(timestamp), COALESCE(MAX(id), 0), COALESCE(MAX(store_id), 0) FROM Transactions'
+        ).fetchone()
+        n_customers = conn.execute('SELECT COUNT(*) FROM Customers').fetchone()[0]
+        resume = date.fromisoformat(last_timestamp[:10]) + timedelta(days=1) if last_timestamp else START_DATE
+        first_day = start_date or resume
+        end_date = end_date or first_day + timedelta(days=(n_days or APPEND_DAYS) - 1)
+        start_date = max(first_day, resume)
+        if start_date > end_date:
+            print(f"✅ {db_path} already covers {first_day} to {end_date}; nothing to append")
+            return 0, 0
+
+        print(f"➕ Appending {start_date} to {end_date} to {db_path} (seed {seed})...")
+        n_tx, n_items = generate_transactions(
+            conn, seed, start_date, end_date, list(range(1, max(n_stores, 1) + 1)),
+            n_customers, max_basket, chunk_size=chunk_size, first_id=max_id + 1
+        )
+        has_rollups = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'Rollup_State'"
+        ).fetchone()
+        if has_rollups:
+            days = refresh_rollups(conn)  # recomputes the new days and commits everything
+            print(f"📊 Refreshed rollups for {days} days")
+        else:
+            conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+    print(f"🧾 Added {n_tx} transactions and {n_items} items")
+    return n_tx, n_items
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Create the Pick n Pay Zimbabwe sample database')
+    parser.add_argument('--output', default=DB_FILE, help='database file to create')
+    parser.add_argument('--seed', type=int, help='random seed for reproducible output')
+    parser.add_argument('--stores', type=int, default=len(stores), help='number of stores')
+    parser.add_argument('--customers', type=int, default=len(zimbabwean_names), help='number of customers')
+    parser.add_argument('--days', type=int, help='number of days from July 1, 2025 (default: July-Sept)')
+    parser.add_argument('--basket-size', type=int, default=MAX_BASKET_SIZE, help='maximum items per transaction')
+    parser.add_argument('--block-days', type=int, help='days generated per block (default: one month)')
+    parser.add_argument('--workers', type=int, default=1, help='generate shards in this many processes')
+    parser.add_argument('--append', action='store_true',
+                        help=f'add days to an existing database (--days defaults to {APPEND_DAYS})')
+    parser.add_argument('--start', type=date.fromisoformat,
+                        help='with --append: first day to add, YYYY-MM-DD (default: day after the last)')
+    parser.add_argument('--until', type=date.fromisoformat, help='with --append: last day to add, YYYY-MM-DD')
+    args = parser.parse_args()
+
+    if args.append:
+        append_database(args.output, args.seed, args.start, args.until, args.days, args.basket_size)
+        return
+
+    create_database(
+        args.output, args.seed, args.stores, args.customers, args.days,
+        args.basket_size, block_days=args.block_days, workers=args.workers
+    )
+
+    print(f"\n🎯 Database is ready for ShopTrend Analytics!")
+    print("💡 You can now use this .db file in your application.")
+    print("📊 Features: Seasonal patterns, realistic Zimbabwean data, reproducible seeds")
+    print("💰 All prices and revenue in USD")
+
+
+if __name__ == '__main__':
+    main()
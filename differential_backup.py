@@ -0,0 +1,227 @@
+import sqlite3
+import argparse
+import hashlib
+import json
+import os
+import tempfile
+import time
+import zlib
+from contextlib import contextmanager
+from datetime import datetime
+
+from backup_database import BACKUP_DIR, DB_PATH, check_integrity, online_backup
+
+DIFF_DIR = os.path.join(BACKUP_DIR, 'differential')
+BLOCK_PAGES = 16    # database pages per stored block (64 KB with 4 KB pages)
+KEEP_SNAPSHOTS = 60
+
+
+def blocks_dir(diff_dir):
+    return os.path.join(diff_dir, 'blocks')
+
+
+def snapshots_dir(diff_dir):
+    return os.path.join(diff_dir, 'snapshots')
+
+
+def block_path(diff_dir, digest):
+    return os.path.join(blocks_dir(diff_dir), digest[:2], digest)
+
+
+def _main_file_is_snapshot(db_path):
+    """Checkpoint the WAL into the main file; True when every committed frame made it.
+
+    Called with a read transaction open: the checkpoint cannot copy frames
+    newer than that reader's snapshot, so if it leaves nothing behind the
+    main file holds exactly the snapshot, and stays so until the read ends.
+    Needs write access to the database; any failure means False.
+    """
+    try:
+        conn = sqlite3.connect(db_path, timeout=1)
+        try:
+            _, log_frames, checkpointed = conn.execute('PRAGMA wal_checkpoint(PASSIVE)').fetchone()
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        return False
+    return log_frames == checkpointed
+
+
+@contextmanager
+def consistent_file(db_path, tmp_dir):
+    """Yield a path whose bytes are a consistent snapshot of db_path.
+
+    A read transaction is held while the path is in use. In rollback-journal
+    mode its SHARED lock stops writers from changing the file. In WAL mode
+    the WAL is checkpointed (PASSIVE, so writers are never waited on) and
+    the main file is used as is when the checkpoint caught up with the
+    read. Only when it could not (a writer committed in between, an older
+    reader holds frames back, or the file is read-only) is a full online
+    backup copy taken into tmp_dir, which costs a read and a write of the
+    whole database and as much free space.
+    """
+    conn = sqlite3.connect(f'file:{os.path.abspath(db_path)}?mode=ro', uri=True)
+    try:
+        wal = conn.execute('PRAGMA journal_mode').fetchone()[0].lower() == 'wal'
+        conn.execute('BEGIN')
+        conn.execute('SELECT COUNT(*) FROM sqlite_master').fetchone()
+        if not wal or _main_file_is_snapshot(db_path):
+            yield db_path
+            conn.rollback()
+        else:
+            conn.rollback()
+            fd, tmp_path = tempfile.mkstemp(suffix='.db', dir=tmp_dir)
+            os.close(fd)
+            try:
+                online_backup(db_path, tmp_path)
+                yield tmp_path
+            finally:
+                os.remove(tmp_path)
+    finally:
+        conn.close()
+
+
+def differential_backup(db_path=DB_PATH, diff_dir=DIFF_DIR, block_pages=BLOCK_PAGES,
+                        keep=KEEP_SNAPSHOTS):
+    """Back up the database as a manifest of content-addressed blocks.
+
+    The file is hashed in blocks of block_pages pages; only blocks not
+    already in the store are compressed and written, so a mostly unchanged
+    database costs little more than a read. Returns the manifest path.
+    """
+    if not os.path.exists(db_path):
+        print("Database file not found")
+        return
+
+    os.makedirs(snapshots_dir(diff_dir), exist_ok=True)
+    start = time.perf_counter()
+
+    conn = sqlite3.connect(f'file:{os.path.abspath(db_path)}?mode=ro', uri=True)
+    page_size = conn.execute('PRAGMA page_size').fetchone()[0]
+    conn.close()
+    block_size = page_size * block_pages
+
+    blocks = []
+    new_blocks = new_bytes = 0
+    with consistent_file(db_path, diff_dir) as path, open(path, 'rb') as db_file:
+        size = os.fstat(db_file.fileno()).st_size
+        while True:
+            data = db_file.read(block_size)
+            if not data:
+                break
+            digest = hashlib.blake2b(data, digest_size=20).hexdigest()
+            blocks.append(digest)
+            target = block_path(diff_dir, digest)
+            if not os.path.exists(target):
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                compressed = zlib.compress(data, 1)
+                with open(target + '.tmp', 'wb') as block_file:
+                    block_file.write(compressed)
+                os.replace(target + '.tmp', target)
+                new_blocks += 1
+                new_bytes += len(compressed)
+
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    manifest_path = os.path.join(snapshots_dir(diff_dir), f'picknpay_diff_{timestamp}.json')
+    with open(manifest_path, 'w', encoding='utf-8') as manifest_file:
+        json.dump({
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'source': os.path.abspath(db_path),
+            'size': size,
+            'page_size': page_size,
+            'block_size': block_size,
+            'blocks': blocks,
+        }, manifest_file)
+
+    print(f"Snapshot {manifest_path}: {len(blocks)} blocks, {new_blocks} new "
+          f"({new_bytes / 1024 / 1024:.1f} MB stored) in {time.perf_counter() - start:.2f}s")
+    if keep:
+        prune_snapshots(diff_dir, keep)
+    return manifest_path
+
+
+def list_snapshots(diff_dir=DIFF_DIR):
+    """Return manifest paths, oldest first"""
+    directory = snapshots_dir(diff_dir)
+    if not os.path.isdir(directory):
+        return []
+    return [os.path.join(directory, name) for name in sorted(os.listdir(directory))
+            if name.endswith('.json')]
+
+
+def load_manifest(manifest_path):
+    with open(manifest_path, encoding='utf-8') as manifest_file:
+        return json.load(manifest_file)
+
+
+def restore_snapshot(manifest_path, output_path):
+    """Rebuild the database file described by a snapshot manifest"""
+    manifest = load_manifest(manifest_path)
+    diff_dir = os.path.dirname(os.path.dirname(os.path.abspath(manifest_path)))
+
+    tmp_path = output_path + '.restoring'
+    with open(tmp_path, 'wb') as output:
+        for digest in manifest['blocks']:
+            with open(block_path(diff_dir, digest), 'rb') as block_file:
+                data = zlib.decompress(block_file.read())
+            if hashlib.blake2b(data, digest_size=20).hexdigest() != digest:
+                raise ValueError(f"Corrupt block {digest}")
+            output.write(data)
+
+    if os.path.getsize(tmp_path) != manifest['size'] or not check_integrity(tmp_path):
+        os.remove(tmp_path)
+        raise ValueError(f"Restored database failed verification: {manifest_path}")
+    os.replace(tmp_path, output_path)
+    print(f"Restored {manifest_path} to {output_path}")
+    return output_path
+
+
+def prune_snapshots(diff_dir=DIFF_DIR, keep=KEEP_SNAPSHOTS):
+    """Keep the newest `keep` snapshots and delete blocks no longer referenced"""
+    snapshots = list_snapshots(diff_dir)
+    for manifest_path in snapshots[:-keep]:
+        os.remove(manifest_path)
+
+    referenced = set()
+    for manifest_path in list_snapshots(diff_dir):
+        referenced.update(load_manifest(manifest_path)['blocks'])
+
+    removed = 0
+    for root, _, files in os.walk(blocks_dir(diff_dir)):
+        for name in files:
+            if name not in referenced:
+                os.remove(os.path.join(root, name))
+                removed += 1
+    return removed
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Differential page-level database backups')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    backup_parser = subparsers.add_parser('backup', help='take a differential snapshot')
+    backup_parser.add_argument('--db', default=DB_PATH, help='database file to back up')
+    backup_parser.add_argument('--dir', default=DIFF_DIR, help='differential backup directory')
+    backup_parser.add_argument('--block-pages', type=int, default=BLOCK_PAGES, help='pages per block')
+    backup_parser.add_argument('--keep', type=int, default=KEEP_SNAPSHOTS, help='snapshots to keep')
+
+    restore_parser = subparsers.add_parser('restore', help='rebuild a snapshot')
+    restore_parser.add_argument('snapshot', nargs='?', help='manifest to restore (default: latest)')
+    restore_parser.add_argument('--dir', default=DIFF_DIR, help='differential backup directory')
+    restore_parser.add_argument('--output', required=True, help='database file to write')
+
+    subparsers.add_parser('list', help='list snapshots').add_argument('--dir', default=DIFF_DIR)
+
+    args = parser.parse_args()
+    if args.command == 'backup':
+        differential_backup(args.db, args.dir, args.block_pages, args.keep)
+    elif args.command == 'restore':
+        snapshots = list_snapshots(args.dir)
+        snapshot = args.snapshot or (snapshots[-1] if snapshots else None)
+        if snapshot is None:
+            print("No snapshots found")
+        else:
+            restore_snapshot(snapshot, args.output)
+    else:
+        for manifest_path in list_snapshots(args.dir):
+            manifest = load_manifest(manifest_path)
+            print(f"{manifest_path}  {manifest['created']}  {manifest['size'] / 1024 / 1024:.1f} MB")
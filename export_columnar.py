@@ -0,0 +1,244 @@
+import sqlite3
+import argparse
+import json
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import numpy as np
+
+from utils.columnar import (DICTIONARY_COLUMNS, FORMAT_VERSION, MANIFEST_FILE, NAT, code_dtype,
+                            snapshot_dir)
+from utils.database_utils import database_fingerprint, enable_wal, read_snapshot, readonly_uri
+
+DB_PATH = 'database/picknpay.db'
+FETCH_SIZE = 50_000     # rows read per fetchmany call
+
+
+def quote_identifier(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def is_timestamp(name, declared):
+    declared = declared.upper()
+    return name.lower() == 'timestamp' or name.lower().endswith('_date') or 'DATE' in declared or 'TIME' in declared
+
+
+def plan_columns(conn, table):
+    """How each column of a table is stored, decided from its declared type and its data.
+
+    INTEGER columns are int64, or float64 with NaN when they hold NULLs (as
+    pandas reads them); REAL columns float64; the DICTIONARY_COLUMNS int
+    codes into a sorted dictionary (-1 for NULL); timestamps int64 epoch
+    seconds (NaT for NULL) when every value parses; any other text is
+    UTF-8 bytes with offsets. Returns (rows, specs).
+    """
+    quoted = quote_identifier(table)
+    info = [(row[1], row[2] or '') for row in conn.execute(f'PRAGMA table_info({quoted})')]
+    counts = []
+    for name, declared in info:
+        column = quote_identifier(name)
+        numeric = any(kind in declared.upper() for kind in ('INT', 'REAL', 'FLOA', 'DOUB', 'NUM', 'DEC'))
+        counts += [f'COUNT({column})',
+                   '0' if numeric else f'COALESCE(SUM(LENGTH(CAST({column} AS BLOB))), 0)',
+                   f"COUNT(strftime('%s', {column}))" if is_timestamp(name, declared) and not numeric else '0']
+    row = conn.execute(f"SELECT COUNT(*), {', '.join(counts)} FROM {quoted}").fetchone()
+    rows = row[0]
+
+    specs = []
+    for i, (name, declared) in enumerate(info):
+        non_null, text_bytes, parsed = row[1 + 3 * i:4 + 3 * i]
+        column = quote_identifier(name)
+        spec = {'name': name, 'declared': declared, 'nulls': rows - non_null, 'expression': column}
+        affinity = declared.upper()
+        if name.lower() in DICTIONARY_COLUMNS:
+            dictionary = [value for value, in conn.execute(
+                f'SELECT DISTINCT {column} FROM {quoted} WHERE {column} IS NOT NULL ORDER BY 1')]
+            spec.update(encoding='dictionary', dtype=code_dtype(len(dictionary)).str,
+                        dictionary=[str(value) for value in dictionary])
+        elif is_timestamp(name, declared) and parsed == non_null and non_null and 'INT' not in affinity:
+            spec.update(encoding='timestamp', dtype=np.dtype(np.int64).str,
+                        expression=f"CAST(strftime('%s', {column}) AS INTEGER)")
+        elif 'INT' in affinity:
+            spec.update(encoding='plain', dtype=np.dtype(np.float64 if spec['nulls'] else np.int64).str)
+        elif any(kind in affinity for kind in ('REAL', 'FLOA', 'DOUB', 'NUM', 'DEC')):
+            spec.update(encoding='plain', dtype=np.dtype(np.float64).str)
+        else:
+            spec.update(encoding='string', dtype=np.dtype(np.uint8).str, bytes=text_bytes)
+        specs.append(spec)
+    return rows, specs
+
+
+def _open_arrays(table_dir, rows, specs):
+    arrays = []
+    for spec in specs:
+        path = os.path.join(table_dir, spec['name'])
+        if spec['encoding'] == 'string':
+            arrays.append({
+                'offsets': np.lib.format.open_memmap(f'{path}.offsets.npy', 'w+', np.int64, (rows + 1,)),
+                'data': np.lib.format.open_memmap(f'{path}.data.npy', 'w+', np.uint8, (spec['bytes'],)),
+                'valid': np.lib.format.open_memmap(f'{path}.valid.npy', 'w+', np.bool_, (rows,))
+                if spec['nulls'] else None,
+            })
+        else:
+            arrays.append(np.lib.format.open_memmap(f'{path}.npy', 'w+', np.dtype(spec['dtype']), (rows,)))
+    return arrays
+
+
+def _write_columns(conn, table, table_dir, fetch_size):
+    """Plan and stream one table with conn, which must hold a read snapshot"""
+    rows, specs = plan_columns(conn, table)
+    os.makedirs(table_dir, exist_ok=True)
+    arrays = _open_arrays(table_dir, rows, specs)
+    indexes = [{value: code for code, value in enumerate(spec['dictionary'])}
+               if spec['encoding'] == 'dictionary' else None for spec in specs]
+    text_offsets = [0] * len(specs)
+    for array in arrays:
+        if isinstance(array, dict):
+            array['offsets'][0] = 0
+
+    cursor = conn.execute(f"SELECT {', '.join(spec['expression'] for spec in specs)} "
+                          f"FROM {quote_identifier(table)}")
+    position = 0
+    while True:
+        batch = cursor.fetchmany(fetch_size)
+        if not batch:
+            break
+        end = position + len(batch)
+        for i, (spec, values) in enumerate(zip(specs, zip(*batch))):
+            if spec['encoding'] == 'dictionary':
+                arrays[i][position:end] = [indexes[i].get(None if value is None else str(value), -1)
+                                           for value in values]
+            elif spec['encoding'] == 'timestamp':
+                arrays[i][position:end] = [NAT if value is None else value for value in values]
+            elif spec['encoding'] == 'plain':
+                arrays[i][position:end] = np.array(values, dtype=np.float64 if spec['nulls'] else None
+                                                   ).astype(arrays[i].dtype, copy=False)
+            else:
+                encoded = [b'' if value is None else
+                           value if isinstance(value, bytes) else str(value).encode('utf-8') for value in values]
+                lengths = np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded))
+                ends = text_offsets[i] + np.cumsum(lengths)
+                arrays[i]['offsets'][position + 1:end + 1] = ends
+                chunk = b''.join(encoded)
+                arrays[i]['data'][text_offsets[i]:text_offsets[i] + len(chunk)] = np.frombuffer(chunk, np.uint8)
+                text_offsets[i] += len(chunk)
+                if arrays[i]['valid'] is not None:
+                    arrays[i]['valid'][position:end] = [value is not None for value in values]
+        position = end
+
+    for array in arrays:
+        for mapped in (array.values() if isinstance(array, dict) else [array]):
+            if mapped is not None:
+                mapped.flush()
+    del arrays
+    for spec in specs:
+        spec.pop('expression')
+        spec.pop('bytes', None)
+    return {'rows': rows, 'columns': specs}
+
+
+def write_table_columns(db_path, table, table_dir, fetch_size=FETCH_SIZE):
+    """Stream one table into a directory of column files; returns its manifest entry.
+
+    Columns are written into preallocated memory-mapped .npy files, one
+    fetchmany batch at a time, so memory use does not grow with the table.
+    The row count and sizes that the files are allocated from and the rows
+    streamed into them are read in one transaction, so a concurrent append
+    cannot overflow them.
+    """
+    conn = sqlite3.connect(readonly_uri(db_path), uri=True)
+    try:
+        with read_snapshot(conn):
+            return _write_columns(conn, table, table_dir, fetch_size)
+    finally:
+        conn.close()
+
+
+def export_columnar(db_path=DB_PATH, output_dir=None, workers=1, fetch_size=FETCH_SIZE):
+    """Export every table of a database as a columnar snapshot of .npy files.
+
+    The snapshot is a directory (<db>.columns by default) with one
+    sub-directory per table, one typed array per column and a
+    manifest.json describing the encodings. It is written next to the
+    final directory and swapped in when complete, so readers never see a
+    half-written snapshot. With one worker every table is read from one
+    snapshot of the database. With workers > 1 tables are exported in
+    parallel by a process pool, each from its own snapshot, so tables can
+    be read at different moments if the database is written meanwhile;
+    the fingerprint check at the end then leaves the snapshot unused until
+    it is re-exported. Returns the manifest.
+    """
+    if not os.path.exists(db_path):
+        print("Database file not found")
+        return
+
+    output_dir = output_dir or snapshot_dir(db_path)
+    # Switching the journal mode rewrites the header, so do it before the
+    # fingerprint is taken rather than leave it to a later writer
+    enable_wal(db_path)
+    fingerprint = database_fingerprint(db_path)
+    conn = sqlite3.connect(readonly_uri(db_path), uri=True)
+    try:
+        tables = [name for name, in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite\\_%' ESCAPE '\\' ORDER BY rowid")]
+    finally:
+        conn.close()
+
+    tmp_dir = output_dir + '.tmp'
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    print(f"🧱 Exporting {len(tables)} tables of {db_path} to {output_dir}...")
+    start = time.perf_counter()
+    try:
+        table_dirs = [os.path.join(tmp_dir, table) for table in tables]
+        if workers > 1 and len(tables) > 1:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                entries = list(executor.map(write_table_columns, [db_path] * len(tables), tables, table_dirs,
+                                            [fetch_size] * len(tables)))
+        else:
+            conn = sqlite3.connect(readonly_uri(db_path), uri=True)
+            try:
+                with read_snapshot(conn):
+                    entries = [_write_columns(conn, table, table_dir, fetch_size)
+                               for table, table_dir in zip(tables, table_dirs)]
+            finally:
+                conn.close()
+
+        manifest = {
+            'version': FORMAT_VERSION,
+            'source': os.path.abspath(db_path),
+            'fingerprint': fingerprint,
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'tables': dict(zip(tables, entries)),
+        }
+        with open(os.path.join(tmp_dir, MANIFEST_FILE), 'w', encoding='utf-8') as manifest_file:
+            json.dump(manifest, manifest_file, indent=2)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+    # Processes still mapping the old snapshot keep reading their (unlinked) files
+    old_dir = output_dir + '.old'
+    shutil.rmtree(old_dir, ignore_errors=True)
+    if os.path.exists(output_dir):
+        os.replace(output_dir, old_dir)
+    os.replace(tmp_dir, output_dir)
+    shutil.rmtree(old_dir, ignore_errors=True)
+
+    if database_fingerprint(db_path) != fingerprint:
+        print("⚠️  The database changed during the export; the snapshot will not be used until it is re-exported")
+    for table, entry in manifest['tables'].items():
+        print(f"   {table}: {entry['rows']:,} rows, {len(entry['columns'])} columns")
+    print(f"✅ Snapshot written in {time.perf_counter() - start:.2f}s")
+    return manifest
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Export every table of the database as memory-mappable columns')
+    parser.add_argument('--db', default=DB_PATH, help='database file to export')
+    parser.add_argument('--output', help='snapshot directory (default: <db>.columns)')
+    parser.add_argument('--workers', type=int, default=1, help='export tables in parallel')
+    args = parser.parse_args()
+    export_columnar(args.db, args.output, args.workers)
@@ -1,55 +1,195 @@
-import sqlite3
-import os
-from datetime import datetime
-
-def export_database_to_sql():
-    """Export database to SQL file"""
-    if not os.path.exists('database/picknpay.db'):
-        print("Database file not found")
-        return
-    
-    conn = sqlite3.connect('database/picknpay.db')
-    cursor = conn.cursor()
-    
-    with open('database/picknpay.sql', 'w', encoding='utf-8') as sql_file:
-        sql_file.write(f'-- Pick n Pay Database Export\n')
-        sql_file.write(f'-- Generated: {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}\n\n')
-        
-        # Get all tables
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
-        tables = cursor.fetchall()
-        
-        for table in tables:
-            table_name = table[0]
-            if table_name == 'sqlite_sequence':
-                continue
-                
-            # Write table schema
-            cursor.execute(f"SELECT sql FROM sqlite_master WHERE type='table' AND name='{table_name}';")
-            schema = cursor.fetchone()[0]
-            sql_file.write(f'{schema};\n\n')
-            
-            # Write table data
-            cursor.execute(f"SELECT * FROM {table_name};")
-            rows = cursor.fetchall()
-            
-            if rows:
-                sql_file.write(f'-- Data for {table_name}\n')
-                for row in rows:
-                    values = []
-                    for value in row:
-                        if value is None:
-                            values.append('NULL')
-                        elif isinstance(value, str):
-                            values.append(f"'{value.replace("'", "''")}'")
-                        else:
-                            values.append(str(value))
-                    
-                    sql_file.write(f"INSERT INTO {table_name} VALUES ({', '.join(values)});\n")
-                sql_file.write('\n')
-    
-    conn.close()
-    print("Database exported to database/picknpay.sql")
-
-if __name__ == '__main__':
-    export_database_to_sql()
\ No newline at end of file
+import sqlite3
+import argparse
+import gzip
+import io
+import math
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+try:
+    import zstandard
+except ImportError:  # optional, only needed for --compress zstd
+    zstandard = None
+
+DB_PATH = 'database/picknpay.db'
+SQL_PATH = 'database/picknpay.sql'
+
+BATCH_SIZE = 500    # rows per multi-row INSERT statement
+FETCH_SIZE = 5000   # rows read per fetchmany call
+
+COMPRESSION_SUFFIXES = {None: '', 'gzip': '.gz', 'zstd': '.zst'}
+
+
+def quote_identifier(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def format_value(value):
+    """Render a Python value as an SQL literal"""
+    if value is None:
+        return 'NULL'
+    if isinstance(value, float) and not math.isfinite(value):
+        # SQLite has no inf/nan literals: overflowing reals read back as
+        # +-Inf, and NaN is stored as NULL anyway
+        return 'NULL' if math.isnan(value) else '9e999' if value > 0 else '-9e999'
+    if isinstance(value, str):
+        return "'" + value.replace("'", "''") + "'"
+    if isinstance(value, bytes):
+        return f"X'{value.hex()}'"
+    return str(value)
+
+
+def open_output(path, compression=None, mode='wt'):
+    """Open a (possibly compressed) text or binary stream for writing"""
+    if compression == 'gzip':
+        return gzip.open(path, mode, encoding='utf-8' if 't' in mode else None)
+    if compression == 'zstd':
+        if zstandard is None:
+            raise RuntimeError("zstd compression requires the 'zstandard' package")
+        raw = zstandard.ZstdCompressor().stream_writer(open(path, 'wb'))
+        return io.TextIOWrapper(raw, encoding='utf-8') if 't' in mode else raw
+    if compression is not None:
+        raise ValueError(f"Unknown compression: {compression}")
+    return open(path, mode, encoding='utf-8' if 't' in mode else None)
+
+
+def list_schema(cursor):
+    """Return (tables, post_data) where post_data holds index, view and trigger SQL"""
+    cursor.execute("""SELECT name, sql FROM sqlite_master
+                      WHERE type='table' AND name NOT LIKE 'sqlite\\_%' ESCAPE '\\'
+                      ORDER BY rowid""")
+    tables = cursor.fetchall()
+
+    # Indexes, views and triggers are created after the data is loaded.
+    # Automatic indexes (sql IS NULL) come back with their tables.
+    cursor.execute("""SELECT type, name, sql FROM sqlite_master
+                      WHERE type IN ('index', 'view', 'trigger') AND sql IS NOT NULL
+                      ORDER BY CASE type WHEN 'index' THEN 0 WHEN 'view' THEN 1 ELSE 2 END, rowid""")
+    post_data = cursor.fetchall()
+    return tables, post_data
+
+
+def write_table_data(cursor, sql_file, table_name, batch_size=BATCH_SIZE, fetch_size=FETCH_SIZE):
+    """Stream a table with fetchmany, writing multi-row INSERT statements.
+
+    Only one fetch and one batch are held in memory at a time. Returns the
+    number of rows written.
+    """
+    quoted = quote_identifier(table_name)
+    cursor.execute(f"SELECT * FROM {quoted};")
+
+    rows_written = 0
+    batch = []
+    while True:
+        rows = cursor.fetchmany(fetch_size)
+        if not rows:
+            break
+        for row in rows:
+            batch.append('(' + ', '.join(map(format_value, row)) + ')')
+            if len(batch) >= batch_size:
+                if not rows_written:
+                    sql_file.write(f'-- Data for {table_name}\n')
+                sql_file.write(f"INSERT INTO {quoted} VALUES\n" + ',\n'.join(batch) + ';\n')
+                rows_written += len(batch)
+                batch = []
+
+    if batch:
+        if not rows_written:
+            sql_file.write(f'-- Data for {table_name}\n')
+        sql_file.write(f"INSERT INTO {quoted} VALUES\n" + ',\n'.join(batch) + ';\n')
+        rows_written += len(batch)
+    if rows_written:
+        sql_file.write('\n')
+    return rows_written
+
+
+def export_table_part(db_path, table_name, part_path, batch_size, fetch_size, compression):
+    """Export one table's data into its own part file (runs in a worker process)"""
+    conn = sqlite3.connect(f'file:{os.path.abspath(db_path)}?mode=ro', uri=True)
+    try:
+        with open_output(part_path, compression) as part_file:
+            rows = write_table_data(conn.cursor(), part_file, table_name, batch_size, fetch_size)
+    finally:
+        conn.close()
+    return rows
+
+
+def export_database_to_sql(db_path=DB_PATH, output_path=SQL_PATH, batch_size=BATCH_SIZE,
+                           compression=None, workers=1, fetch_size=FETCH_SIZE):
+    """Export database to SQL file
+
+    Tables are streamed with fetchmany into multi-row INSERT batches, so
+    memory use does not grow with the database. With workers > 1 each
+    table is exported into a separate part by a process pool and the parts
+    are concatenated in order (gzip members and zstd frames concatenate
+    into a valid stream). Returns the path that was written.
+    """
+    if not os.path.exists(db_path):
+        print("Database file not found")
+        return
+
+    output_path += COMPRESSION_SUFFIXES[compression]
+    conn = sqlite3.connect(f'file:{os.path.abspath(db_path)}?mode=ro', uri=True)
+    cursor = conn.cursor()
+    tables, post_data = list_schema(cursor)
+
+    header = (f'-- Pick n Pay Database Export\n'
+              f'-- Generated: {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}\n\n'
+              'PRAGMA foreign_keys=OFF;\nBEGIN TRANSACTION;\n\n')
+    header += ''.join(f'{schema};\n\n' for _, schema in tables)
+
+    footer = ''.join(f'-- {obj_type.capitalize()}: {name}\n{sql};\n\n' for obj_type, name, sql in post_data)
+    footer += 'COMMIT;\n'
+
+    row_counts = {}
+    if workers > 1 and len(tables) > 1:
+        conn.close()
+        part_paths = [f'{output_path}.part{i:03d}' for i in range(len(tables))]
+        try:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = [
+                    pool.submit(export_table_part, db_path, table_name, part_path,
+                                batch_size, fetch_size, compression)
+                    for (table_name, _), part_path in zip(tables, part_paths)
+                ]
+                for (table_name, _), future in zip(tables, futures):
+                    row_counts[table_name] = future.result()
+
+            with open(output_path, 'wb') as sql_file:
+                with open_output(output_path + '.head', compression) as part:
+                    part.write(header)
+                with open_output(output_path + '.tail', compression) as part:
+                    part.write(footer)
+                for part_path in [output_path + '.head'] + part_paths + [output_path + '.tail']:
+                    with open(part_path, 'rb') as part:
+                        shutil.copyfileobj(part, sql_file)
+        finally:
+            for part_path in part_paths + [output_path + '.head', output_path + '.tail']:
+                if os.path.exists(part_path):
+                    os.remove(part_path)
+    else:
+        with open_output(output_path, compression) as sql_file:
+            sql_file.write(header)
+            for table_name, _ in tables:
+                row_counts[table_name] = write_table_data(
+                    cursor, sql_file, table_name, batch_size, fetch_size
+                )
+            sql_file.write(footer)
+        conn.close()
+
+    for table_name, rows in row_counts.items():
+        print(f"   {table_name}: {rows} rows")
+    print(f"Database exported to {output_path}")
+    return output_path
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Export the database to an SQL file')
+    parser.add_argument('--db', default=DB_PATH, help='database file to export')
+    parser.add_argument('--output', default=SQL_PATH, help='SQL file to write')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='rows per INSERT statement')
+    parser.add_argument('--compress', choices=['gzip', 'zstd'], help='compress the output as it is written')
+    parser.add_argument('--workers', type=int, default=1, help='export tables in parallel')
+    args = parser.parse_args()
+    export_database_to_sql(args.db, args.output, args.batch_size, args.compress, args.workers)
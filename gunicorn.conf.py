@@ -0,0 +1,34 @@
+import multiprocessing
+import os
+import time
+
+# Read by app.py so cold start is measured from the master's start
+os.environ.setdefault('APP_BOOT_STARTED', str(time.time()))
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+
+# The app (and any warmed analytics data) is loaded once in the master and
+# shared copy-on-write by the forked workers
+preload_app = True
+workers = int(os.environ.get('WEB_CONCURRENCY') or min(multiprocessing.cpu_count() * 2 + 1, 8))
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS') or 4)
+timeout = int(os.environ.get('GUNICORN_TIMEOUT') or 120)   # large uploads and first dataset loads
+graceful_timeout = 30
+keepalive = 5
+max_requests = 2000                    # recycle workers to bound memory growth
+max_requests_jitter = 200
+accesslog = '-'
+loglevel = os.environ.get('LOG_LEVEL', 'info')
+
+
+def when_ready(server):
+    boot = server.app.wsgi().extensions['boot']
+    server.log.info("Cold start %.2fs (app ready at %.2fs, %d databases warmed), starting %d workers",
+                    time.time() - boot['started'], boot['app_ready_seconds'], len(boot['warmed']), workers)
+
+
+def post_fork(server, worker):
+    # Never reuse a SQLite handle opened before the fork
+    from utils.database_utils import pool
+    pool.close_all()
@@ -0,0 +1,204 @@
+import sqlite3
+import argparse
+import gzip
+import io
+import os
+import re
+import time
+
+try:
+    import zstandard
+except ImportError:  # optional, only needed for .zst dumps
+    zstandard = None
+
+DB_PATH = 'database/picknpay.db'
+SQL_PATH = 'database/picknpay.sql'
+
+BATCH_BYTES = 4 * 1024 * 1024   # SQL text per grouped INSERT statement
+COMMIT_ROWS = 500_000           # rows per transaction
+PROGRESS_SECONDS = 5
+
+# Pragmas used while loading; the database is rebuilt from scratch, so
+# durability during the load does not matter.
+BULK_LOAD_PRAGMAS = [
+    'PRAGMA journal_mode = OFF',
+    'PRAGMA synchronous = OFF',
+    'PRAGMA cache_size = -262144',  # 256 MB
+    'PRAGMA temp_store = MEMORY',
+    'PRAGMA locking_mode = EXCLUSIVE',
+    'PRAGMA foreign_keys = OFF',
+]
+FINAL_PRAGMAS = [
+    'PRAGMA journal_mode = DELETE',
+    'PRAGMA synchronous = FULL',
+    'PRAGMA locking_mode = NORMAL',
+]
+
+INSERT_RE = re.compile(
+    r'\s*INSERT\s+INTO\s+("(?:[^"]|"")+"|\'(?:[^\']|\'\')+\'|[\w.]+)\s*VALUES\s*', re.IGNORECASE
+)
+DEFERRED_RE = re.compile(r'\s*CREATE\s+(?:UNIQUE\s+)?(?:INDEX|VIEW|TRIGGER|TEMP\s+VIEW)\b', re.IGNORECASE)
+SKIPPED_RE = re.compile(r'\s*(?:BEGIN|COMMIT|END|ROLLBACK|PRAGMA)\b', re.IGNORECASE)
+
+
+def open_input(path):
+    """Open a plain, gzip or zstd SQL dump as a text stream.
+
+    Returns (text stream, raw file) so progress can be read from the raw
+    file position.
+    """
+    raw = open(path, 'rb')
+    magic = raw.read(4)
+    raw.seek(0)
+    if magic[:2] == b'\x1f\x8b':
+        stream = gzip.GzipFile(fileobj=raw)
+    elif magic == b'\x28\xb5\x2f\xfd':
+        if zstandard is None:
+            raise RuntimeError("zstd dumps require the 'zstandard' package")
+        stream = zstandard.ZstdDecompressor().stream_reader(raw, read_across_frames=True)
+    else:
+        stream = raw
+    return io.TextIOWrapper(io.BufferedReader(stream) if stream is not raw else stream,
+                            encoding='utf-8'), raw
+
+
+def iter_statements(sql_file):
+    """Yield complete SQL statements from a stream, one at a time"""
+    buffer = []
+    for line in sql_file:
+        if not buffer and (not line.strip() or line.startswith('--')):
+            continue
+        buffer.append(line)
+        if line.rstrip().endswith(';'):
+            statement = ''.join(buffer)
+            if sqlite3.complete_statement(statement):
+                yield statement
+                buffer = []
+    if buffer and ''.join(buffer).strip():
+        yield ''.join(buffer)
+
+
+class BulkLoader:
+    """Group consecutive INSERT rows for a table into large statements.
+
+    Row tuples are handed to SQLite as text: joining the VALUES lists of
+    many INSERTs into one statement lets SQLite's own parser do the work,
+    which is several times faster than parsing literals in Python and
+    feeding executemany.
+    """
+
+    def __init__(self, conn, batch_bytes=BATCH_BYTES, commit_rows=COMMIT_ROWS):
+        self.conn = conn
+        self.batch_bytes = batch_bytes
+        self.commit_rows = commit_rows
+        self.table = None
+        self.values = []
+        self.size = 0
+        self.committed_rows = 0
+
+    @property
+    def total_rows(self):
+        return self.conn.total_changes
+
+    def add(self, table, values_sql):
+        if table != self.table:
+            self.flush()
+            self.table = table
+        self.values.append(values_sql)
+        self.size += len(values_sql)
+        if self.size >= self.batch_bytes:
+            self.flush()
+
+    def flush(self):
+        if self.values:
+            self.conn.execute(f'INSERT INTO {self.table} VALUES ' + ',\n'.join(self.values))
+            self.values = []
+            self.size = 0
+        if self.total_rows - self.committed_rows >= self.commit_rows:
+            self.conn.commit()
+            self.committed_rows = self.total_rows
+
+
+def import_sql_to_database(sql_path=SQL_PATH, db_path=DB_PATH, replace=False,
+                           batch_bytes=BATCH_BYTES, commit_rows=COMMIT_ROWS):
+    """Restore a database from an SQL dump written by export_to_sql.py
+
+    The dump is read as a stream and consecutive INSERT rows are grouped
+    into large statements and transactions under bulk-load pragmas. Indexes,
+    views and triggers are created once all data is in. The database is
+    built under a temporary name and moved into place when complete.
+    Returns the number of rows loaded.
+    """
+    if not os.path.exists(sql_path):
+        print("SQL file not found")
+        return
+    if os.path.exists(db_path) and not replace:
+        print(f"{db_path} already exists (use --replace to overwrite)")
+        return
+
+    tmp_path = db_path + '.importing'
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+
+    conn = sqlite3.connect(tmp_path, isolation_level=None)
+    for pragma in BULK_LOAD_PRAGMAS:
+        conn.execute(pragma)
+    conn.isolation_level = ''
+    loader = BulkLoader(conn, batch_bytes, commit_rows)
+    deferred = []
+
+    sql_file, raw = open_input(sql_path)
+    total_bytes = os.path.getsize(sql_path)
+    start = last_report = time.perf_counter()
+    try:
+        for statement in iter_statements(sql_file):
+            insert = INSERT_RE.match(statement)
+            if insert:
+                loader.add(insert.group(1), statement[insert.end():].rstrip().rstrip(';'))
+            elif DEFERRED_RE.match(statement):
+                deferred.append(statement)
+            elif not SKIPPED_RE.match(statement):
+                loader.flush()
+                conn.execute(statement)
+
+            now = time.perf_counter()
+            if now - last_report >= PROGRESS_SECONDS:
+                last_report = now
+                rows = loader.total_rows
+                print(f"   {raw.tell() / total_bytes:6.1%} read, {rows:,} rows, "
+                      f"{rows / (now - start):,.0f} rows/sec")
+
+        loader.flush()
+        conn.commit()
+        load_seconds = time.perf_counter() - start
+        rows = loader.total_rows
+
+        print(f"   Creating {len(deferred)} indexes, views and triggers...")
+        for statement in deferred:
+            conn.execute(statement)
+        conn.commit()
+
+        conn.isolation_level = None
+        for pragma in FINAL_PRAGMAS:
+            conn.execute(pragma)
+    finally:
+        sql_file.close()
+        conn.close()
+
+    os.replace(tmp_path, db_path)
+    elapsed = time.perf_counter() - start
+    print(f"Imported {rows:,} rows into {db_path} in {elapsed:.2f}s "
+          f"({rows / load_seconds if load_seconds else 0:,.0f} rows/sec loading, "
+          f"{elapsed - load_seconds:.2f}s building indexes)")
+    return rows
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Restore the database from an SQL dump')
+    parser.add_argument('--sql', default=SQL_PATH, help='SQL dump to import (.sql, .sql.gz or .sql.zst)')
+    parser.add_argument('--db', default=DB_PATH, help='database file to create')
+    parser.add_argument('--replace', action='store_true', help='overwrite an existing database')
+    parser.add_argument('--batch-mb', type=int, default=BATCH_BYTES // (1024 * 1024),
+                        help='SQL text per grouped INSERT statement, in MB')
+    args = parser.parse_args()
+    import_sql_to_database(args.sql, args.db, args.replace, args.batch_mb * 1024 * 1024)
@@ -1,133 +1,289 @@
-import sqlite3
-from datetime import datetime, timedelta
-import random
-import os
-from werkzeug.security import generate_password_hash
-import names
-from faker import Faker
-
-def init_database():
-    os.makedirs('database', exist_ok=True)
-    
-    conn = sqlite3.connect('database/picknpay.db')
-    c = conn.cursor()
-    
-    # Drop existing tables
-    c.execute('DROP TABLE IF EXISTS transaction_items')
-    c.execute('DROP TABLE IF EXISTS transactions')
-    c.execute('DROP TABLE IF EXISTS customers')
-    c.execute('DROP TABLE IF EXISTS products')
-    
-    # Create tables
-    c.execute('''CREATE TABLE products (
-                 id INTEGER PRIMARY KEY,
-                 name TEXT NOT NULL,
-                 category TEXT NOT NULL,
-                 price REAL NOT NULL,
-                 supplier TEXT,
-                 barcode TEXT UNIQUE)''')
-    
-    c.execute('''CREATE TABLE customers (
-                 id INTEGER PRIMARY KEY,
-                 name TEXT NOT NULL,
-                 gender TEXT,
-                 age_group TEXT,
-                 location TEXT,
-                 loyalty_tier TEXT,
-                 email TEXT,
-                 join_date TEXT)''')
-    
-    c.execute('''CREATE TABLE transactions (
-                 id INTEGER PRIMARY KEY,
-                 customer_id INTEGER NOT NULL,
-                 timestamp TEXT NOT NULL,
-                 total_amount REAL NOT NULL,
-                 payment_method TEXT,
-                 store_id INTEGER,
-                 FOREIGN KEY(customer_id) REFERENCES customers(id))''')
-    
-    c.execute('''CREATE TABLE transaction_items (
-                 id INTEGER PRIMARY KEY,
-                 transaction_id INTEGER NOT NULL,
-                 product_id INTEGER NOT NULL,
-                 quantity INTEGER NOT NULL,
-                 unit_price REAL NOT NULL,
-                 discount REAL DEFAULT 0,
-                 FOREIGN KEY(transaction_id) REFERENCES transactions(id),
-                 FOREIGN KEY(product_id) REFERENCES products(id))''')
-    
-    # Generate sample data
-    fake = Faker()
-    
-    # Products
-    products = []
-    categories = {
-        'Bakery': ['Bread', 'Croissant', 'Muffins'],
-        'Dairy': ['Milk', 'Cheese', 'Yogurt'],
-        'Beverages': ['Coke', 'Juice', 'Water']
-    }
-    
-    product_id = 1
-    for category, items in categories.items():
-        for item in items:
-            price = round(random.uniform(1.0, 10.0), 2)
-            products.append((product_id, f'{item}', category, price, fake.company(), fake.ean13()))
-            product_id += 1
-    
-    c.executemany('INSERT INTO products VALUES (?,?,?,?,?,?)', products)
-    
-    # Customers
-    customers = []
-    for i in range(1, 101):
-        gender = random.choice(['Male', 'Female'])
-        name = names.get_full_name(gender=gender.lower())
-        customers.append((
-            i, name, gender, random.choice(['18-25', '26-35', '36-45']),
-            random.choice(['Johannesburg', 'Cape Town']),
-            random.choice(['Bronze', 'Silver', 'Gold']),
-            fake.email(), fake.date_between(start_date='-2y', end_date='today').strftime('%Y-%m-%d')
-        ))
-    
-    c.executemany('INSERT INTO customers VALUES (?,?,?,?,?,?,?,?)', customers)
-    
-    # Transactions
-    transaction_id = 1
-    for day in range(60):  # Last 60 days
-        current_date = datetime.now() - timedelta(days=60 - day - 1)
-        daily_transactions = random.randint(50, 100)
-        
-        for _ in range(daily_transactions):
-            customer_id = random.randint(1, 100)
-            timestamp = current_date.replace(
-                hour=random.randint(8, 20),
-                minute=random.randint(0, 59)
-            ).strftime('%Y-%m-%d %H:%M:%S')
-            
-            c.execute('INSERT INTO transactions VALUES (?,?,?,?,?,?)',
-                     (transaction_id, customer_id, timestamp, 0, 
-                      random.choice(['Cash', 'Card']), 1))
-            
-            # Transaction items
-            total = 0
-            items_count = random.randint(1, 5)
-            selected_products = random.sample(products, min(items_count, len(products)))
-            
-            for product in selected_products:
-                quantity = random.randint(1, 3)
-                unit_price = product[3]
-                item_total = quantity * unit_price
-                total += item_total
-                
-                c.execute('INSERT INTO transaction_items VALUES (?,?,?,?,?,?)',
-                         (None, transaction_id, product[0], quantity, unit_price, 0))
-            
-            c.execute('UPDATE transactions SET total_amount=? WHERE id=?', 
-                     (round(total, 2), transaction_id))
-            transaction_id += 1
-    
-    conn.commit()
-    conn.close()
-    print("Sample database created successfully!")
-
-if __name__ == '__main__':
-    init_database()
\ No newline at end of file
+import sqlite3
+import argparse
+from datetime import datetime, timedelta
+import bisect
+import random
+import os
+import names
+from faker import Faker
+
+from schema_migrations import date_key, migrate_date_keys
+from shard_generation import generate_sharded, plan_shards, record_units
+
+DB_PATH = 'database/picknpay.db'
+
+TRANSACTION_COLUMNS = ['id', 'customer_id', 'timestamp', 'total_amount', 'payment_method', 'store_id',
+                       'date_key', 'hour_key']
+ITEM_COLUMNS = ['id', 'transaction_id', 'product_id', 'quantity', 'unit_price', 'discount']
+
+def create_tables(c):
+    # Drop existing tables
+    c.execute('DROP TABLE IF EXISTS transaction_items')
+    c.execute('DROP TABLE IF EXISTS transactions')
+    c.execute('DROP TABLE IF EXISTS customers')
+    c.execute('DROP TABLE IF EXISTS products')
+
+    # Create tables
+    c.execute('''CREATE TABLE products (
+                 id INTEGER PRIMARY KEY,
+                 name TEXT NOT NULL,
+                 category TEXT NOT NULL,
+                 price REAL NOT NULL,
+                 supplier TEXT,
+                 barcode TEXT UNIQUE)''')
+
+    c.execute('''CREATE TABLE customers (
+                 id INTEGER PRIMARY KEY,
+                 name TEXT NOT NULL,
+                 gender TEXT,
+                 age_group TEXT,
+                 location TEXT,
+                 loyalty_tier TEXT,
+                 email TEXT,
+                 join_date TEXT)''')
+
+    c.execute('''CREATE TABLE transactions (
+                 id INTEGER PRIMARY KEY,
+                 customer_id INTEGER NOT NULL,
+                 timestamp TEXT NOT NULL,
+                 total_amount REAL NOT NULL,
+                 payment_method TEXT,
+                 store_id INTEGER,
+                 date_key INTEGER,
+                 hour_key INTEGER,
+                 FOREIGN KEY(customer_id) REFERENCES customers(id))''')
+
+    c.execute('''CREATE TABLE transaction_items (
+                 id INTEGER PRIMARY KEY,
+                 transaction_id INTEGER NOT NULL,
+                 product_id INTEGER NOT NULL,
+                 quantity INTEGER NOT NULL,
+                 unit_price REAL NOT NULL,
+                 discount REAL DEFAULT 0,
+                 FOREIGN KEY(transaction_id) REFERENCES transactions(id),
+                 FOREIGN KEY(product_id) REFERENCES products(id))''')
+
+_name_tables = {}
+
+def random_name(rng, kind):
+    """names.get_name() for one of names.FILES, drawing from rng instead of the global random module"""
+    if kind not in _name_tables:
+        cumulative, values = [], []
+        with open(names.FILES[kind]) as name_file:
+            for line in name_file:
+                name, _, total, _ = line.split()
+                cumulative.append(float(total))
+                values.append(name.capitalize())
+        _name_tables[kind] = cumulative, values
+    cumulative, values = _name_tables[kind]
+    position = bisect.bisect_right(cumulative, rng.random() * 90)
+    return values[position] if position < len(values) else ''
+
+def generate_reference_data(seed):
+    """Generate products and customers, reproducibly for a given seed"""
+    rng = random.Random(seed)
+    fake = Faker()
+    fake.seed_instance(seed)
+
+    # Products
+    products = []
+    categories = {
+        'Bakery': ['Bread', 'Croissant', 'Muffins'],
+        'Dairy': ['Milk', 'Cheese', 'Yogurt'],
+        'Beverages': ['Coke', 'Juice', 'Water']
+    }
+
+    product_id = 1
+    for category, items in categories.items():
+        for item in items:
+            price = round(rng.uniform(1.0, 10.0), 2)
+            products.append((product_id, f'{item}', category, price, fake.company(), fake.ean13()))
+            product_id += 1
+
+    # Customers
+    customers = []
+    for i in range(1, 101):
+        gender = rng.choice(['Male', 'Female'])
+        name = f"{random_name(rng, 'first:' + gender.lower())} {random_name(rng, 'last')}"
+        customers.append((
+            i, name, gender, rng.choice(['18-25', '26-35', '36-45']),
+            rng.choice(['Johannesburg', 'Cape Town']),
+            rng.choice(['Bronze', 'Silver', 'Gold']),
+            fake.email(), fake.date_between(start_date='-2y', end_date='today').strftime('%Y-%m-%d')
+        ))
+
+    return products, customers
+
+def generate_day(seed, day, products, transaction_id=1, item_id=1):
+    """Generate one day of transactions from a random stream keyed by (seed, day)"""
+    rng = random.Random(f'{seed}:{day.isoformat()}')
+    transactions = []
+    items = []
+    daily_transactions = rng.randint(50, 100)
+
+    for _ in range(daily_transactions):
+        customer_id = rng.randint(1, 100)
+        hour = rng.randint(8, 20)
+        timestamp = day.replace(
+            hour=hour,
+            minute=rng.randint(0, 59)
+        ).strftime('%Y-%m-%d %H:%M:%S')
+        payment_method = rng.choice(['Cash', 'Card'])
+
+        # Transaction items
+        total = 0
+        items_count = rng.randint(1, 5)
+        selected_products = rng.sample(products, min(items_count, len(products)))
+
+        for product in selected_products:
+            quantity = rng.randint(1, 3)
+            unit_price = product[3]
+            item_total = quantity * unit_price
+            total += item_total
+
+            items.append((item_id, transaction_id, product[0], quantity, unit_price, 0))
+            item_id += 1
+
+        transactions.append((transaction_id, customer_id, timestamp, round(total, 2), payment_method, 1,
+                             date_key(day), hour))
+        transaction_id += 1
+
+    return transactions, items
+
+def insert_day(c, transactions, items):
+    c.executemany('INSERT INTO transactions VALUES (?,?,?,?,?,?,?,?)', transactions)
+    c.executemany('INSERT INTO transaction_items VALUES (?,?,?,?,?,?)', items)
+
+def generate_shard(shard_path, seed, days, store_ids, products):
+    """Generate the transactions for a run of days into a shard database"""
+    conn = sqlite3.connect(shard_path)
+    c = conn.cursor()
+    create_tables(c)
+
+    transaction_id = item_id = 1
+    units = []
+    for day in days:
+        transactions, items = generate_day(seed, day, products, transaction_id, item_id)
+        insert_day(c, transactions, items)
+        units.append((day.date().isoformat(), 0, transaction_id, len(transactions), item_id, len(items)))
+        transaction_id += len(transactions)
+        item_id += len(items)
+
+    record_units(conn, units)
+    conn.commit()
+    conn.close()
+    return transaction_id - 1 + item_id - 1
+
+def init_database(seed=None, workers=1, end_date=None, db_path=DB_PATH, n_days=60):
+    """Create the sample database with the last n_days days of transactions.
+
+    The same seed and end_date always give the same data, whether the days
+    are generated in one process or split into shards across workers.
+    """
+    if seed is None:
+        seed = random.randrange(2**32)
+    end_date = (end_date or datetime.now()).replace(hour=0, minute=0, second=0, microsecond=0)
+
+    os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+
+    conn = sqlite3.connect(db_path)
+    c = conn.cursor()
+    create_tables(c)
+
+    # Generate sample data
+    products, customers = generate_reference_data(seed)
+    c.executemany('INSERT INTO products VALUES (?,?,?,?,?,?)', products)
+    c.executemany('INSERT INTO customers VALUES (?,?,?,?,?,?,?,?)', customers)
+
+    # Transactions
+    days = [end_date - timedelta(days=n_days - day - 1) for day in range(n_days)]  # Last 60 days by default
+    if workers > 1:
+        conn.commit()
+        shards = plan_shards(days, [[1]], workers)
+        generate_sharded(
+            conn, generate_shard,
+            [(seed, shard_days, shard_stores, products) for shard_days, shard_stores in shards],
+            workers,
+            ('transactions', TRANSACTION_COLUMNS, 'transaction_items', ITEM_COLUMNS, 'id'),
+            os.path.dirname(os.path.abspath(db_path))
+        )
+    else:
+        transaction_id = item_id = 1
+        for day in days:
+            transactions, items = generate_day(seed, day, products, transaction_id, item_id)
+            insert_day(c, transactions, items)
+            transaction_id += len(transactions)
+            item_id += len(items)
+
+    conn.commit()
+    migrate_date_keys(conn)
+    conn.execute('PRAGMA journal_mode = WAL')
+    conn.close()
+    print(f"Sample database created successfully! (seed {seed})")
+    return seed
+
+def append_days(seed=None, db_path=DB_PATH, end_date=None, n_days=None, start_date=None):
+    """Add days to an existing sample database instead of recreating it.
+
+    Resumes on the day after MAX(timestamp) with the next transaction and
+    item ids, using the products already in the database. Days run from
+    start_date (default: the resume day) to end_date, or for n_days, or up
+    to today; days already present are skipped, so re-running for the same
+    range adds nothing. All new rows are committed in one transaction.
+    Returns the number of transactions added.
+    """
+    if not os.path.exists(db_path):
+        raise FileNotFoundError(f"{db_path} does not exist; run init_db.py first")
+    if seed is None:
+        seed = random.randrange(2**32)
+
+    conn = sqlite3.connect(db_path)
+    c = conn.cursor()
+    try:
+        # Databases from before the date_key/hour_key columns get them first
+        migrate_date_keys(conn)
+        last_timestamp, transaction_id = c.execute(
+            'SELECT MAX(timestamp), COALESCE(MAX(id), 0) + 1 FROM transactions').fetchone()
+        item_id = c.execute('SELECT COALESCE(MAX(id), 0) + 1 FROM transaction_items').fetchone()[0]
+        products = c.execute('SELECT * FROM products ORDER BY id').fetchall()
+
+        resume = datetime.strptime(last_timestamp[:10], '%Y-%m-%d') + timedelta(days=1) if last_timestamp \
+            else datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        first_day = start_date or resume
+        if end_date is None:
+            end_date = first_day + timedelta(days=n_days - 1) if n_days else datetime.now()
+        end_date = end_date.replace(hour=0, minute=0, second=0, microsecond=0)
+        day = max(first_day, resume)
+
+        added = 0
+        while day <= end_date:
+            transactions, items = generate_day(seed, day, products, transaction_id, item_id)
+            insert_day(c, transactions, items)
+            transaction_id += len(transactions)
+            item_id += len(items)
+            added += len(transactions)
+            day += timedelta(days=1)
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    print(f"Appended {added} transactions to {db_path} (seed {seed})")
+    return added
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Create the sample Pick n Pay database')
+    parser.add_argument('--seed', type=int, help='random seed for reproducible output')
+    parser.add_argument('--workers', type=int, default=1, help='generate shards in this many processes')
+    parser.add_argument('--days', type=int, help='number of days of transactions (default: 60)')
+    parser.add_argument('--append', action='store_true',
+                        help='add days to the existing database, through --until or today')
+    parser.add_argument('--start', type=datetime.fromisoformat,
+                        help='with --append: first day to add (default: day after the last)')
+    parser.add_argument('--until', type=datetime.fromisoformat, help='with --append: last day to add')
+    args = parser.parse_args()
+    if args.append:
+        append_days(args.seed, end_date=args.until, n_days=args.days, start_date=args.start)
+    else:
+        init_database(args.seed, args.workers, n_days=args.days or 60)
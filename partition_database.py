@@ -0,0 +1,177 @@
+import sqlite3
+import argparse
+import json
+import os
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from urllib.parse import quote
+
+from rollups import create_rollups, refresh_rollups
+from utils.database_utils import database_fingerprint, readonly_uri
+
+PARTITION_SUFFIX = '.partitions'        # default output: <db>.partitions/
+CATALOG_FILE = 'catalog.json'
+
+# Base tables, matched case-insensitively so both generator layouts work.
+# Reference tables are copied whole; sales tables are split by store_id.
+REFERENCE_TABLES = ('customers', 'products')
+TRANSACTIONS_TABLE = 'transactions'
+ITEMS_TABLE = 'transaction_items'
+
+
+def partition_dir(db_path):
+    return os.path.abspath(db_path) + PARTITION_SUFFIX
+
+
+def partition_file(store_id):
+    return f'store_{store_id}.db'
+
+
+def read_schema(conn):
+    """Physical table names and the CREATE statements to copy into each partition.
+
+    Returns (tables, table_sql, index_sql): tables maps the lower-case base
+    table name to its real name; indexes and triggers are created after
+    the rows are loaded.
+    """
+    tables = {}
+    table_sql = []
+    index_sql = []
+    base = REFERENCE_TABLES + (TRANSACTIONS_TABLE, ITEMS_TABLE)
+    for kind, name, tbl_name, sql in conn.execute(
+            "SELECT type, name, tbl_name, sql FROM sqlite_master WHERE sql IS NOT NULL ORDER BY rowid"):
+        if tbl_name.lower() not in base:
+            continue
+        if kind == 'table':
+            tables[name.lower()] = name
+            table_sql.append(sql)
+        elif kind in ('index', 'trigger'):
+            index_sql.append(sql)
+    missing = [table for table in base if table not in tables]
+    if missing:
+        raise ValueError(f"Cannot partition: missing tables {', '.join(missing)}")
+    columns = [row[1].lower() for row in conn.execute(f'PRAGMA table_info({tables[TRANSACTIONS_TABLE]})')]
+    if 'store_id' not in columns:
+        raise ValueError("Cannot partition: Transactions has no store_id column")
+    return tables, table_sql, index_sql
+
+
+def build_partition(db_path, out_dir, store_id, schema, with_rollups):
+    """Write one store's rows (and whole reference tables) to its own database file"""
+    tables, table_sql, index_sql = schema
+    final_path = os.path.join(out_dir, partition_file(store_id))
+    tmp_path = final_path + '.tmp'
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    start = time.perf_counter()
+    # Opened as a URI so that ATTACH takes one; the path is percent-encoded like readonly_uri's
+    conn = sqlite3.connect(f'file:{quote(os.path.abspath(tmp_path))}', uri=True)
+    try:
+        conn.execute('ATTACH DATABASE ? AS src', (readonly_uri(db_path),))
+        for sql in table_sql:
+            conn.execute(sql)
+        for table in REFERENCE_TABLES:
+            conn.execute(f'INSERT INTO main.{tables[table]} SELECT * FROM src.{tables[table]}')
+        tx, items = tables[TRANSACTIONS_TABLE], tables[ITEMS_TABLE]
+        conn.execute(f'INSERT INTO main.{tx} SELECT * FROM src.{tx} WHERE store_id IS ? ORDER BY id', (store_id,))
+        # CROSS JOIN keeps the store's few transactions as the outer loop;
+        # left to itself the planner may scan every source item instead
+        conn.execute(f'''INSERT INTO main.{items}
+                         SELECT ti.* FROM main.{tx} t CROSS JOIN src.{items} ti ON ti.transaction_id = t.id''')
+        for sql in index_sql:
+            conn.execute(sql)
+        conn.commit()
+        conn.execute('DETACH DATABASE src')
+        if with_rollups:
+            create_rollups(conn)
+            refresh_rollups(conn)
+        transactions, first, last = conn.execute(
+            f'SELECT COUNT(*), MIN(timestamp), MAX(timestamp) FROM {tx}').fetchone()
+        conn.execute('ANALYZE')
+        conn.commit()
+    finally:
+        conn.close()
+    os.replace(tmp_path, final_path)
+
+    return {
+        'store_id': store_id,
+        'path': partition_file(store_id),
+        'transactions': transactions,
+        'first_timestamp': first,
+        'last_timestamp': last,
+        'bytes': os.path.getsize(final_path),
+        'seconds': round(time.perf_counter() - start, 3),
+    }
+
+
+def partition_database(db_path, out_dir=None, workers=None):
+    """Split a database into one SQLite file per store_id plus a catalog.
+
+    Each partition holds one store's Transactions and Transaction_Items
+    with their original ids, full copies of Customers and Products, the
+    same indexes and triggers, and its own rollups when the source has
+    them. Partitions are written by a thread pool (SQLite releases the GIL
+    while it works). catalog.json lists them and is written last, so a
+    half-built directory is never picked up. It also records the source's
+    fingerprint and highest transaction id, taken before the partitions
+    are read, so readers can tell when the source has moved on. Returns
+    the catalog.
+    """
+    out_dir = out_dir or partition_dir(db_path)
+    os.makedirs(out_dir, exist_ok=True)
+
+    fingerprint = database_fingerprint(db_path)
+    conn = sqlite3.connect(readonly_uri(db_path), uri=True)
+    try:
+        schema = read_schema(conn)
+        tx = schema[0][TRANSACTIONS_TABLE]
+        max_id = conn.execute(f'SELECT COALESCE(MAX(id), 0) FROM {tx}').fetchone()[0]
+        store_ids = [row[0] for row in conn.execute(f'SELECT DISTINCT store_id FROM {tx} ORDER BY store_id')]
+        with_rollups = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'Rollup_State'").fetchone() is not None
+    finally:
+        conn.close()
+
+    print(f"🗂️  Partitioning {db_path} into {len(store_ids)} store databases in {out_dir}...")
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers or min(len(store_ids), os.cpu_count() or 1) or 1) as executor:
+        partitions = list(executor.map(
+            lambda store_id: build_partition(db_path, out_dir, store_id, schema, with_rollups), store_ids))
+
+    catalog = {
+        'source': os.path.abspath(db_path),
+        'source_fingerprint': fingerprint,
+        'max_transaction_id': max_id,
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'partitions': partitions,
+    }
+    catalog_path = os.path.join(out_dir, CATALOG_FILE)
+    with open(catalog_path + '.tmp', 'w', encoding='utf-8') as catalog_file:
+        json.dump(catalog, catalog_file, indent=2)
+    os.replace(catalog_path + '.tmp', catalog_path)
+
+    # Partitions of stores that are no longer in the source
+    current = {partition['path'] for partition in partitions}
+    for name in os.listdir(out_dir):
+        if name.startswith('store_') and name.endswith('.db') and name not in current:
+            os.remove(os.path.join(out_dir, name))
+
+    total = sum(partition['transactions'] for partition in partitions)
+    print(f"✅ {len(partitions)} partitions, {total:,} transactions in {time.perf_counter() - start:.2f}s")
+    print(f"📒 Catalog: {catalog_path}")
+    return catalog
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Split a database into one SQLite file per store')
+    parser.add_argument('db', nargs='?', default='picknpay_zimbabwe.db', help='database file')
+    parser.add_argument('--output', help='partition directory (default: <db>.partitions)')
+    parser.add_argument('--workers', type=int, help='partitions written in parallel (default: CPU count)')
+    parser.add_argument('--clean', action='store_true', help='remove the partition directory first')
+    args = parser.parse_args()
+
+    if args.clean:
+        shutil.rmtree(args.output or partition_dir(args.db), ignore_errors=True)
+    partition_database(args.db, args.output, args.workers)
@@ -0,0 +1,252 @@
+import sqlite3
+import argparse
+
+from schema_migrations import migrate_date_keys, table_columns
+
+# Per-day rollups behind the analytic views, so dashboard queries scale with
+# the number of days rather than the number of line items.
+ROLLUP_TABLES_SQL = '''
+CREATE TABLE IF NOT EXISTS Daily_Store_Sales (
+    sale_date TEXT NOT NULL,
+    store_id INTEGER NOT NULL,
+    transaction_count INTEGER NOT NULL,
+    total_revenue REAL NOT NULL,
+    PRIMARY KEY (sale_date, store_id)
+);
+
+CREATE TABLE IF NOT EXISTS Daily_Category_Sales (
+    sale_date TEXT NOT NULL,
+    store_id INTEGER NOT NULL,
+    category TEXT NOT NULL,
+    total_quantity INTEGER NOT NULL,
+    total_revenue REAL NOT NULL,
+    PRIMARY KEY (sale_date, store_id, category)
+);
+
+CREATE TABLE IF NOT EXISTS Daily_Customer_Sales (
+    sale_date TEXT NOT NULL,
+    store_id INTEGER NOT NULL,
+    customer_id INTEGER,
+    transaction_count INTEGER NOT NULL,
+    total_spent REAL NOT NULL,
+    last_purchase TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_daily_customer_sales_date ON Daily_Customer_Sales(sale_date, store_id);
+CREATE INDEX IF NOT EXISTS idx_daily_customer_sales_customer ON Daily_Customer_Sales(customer_id);
+
+-- Distinct customers cannot be added up across days, so they are kept per month
+CREATE TABLE IF NOT EXISTS Monthly_Store_Customers (
+    month TEXT NOT NULL,
+    store_id INTEGER NOT NULL,
+    customer_id INTEGER NOT NULL,
+    PRIMARY KEY (month, store_id, customer_id)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS Daily_Product_Sales (
+    sale_date TEXT NOT NULL,
+    product_id INTEGER NOT NULL,
+    total_quantity INTEGER NOT NULL,
+    total_revenue REAL NOT NULL,
+    line_count INTEGER NOT NULL,
+    PRIMARY KEY (sale_date, product_id)
+);
+
+CREATE TABLE IF NOT EXISTS Rollup_State (
+    name TEXT PRIMARY KEY,
+    last_transaction_id INTEGER NOT NULL
+);
+'''
+
+# The analytic views, re-expressed on top of the rollups. Column names and
+# meanings are unchanged. A product appears at most once per transaction
+# (the Transaction_Items primary key), so COUNT(DISTINCT transaction_id)
+# is the number of item lines.
+ROLLUP_VIEWS_SQL = '''
+CREATE VIEW Customer_Purchase_Summary AS
+SELECT
+    c.id AS customer_id,
+    c.name,
+    c.location,
+    c.loyalty_tier,
+    COALESCE(SUM(d.transaction_count), 0) AS total_transactions,
+    SUM(d.total_spent) AS total_spent,
+    SUM(d.total_spent) / SUM(d.transaction_count) AS avg_transaction_value,
+    MAX(d.last_purchase) AS last_purchase_date
+FROM Customers c
+LEFT JOIN Daily_Customer_Sales d ON c.id = d.customer_id
+GROUP BY c.id, c.name, c.location, c.loyalty_tier;
+
+CREATE VIEW Product_Sales_Performance AS
+SELECT
+    p.id AS product_id,
+    p.name,
+    p.category,
+    SUM(d.total_quantity) AS total_quantity_sold,
+    SUM(d.total_revenue) AS total_revenue,
+    SUM(d.line_count) AS transaction_count,
+    SUM(d.total_quantity) * 1.0 / SUM(d.line_count) AS avg_quantity_per_transaction
+FROM Products p
+JOIN Daily_Product_Sales d ON p.id = d.product_id
+GROUP BY p.id, p.name, p.category;
+
+CREATE VIEW Monthly_Sales_Analysis AS
+SELECT
+    s.month,
+    s.store_id,
+    s.transaction_count,
+    s.total_revenue,
+    s.total_revenue / s.transaction_count as avg_transaction_value,
+    COALESCE(u.unique_customers, 0) as unique_customers
+FROM (
+    SELECT substr(sale_date, 1, 7) as month,
+           store_id,
+           SUM(transaction_count) as transaction_count,
+           SUM(total_revenue) as total_revenue
+    FROM Daily_Store_Sales
+    GROUP BY substr(sale_date, 1, 7), store_id
+) s
+LEFT JOIN (
+    SELECT month, store_id, COUNT(*) as unique_customers
+    FROM Monthly_Store_Customers
+    GROUP BY month, store_id
+) u ON u.month = s.month AND u.store_id = s.store_id;
+
+CREATE VIEW Seasonal_Product_Performance AS
+SELECT
+    category,
+    substr(sale_date, 1, 7) as month,
+    SUM(total_quantity) as total_quantity,
+    SUM(total_revenue) as total_revenue
+FROM Daily_Category_Sales
+GROUP BY category, substr(sale_date, 1, 7)
+ORDER BY month, total_revenue DESC;
+'''
+
+ROLLUP_VIEWS = ['Customer_Purchase_Summary', 'Product_Sales_Performance',
+                'Monthly_Sales_Analysis', 'Seasonal_Product_Performance']
+ROLLUP_TABLES = ['Daily_Store_Sales', 'Daily_Category_Sales', 'Daily_Customer_Sales',
+                 'Monthly_Store_Customers', 'Daily_Product_Sales']
+WATERMARK = 'daily_rollups'
+
+# Recompute the rollups for the days listed in temp.rollup_days. Days are
+# matched on the integer date_key, so the date_key indexes are used. The
+# distinct customers of every (month, store) that had or has transactions
+# on those days are recounted over the whole month, since a refreshed day
+# can also remove a customer from it.
+REFRESH_SQL = [
+    '''INSERT OR IGNORE INTO temp.rollup_groups
+       SELECT DISTINCT substr(sale_date, 1, 7), store_id
+       FROM Daily_Store_Sales WHERE sale_date IN (SELECT day FROM temp.rollup_days)''',
+    '''INSERT OR IGNORE INTO temp.rollup_groups
+       SELECT DISTINCT substr(r.day, 1, 7), t.store_id
+       FROM temp.rollup_days r
+       JOIN Transactions t ON t.date_key = r.day_key''',
+    'DELETE FROM Daily_Store_Sales WHERE sale_date IN (SELECT day FROM temp.rollup_days)',
+    'DELETE FROM Daily_Category_Sales WHERE sale_date IN (SELECT day FROM temp.rollup_days)',
+    'DELETE FROM Daily_Customer_Sales WHERE sale_date IN (SELECT day FROM temp.rollup_days)',
+    'DELETE FROM Daily_Product_Sales WHERE sale_date IN (SELECT day FROM temp.rollup_days)',
+    'DELETE FROM Monthly_Store_Customers WHERE (month, store_id) IN (SELECT month, store_id FROM temp.rollup_groups)',
+    '''INSERT INTO Daily_Store_Sales
+       SELECT r.day, t.store_id, COUNT(*), SUM(t.total_amount)
+       FROM temp.rollup_days r
+       JOIN Transactions t ON t.date_key = r.day_key
+       GROUP BY 1, 2''',
+    '''INSERT INTO Daily_Customer_Sales
+       SELECT r.day, t.store_id, t.customer_id,
+              COUNT(*), SUM(t.total_amount), MAX(t.timestamp)
+       FROM temp.rollup_days r
+       JOIN Transactions t ON t.date_key = r.day_key
+       GROUP BY 1, 2, 3''',
+    '''INSERT INTO Monthly_Store_Customers
+       SELECT DISTINCT g.month, g.store_id, t.customer_id
+       FROM temp.rollup_groups g
+       JOIN Transactions t ON t.store_id = g.store_id
+        AND t.date_key BETWEEN CAST(replace(g.month, '-', '') AS INTEGER) * 100 + 1
+                           AND CAST(replace(g.month, '-', '') AS INTEGER) * 100 + 31
+       WHERE t.customer_id IS NOT NULL''',
+    '''INSERT INTO Daily_Category_Sales
+       SELECT r.day, t.store_id, p.category,
+              SUM(ti.quantity), SUM(ti.quantity * ti.unit_price)
+       FROM temp.rollup_days r
+       JOIN Transactions t ON t.date_key = r.day_key
+       JOIN Transaction_Items ti ON ti.transaction_id = t.id
+       JOIN Products p ON p.id = ti.product_id
+       GROUP BY 1, 2, 3''',
+    '''INSERT INTO Daily_Product_Sales
+       SELECT r.day, ti.product_id,
+              SUM(ti.quantity), SUM(ti.quantity * ti.unit_price), COUNT(*)
+       FROM temp.rollup_days r
+       JOIN Transactions t ON t.date_key = r.day_key
+       JOIN Transaction_Items ti ON ti.transaction_id = t.id
+       GROUP BY 1, 2''',
+]
+
+
+def create_rollups(conn):
+    """Create the rollup tables and (re)create the analytic views on top of them"""
+    if 'date_key' not in table_columns(conn, 'Transactions'):
+        migrate_date_keys(conn)
+    conn.executescript(ROLLUP_TABLES_SQL)
+    for view in ROLLUP_VIEWS:
+        conn.execute(f'DROP VIEW IF EXISTS {view}')
+    conn.executescript(ROLLUP_VIEWS_SQL)
+
+
+def refresh_rollups(conn, days=None):
+    """Bring the rollups up to date with Transactions.
+
+    Days that received transactions with ids above the stored watermark are
+    recomputed from the base tables. Updates and deletes do not move the
+    watermark, so pass the days they touched as `days` (YYYY-MM-DD strings)
+    to recompute them as well. Items must be inserted together with
+    their transaction for the refresh to see them. Returns the number of
+    days refreshed.
+    """
+    row = conn.execute('SELECT last_transaction_id FROM Rollup_State WHERE name = ?',
+                       (WATERMARK,)).fetchone()
+    watermark = row[0] if row else 0
+    max_id = conn.execute('SELECT COALESCE(MAX(id), 0) FROM Transactions').fetchone()[0]
+
+    conn.execute('CREATE TEMP TABLE IF NOT EXISTS rollup_days (day_key INTEGER PRIMARY KEY, day TEXT)')
+    conn.execute('CREATE TEMP TABLE IF NOT EXISTS rollup_groups (month TEXT, store_id INTEGER, '
+                 'PRIMARY KEY (month, store_id))')
+    conn.execute('DELETE FROM temp.rollup_days')
+    conn.execute('DELETE FROM temp.rollup_groups')
+    conn.execute('''INSERT OR IGNORE INTO temp.rollup_days
+                    SELECT DISTINCT date_key, substr(timestamp, 1, 10) FROM Transactions WHERE id > ?''',
+                 (watermark,))
+    if days:
+        conn.executemany('INSERT OR IGNORE INTO temp.rollup_days VALUES (?, ?)',
+                         [(int(d.replace('-', '')), d) for d in days])
+
+    refreshed = conn.execute('SELECT COUNT(*) FROM temp.rollup_days').fetchone()[0]
+    for statement in REFRESH_SQL:
+        conn.execute(statement)
+    conn.execute('INSERT OR REPLACE INTO Rollup_State (name, last_transaction_id) VALUES (?, ?)',
+                 (WATERMARK, max_id))
+    conn.execute('DELETE FROM temp.rollup_days')
+    conn.execute('DELETE FROM temp.rollup_groups')
+    conn.commit()
+    return refreshed
+
+
+def rebuild_rollups(conn):
+    """Recompute every rollup from scratch"""
+    conn.execute('DELETE FROM Rollup_State WHERE name = ?', (WATERMARK,))
+    for table in ROLLUP_TABLES:
+        conn.execute(f'DELETE FROM {table}')
+    return refresh_rollups(conn)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Refresh the daily rollup tables')
+    parser.add_argument('db', nargs='?', default='picknpay_zimbabwe.db', help='database file')
+    parser.add_argument('--rebuild', action='store_true', help='recompute all days')
+    parser.add_argument('--day', action='append', help='also recompute this YYYY-MM-DD day (repeatable)')
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db)
+    create_rollups(conn)
+    days = rebuild_rollups(conn) if args.rebuild else refresh_rollups(conn, args.day)
+    conn.close()
+    print(f"Refreshed rollups for {days} days")
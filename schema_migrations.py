@@ -0,0 +1,95 @@
+import sqlite3
+import argparse
+
+# SQLite table names are case-insensitive, so these statements work for both
+# the init_db.py schema (transactions / transaction_items) and the
+# create_picknpay_db.py schema (Transactions / Transaction_Items).
+
+BACKFILL_BATCH = 50_000
+
+DATE_KEY_SQL = "CAST(strftime('%Y%m%d', timestamp) AS INTEGER)"
+HOUR_KEY_SQL = "CAST(strftime('%H', timestamp) AS INTEGER)"
+
+# Covering indexes for time-range queries: range filters on date_key and
+# the common group-bys are answered from the index alone.
+COVERING_INDEXES_SQL = '''
+CREATE INDEX IF NOT EXISTS idx_transactions_store_date ON Transactions(store_id, date_key, total_amount);
+CREATE INDEX IF NOT EXISTS idx_transactions_date_store ON Transactions(date_key, store_id, customer_id, total_amount);
+CREATE INDEX IF NOT EXISTS idx_transaction_items_product_covering ON Transaction_Items(product_id, transaction_id, quantity, unit_price);
+'''
+
+# Fill the keys for rows inserted by tools that do not know about them
+DATE_KEY_TRIGGER_SQL = f'''
+CREATE TRIGGER IF NOT EXISTS trg_transactions_date_key
+AFTER INSERT ON Transactions
+WHEN NEW.date_key IS NULL OR NEW.hour_key IS NULL
+BEGIN
+    UPDATE Transactions
+    SET date_key = {DATE_KEY_SQL}, hour_key = {HOUR_KEY_SQL}
+    WHERE id = NEW.id;
+END;
+'''
+
+
+def table_columns(conn, table):
+    return [row[1] for row in conn.execute(f'PRAGMA table_info({table})')]
+
+
+def date_key(day):
+    """Integer YYYYMMDD key for a date or datetime"""
+    return day.year * 10000 + day.month * 100 + day.day
+
+
+def migrate_date_keys(conn, batch_size=BACKFILL_BATCH, verbose=False):
+    """Add integer date_key/hour_key columns to Transactions and backfill them.
+
+    The backfill runs in id ranges of batch_size rows, committing after each,
+    so a large database is never locked for the whole migration. Safe to run
+    again: only rows with a missing key are updated. Returns the number of
+    rows backfilled.
+    """
+    columns = table_columns(conn, 'Transactions')
+    if 'date_key' not in columns:
+        conn.execute('ALTER TABLE Transactions ADD COLUMN date_key INTEGER')
+    if 'hour_key' not in columns:
+        conn.execute('ALTER TABLE Transactions ADD COLUMN hour_key INTEGER')
+    conn.commit()
+
+    low, high = conn.execute(
+        'SELECT MIN(id), MAX(id) FROM Transactions WHERE date_key IS NULL OR hour_key IS NULL'
+    ).fetchone()
+    updated = 0
+    if low is not None:
+        for start in range(low, high + 1, batch_size):
+            cursor = conn.execute(
+                f'''UPDATE Transactions
+                    SET date_key = {DATE_KEY_SQL}, hour_key = {HOUR_KEY_SQL}
+                    WHERE id >= ? AND id < ? AND (date_key IS NULL OR hour_key IS NULL)''',
+                (start, start + batch_size)
+            )
+            updated += cursor.rowcount
+            conn.commit()
+            if verbose:
+                print(f"   Backfilled {updated:,} rows...")
+
+    conn.executescript(DATE_KEY_TRIGGER_SQL)
+    create_covering_indexes(conn)
+    return updated
+
+
+def create_covering_indexes(conn):
+    """Create the date_key covering indexes and refresh planner statistics"""
+    conn.executescript(COVERING_INDEXES_SQL)
+    conn.execute('ANALYZE')
+    conn.commit()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Add integer date keys and covering indexes to a database')
+    parser.add_argument('db', help='database file to migrate')
+    parser.add_argument('--batch-size', type=int, default=BACKFILL_BATCH, help='rows per backfill batch')
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db)
+    rows = migrate_date_keys(conn, args.batch_size, verbose=True)
+    conn.close()
+    print(f"Migrated {args.db}: {rows} rows backfilled")
@@ -0,0 +1,163 @@
+import sqlite3
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import closing
+
+UNITS_TABLE = '_shard_units'
+
+
+def plan_shards(days, store_groups, workers, shards_per_worker=4):
+    """Split a date range and store groups into shards of whole generation units.
+
+    A unit is one day for one store group. Shards only decide which process
+    generates which units, so the data itself does not depend on the plan.
+    """
+    target = max(1, workers * shards_per_worker)
+    day_chunks = min(len(days), max(1, -(-target // len(store_groups))))
+    chunk_size = -(-len(days) // day_chunks)
+    shards = []
+    for start in range(0, len(days), chunk_size):
+        for stores in store_groups:
+            shards.append((days[start:start + chunk_size], stores))
+    return shards
+
+
+def record_units(conn, units):
+    """Store (day, block, first_id, tx_count, first_item_id, item_count) rows in a shard"""
+    conn.execute(f'''CREATE TABLE IF NOT EXISTS {UNITS_TABLE} (
+                     day TEXT NOT NULL,
+                     block INTEGER NOT NULL,
+                     first_id INTEGER NOT NULL,
+                     tx_count INTEGER NOT NULL,
+                     first_item_id INTEGER NOT NULL DEFAULT 0,
+                     item_count INTEGER NOT NULL DEFAULT 0)''')
+    conn.executemany(f'INSERT INTO {UNITS_TABLE} VALUES (?,?,?,?,?,?)', units)
+
+
+def _run_shard(task):
+    worker, path, args = task
+    start = time.perf_counter()
+    rows = worker(path, *args)
+    return os.getpid(), rows, time.perf_counter() - start
+
+
+def generate_shards(worker, shard_args, workers, tmp_dir):
+    """Run worker(path, *args) for every shard in a process pool.
+
+    Returns the shard paths in plan order and per-process statistics
+    {pid: [shards, rows, seconds]}.
+    """
+    paths = [os.path.join(tmp_dir, f'shard_{i:05d}.db') for i in range(len(shard_args))]
+    tasks = [(worker, path, args) for path, args in zip(paths, shard_args)]
+    stats = {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for pid, rows, seconds in pool.map(_run_shard, tasks):
+            worker_stats = stats.setdefault(pid, [0, 0, 0.0])
+            worker_stats[0] += 1
+            worker_stats[1] += rows
+            worker_stats[2] += seconds
+    return paths, stats
+
+
+def merge_shards(conn, shard_paths, transactions_table, transaction_columns,
+                 items_table, item_columns, item_id_column=None,
+                 first_id=1, first_item_id=1):
+    """Merge shard databases into conn with ATTACH + INSERT...SELECT.
+
+    Transaction ids (and item ids, when the items table has its own id
+    column) are remapped so units are numbered in (day, block) order. That is
+    the same numbering a single-process run produces, whatever the number
+    of shards. Returns (transactions, items) counts.
+    """
+    units = []
+    for shard, path in enumerate(shard_paths):
+        with closing(sqlite3.connect(path)) as shard_conn:
+            units += [
+                (day, block, shard, first, count, first_item, item_count)
+                for day, block, first, count, first_item, item_count in shard_conn.execute(
+                    f'SELECT day, block, first_id, tx_count, first_item_id, item_count FROM {UNITS_TABLE}'
+                )
+            ]
+    units.sort()
+
+    id_map = []
+    next_id, next_item_id = first_id, first_item_id
+    for day, block, shard, first, count, first_item, item_count in units:
+        id_map.append((shard, first, first + count - 1, next_id - first,
+                       first_item, first_item + item_count - 1, next_item_id - first_item))
+        next_id += count
+        next_item_id += item_count
+
+    conn.commit()
+    conn.execute('''CREATE TEMP TABLE shard_id_map (
+                    shard INTEGER, first_id INTEGER, last_id INTEGER, delta INTEGER,
+                    first_item_id INTEGER, last_item_id INTEGER, item_delta INTEGER)''')
+    conn.executemany('INSERT INTO temp.shard_id_map VALUES (?,?,?,?,?,?,?)', id_map)
+    conn.commit()
+
+    tx_select = ', '.join(
+        't.id + m.delta' if col == 'id' else f't.{col}' for col in transaction_columns
+    )
+    if item_id_column:
+        item_select = ', '.join(
+            f'ti.{col} + m.item_delta' if col == item_id_column
+            else 'ti.transaction_id + m.delta' if col == 'transaction_id'
+            else f'ti.{col}'
+            for col in item_columns
+        )
+        item_join = f'ti.{item_id_column} BETWEEN m.first_item_id AND m.last_item_id'
+    else:
+        item_select = ', '.join(
+            'ti.transaction_id + m.delta' if col == 'transaction_id' else f'ti.{col}'
+            for col in item_columns
+        )
+        item_join = 'ti.transaction_id BETWEEN m.first_id AND m.last_id'
+
+    for shard, path in enumerate(shard_paths):
+        conn.execute('ATTACH DATABASE ? AS shard', (path,))
+        conn.execute(f'''INSERT INTO main.{transactions_table} ({', '.join(transaction_columns)})
+                         SELECT {tx_select}
+                         FROM temp.shard_id_map AS m
+                         CROSS JOIN shard.{transactions_table} AS t
+                             ON t.id BETWEEN m.first_id AND m.last_id
+                         WHERE m.shard = ?''', (shard,))
+        conn.execute(f'''INSERT INTO main.{items_table} ({', '.join(item_columns)})
+                         SELECT {item_select}
+                         FROM temp.shard_id_map AS m
+                         CROSS JOIN shard.{items_table} AS ti
+                             ON {item_join}
+                         WHERE m.shard = ?''', (shard,))
+        conn.commit()
+        conn.execute('DETACH DATABASE shard')
+
+    conn.execute('DROP TABLE temp.shard_id_map')
+    return next_id - first_id, next_item_id - first_item_id
+
+
+def print_worker_report(stats, merge_seconds):
+    """Print rows/sec for every worker process and the merge time"""
+    print("⚙️  Shard generation:")
+    for n, (pid, (shards, rows, seconds)) in enumerate(sorted(stats.items()), start=1):
+        rate = rows / seconds if seconds else 0
+        print(f"   worker {n} (pid {pid}): {shards} shards, {rows:,} rows in {seconds:.2f}s ({rate:,.0f} rows/sec)")
+    print(f"   merge: {merge_seconds:.2f}s")
+
+
+def generate_sharded(conn, worker, shard_args, workers, merge_args, tmp_parent=None):
+    """Generate shards in a process pool, merge them into conn and clean up.
+
+    merge_args are passed to merge_shards after the shard paths. Temporary
+    shard files live next to the target database unless tmp_parent is given.
+    """
+    tmp_dir = tempfile.mkdtemp(prefix='shards_', dir=tmp_parent)
+    try:
+        paths, stats = generate_shards(worker, shard_args, workers, tmp_dir)
+        start = time.perf_counter()
+        counts = merge_shards(conn, paths, *merge_args)
+        print_worker_report(stats, time.perf_counter() - start)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return counts
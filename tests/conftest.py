@@ -0,0 +1,47 @@
+import os
+import sys
+from datetime import date
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from create_picknpay_db import create_database  # noqa: E402
+
+SEED = 1234
+
+
+def make_picknpay(path, workers=1, n_days=6):
+    """A small Pick n Pay database: 3 stores, 40 customers, n_days days"""
+    create_database(str(path), seed=SEED, n_stores=3, n_customers=40, n_days=n_days,
+                    start_date=date(2025, 7, 1), workers=workers)
+    return str(path)
+
+
+@pytest.fixture(scope='session')
+def picknpay_template(tmp_path_factory):
+    return make_picknpay(tmp_path_factory.mktemp('template') / 'picknpay.db')
+
+
+@pytest.fixture
+def picknpay_db(picknpay_template, tmp_path):
+    """A private copy of the sample database, safe to modify"""
+    import sqlite3
+    path = tmp_path / 'picknpay.db'
+    source = sqlite3.connect(picknpay_template)
+    target = sqlite3.connect(path)
+    source.backup(target)
+    target.execute('PRAGMA journal_mode = WAL')
+    source.close()
+    target.close()
+    return str(path)
+
+
+@pytest.fixture
+def init_db_database(tmp_path):
+    """A small database in the init_db.py layout (no indexes)"""
+    from datetime import datetime
+    from init_db import init_database
+    path = str(tmp_path / 'retail.db')
+    init_database(seed=SEED, end_date=datetime(2025, 3, 31), db_path=path, n_days=5)
+    return path
@@ -0,0 +1,37 @@
+import sqlite3
+
+import numpy as np
+import pytest
+
+from export_columnar import export_columnar
+from utils import analytics
+
+
+def _add_orphans(db_path):
+    with sqlite3.connect(db_path) as conn:
+        conn.execute('INSERT INTO Transaction_Items (transaction_id, product_id, quantity, unit_price) '
+                     'VALUES (999999, 1, 5, 10.0)')
+
+
+@pytest.mark.parametrize('snapshot', [False, True])
+def test_orphan_items_are_dropped(picknpay_db, snapshot):
+    before = analytics.load_sales_data(picknpay_db)
+    _add_orphans(picknpay_db)
+    if snapshot:
+        export_columnar(picknpay_db)
+    data = analytics.load_sales_data(picknpay_db)
+    assert data.orphan_items == 1
+    assert len(data.items) == len(before.items)
+    assert (data.items['transaction_id'] != 999999).all()
+    assert data.items['revenue'].sum() == pytest.approx(before.items['revenue'].sum())
+
+
+def test_cached_frames_are_read_only(picknpay_db):
+    _, data = analytics.get_sales_data(picknpay_db)
+    data.items['extra'] = 1
+    with pytest.raises(ValueError):
+        data.items['revenue'].to_numpy()[0] = -1.0
+    _, again = analytics.get_sales_data(picknpay_db)
+    assert 'extra' not in again.items
+    assert (again.items['revenue'].to_numpy() >= 0).all()
+    assert np.shares_memory(again.items['revenue'].to_numpy(), data.items['revenue'].to_numpy())
@@ -0,0 +1,55 @@
+import gzip
+import shutil
+import sqlite3
+
+from backup_database import backup_database
+from differential_backup import consistent_file, differential_backup, restore_snapshot
+
+
+def _dump(db_path):
+    with sqlite3.connect(db_path) as conn:
+        return {table: conn.execute(f'SELECT * FROM {table} ORDER BY 1, 2').fetchall()
+                for table in ('Customers', 'Transactions', 'Transaction_Items')}
+
+
+def test_backup_restores(picknpay_db, tmp_path):
+    backup = backup_database(picknpay_db, str(tmp_path / 'backups'), compression='gzip')
+    restored = str(tmp_path / 'restored.db')
+    with gzip.open(backup, 'rb') as source, open(restored, 'wb') as target:
+        shutil.copyfileobj(source, target)
+    assert _dump(restored) == _dump(picknpay_db)
+
+
+def test_differential_backup_includes_wal_commits(picknpay_db, tmp_path):
+    writer = sqlite3.connect(picknpay_db)
+    writer.execute('UPDATE Transactions SET total_amount = 0 WHERE id = 1')
+    writer.commit()
+    try:
+        manifest = differential_backup(picknpay_db, str(tmp_path / 'diffs'))
+        restored = restore_snapshot(manifest, str(tmp_path / 'restored.db'))
+        assert _dump(restored) == _dump(picknpay_db)
+    finally:
+        writer.close()
+
+
+def test_consistent_file_uses_checkpointed_main_file(picknpay_db, tmp_path):
+    writer = sqlite3.connect(picknpay_db)
+    writer.execute('UPDATE Transactions SET total_amount = 0 WHERE id = 1')
+    writer.commit()
+    try:
+        with consistent_file(picknpay_db, str(tmp_path)) as path:
+            assert path == picknpay_db
+
+        # An older reader keeps the next commit out of the main file, so a copy is taken
+        reader = sqlite3.connect(picknpay_db)
+        reader.execute('BEGIN')
+        reader.execute('SELECT COUNT(*) FROM Transactions').fetchone()
+        writer.execute('UPDATE Transactions SET total_amount = 1 WHERE id = 1')
+        writer.commit()
+        with consistent_file(picknpay_db, str(tmp_path)) as path:
+            assert path != picknpay_db
+            assert _dump(path) == _dump(picknpay_db)
+        reader.rollback()
+        reader.close()
+    finally:
+        writer.close()
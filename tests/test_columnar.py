@@ -0,0 +1,70 @@
+import sqlite3
+
+import pytest
+
+import export_columnar as export_columnar_module
+from export_columnar import export_columnar
+from utils import analytics
+from utils.columnar import find_snapshot
+from utils.database_utils import database_fingerprint, pool
+
+
+def test_snapshot_survives_loading(picknpay_db):
+    export_columnar(picknpay_db)
+    snapshot = find_snapshot(picknpay_db)
+    assert snapshot is not None
+
+    analytics.load_sales_data(picknpay_db)
+    pool.close_all()
+    assert find_snapshot(picknpay_db) is snapshot
+
+
+def test_snapshot_matches_sql(picknpay_db):
+    from_sql = analytics.load_sales_data(picknpay_db)
+    export_columnar(picknpay_db)
+    from_snapshot = analytics.load_sales_data(picknpay_db)
+    assert len(from_snapshot.items) == len(from_sql.items)
+    assert (from_snapshot.items['store_id'].to_numpy() == from_sql.items['store_id'].to_numpy()).all()
+    assert abs(from_snapshot.items['revenue'].sum() - from_sql.items['revenue'].sum()) < 1e-6
+
+
+def test_write_invalidates_snapshot_and_caches(picknpay_db):
+    export_columnar(picknpay_db)
+    before = analytics.store_performance(picknpay_db)
+    fingerprint = database_fingerprint(picknpay_db)
+
+    # Stays in the WAL until a checkpoint
+    writer = sqlite3.connect(picknpay_db)
+    writer.execute('UPDATE Transactions SET total_amount = total_amount + 1000 WHERE id = 1')
+    writer.commit()
+    try:
+        assert database_fingerprint(picknpay_db) != fingerprint
+        assert find_snapshot(picknpay_db) is None
+        after = analytics.store_performance(picknpay_db)
+        assert after['revenue'].sum() - before['revenue'].sum() == pytest.approx(1000)
+    finally:
+        writer.close()
+        pool.close_all()
+
+
+def test_append_after_planning_is_not_exported(picknpay_db, monkeypatch):
+    plan_columns = export_columnar_module.plan_columns
+    writer = sqlite3.connect(picknpay_db)
+    rows = writer.execute('SELECT COUNT(*) FROM Transactions').fetchone()[0]
+
+    def plan_then_append(conn, table):
+        planned = plan_columns(conn, table)
+        if table == 'Transactions':
+            last = writer.execute('SELECT * FROM Transactions ORDER BY id DESC LIMIT 1').fetchone()
+            writer.execute(f"INSERT INTO Transactions VALUES ({', '.join('?' * len(last))})",
+                           (last[0] + 1,) + last[1:])
+            writer.commit()
+        return planned
+
+    monkeypatch.setattr(export_columnar_module, 'plan_columns', plan_then_append)
+    try:
+        manifest = export_columnar(picknpay_db)
+        assert manifest['tables']['Transactions']['rows'] == rows
+        assert writer.execute('SELECT COUNT(*) FROM Transactions').fetchone()[0] == rows + 1
+    finally:
+        writer.close()
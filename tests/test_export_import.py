@@ -0,0 +1,34 @@
+import sqlite3
+
+import pytest
+
+from export_to_sql import export_database_to_sql, format_value
+from import_from_sql import import_sql_to_database
+
+
+def _dump(db_path):
+    with sqlite3.connect(db_path) as conn:
+        tables = [name for name, in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite\\_%' ESCAPE '\\' "
+            "ORDER BY name")]
+        return {table: sorted(conn.execute(f'SELECT * FROM "{table}"').fetchall(), key=repr) for table in tables}
+
+
+def test_special_floats():
+    assert format_value(float('inf')) == '9e999'
+    assert format_value(float('-inf')) == '-9e999'
+    assert format_value(float('nan')) == 'NULL'
+    assert format_value(0.1) == '0.1'
+
+
+@pytest.mark.parametrize('compression, workers', [(None, 1), ('gzip', 2)])
+def test_round_trip(picknpay_db, tmp_path, compression, workers):
+    with sqlite3.connect(picknpay_db) as conn:
+        conn.execute('CREATE TABLE sqliteXreadings (value REAL)')
+        conn.executemany('INSERT INTO sqliteXreadings VALUES (?)',
+                         [(float('inf'),), (float('-inf'),), (None,), (2.5,)])
+    dump = export_database_to_sql(picknpay_db, str(tmp_path / 'dump.sql'), compression=compression,
+                                  workers=workers)
+    restored = str(tmp_path / 'restored.db')
+    import_sql_to_database(dump, restored)
+    assert _dump(restored) == _dump(picknpay_db)
@@ -0,0 +1,73 @@
+import sqlite3
+
+from create_picknpay_db import append_database
+from tests.conftest import SEED, make_picknpay
+
+
+def _dump(db_path):
+    with sqlite3.connect(db_path) as conn:
+        return {table: conn.execute(f'SELECT * FROM {table} ORDER BY 1, 2').fetchall()
+                for table in ('Customers', 'Transactions', 'Transaction_Items')}
+
+
+def test_same_seed_same_data_across_workers(tmp_path):
+    single = make_picknpay(tmp_path / 'single.db', workers=1)
+    sharded = make_picknpay(tmp_path / 'sharded.db', workers=2)
+    assert _dump(single) == _dump(sharded)
+
+
+def test_append_matches_longer_build(tmp_path):
+    appended = make_picknpay(tmp_path / 'appended.db', n_days=4)
+    append_database(appended, seed=SEED, n_days=2)
+    assert _dump(appended) == _dump(make_picknpay(tmp_path / 'full.db', n_days=6))
+
+
+def _drop_date_keys(db_path):
+    """Turn a database back into the layout from before the date_key/hour_key columns"""
+    with sqlite3.connect(db_path) as conn:
+        for kind, name in conn.execute("SELECT type, name FROM sqlite_master "
+                                       "WHERE type IN ('index', 'view', 'trigger') AND sql LIKE '%_key%'").fetchall():
+            conn.execute(f'DROP {kind} {name}')
+        conn.execute('ALTER TABLE Transactions DROP COLUMN date_key')
+        conn.execute('ALTER TABLE Transactions DROP COLUMN hour_key')
+    conn.close()
+
+
+def _missing_date_keys(db_path):
+    with sqlite3.connect(db_path) as conn:
+        missing = conn.execute('SELECT COUNT(*) FROM Transactions WHERE date_key IS NULL').fetchone()[0]
+    conn.close()
+    return missing
+
+
+def test_append_migrates_old_databases(picknpay_db):
+    _drop_date_keys(picknpay_db)
+    added, _ = append_database(picknpay_db, seed=SEED, n_days=2)
+    assert added > 0 and _missing_date_keys(picknpay_db) == 0
+
+
+def test_append_days_migrates_old_databases(init_db_database):
+    from init_db import append_days
+
+    _drop_date_keys(init_db_database)
+    added = append_days(seed=SEED, db_path=init_db_database, n_days=2)
+    assert added > 0 and _missing_date_keys(init_db_database) == 0
+
+
+def test_init_db_deterministic_and_leaves_global_rng(tmp_path):
+    import random
+    from datetime import datetime
+    from init_db import init_database
+
+    random.seed(7)
+    expected = random.random()
+    random.seed(7)
+    dumps = []
+    for workers in (1, 2):
+        path = str(tmp_path / f'retail{workers}.db')
+        init_database(seed=SEED, workers=workers, end_date=datetime(2025, 3, 31), db_path=path, n_days=4)
+        with sqlite3.connect(path) as conn:
+            dumps.append({table: conn.execute(f'SELECT * FROM {table} ORDER BY id').fetchall()
+                          for table in ('products', 'customers', 'transactions', 'transaction_items')})
+    assert dumps[0] == dumps[1]
+    assert random.random() == expected
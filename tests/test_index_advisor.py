@@ -0,0 +1,39 @@
+import os
+import sqlite3
+
+from utils.database_utils import connect_readonly, database_fingerprint, pool
+from utils.index_advisor import advise, optimize_database
+
+
+def test_advice_uses_compiled_queries(init_db_database):
+    conn = connect_readonly(init_db_database)
+    report = advise(conn)
+    conn.close()
+    queries = {entry['query'] for entry in report}
+    assert {'daily_store_sales', 'product_sales'} <= queries
+    assert not all(entry['indexed'] for entry in report)
+
+
+def test_swap_keeps_readers_and_wal(init_db_database):
+    with pool.connection(init_db_database) as conn:
+        count = conn.execute('SELECT COUNT(*) FROM transactions').fetchone()[0]
+    reader = connect_readonly(init_db_database)
+    reader.execute('BEGIN')
+    reader.execute('SELECT COUNT(*) FROM transactions').fetchone()
+    fingerprint = database_fingerprint(init_db_database)
+
+    result = optimize_database(init_db_database)
+    assert result['swapped'] and result['created']
+    assert os.path.exists(init_db_database + '-wal')
+    assert reader.execute('SELECT COUNT(*) FROM transactions').fetchone()[0] == count
+    reader.close()
+
+    assert database_fingerprint(init_db_database) != fingerprint
+    # Simulate another process's pool: the rename is noticed on acquire
+    pool._files[os.path.abspath(init_db_database)] = (0, 0)
+    with pool.connection(init_db_database) as conn:
+        assert conn.execute('PRAGMA integrity_check').fetchone()[0] == 'ok'
+        assert conn.execute('SELECT COUNT(*) FROM transactions').fetchone()[0] == count
+        assert all(entry['indexed'] for entry in advise(conn))
+    with sqlite3.connect(init_db_database) as writer:
+        assert writer.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
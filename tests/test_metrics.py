@@ -0,0 +1,21 @@
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_metrics_do_not_import_analytics():
+    code = ('import sys; from utils.metrics import render_metrics; text = render_metrics(); '
+            'assert "utils.analytics" not in sys.modules and "pandas" not in sys.modules; '
+            'assert "# TYPE analytics_cache_entries gauge" in text')
+    subprocess.run([sys.executable, '-c', code], check=True, cwd=ROOT)
+
+
+def test_metrics_report_loaded_caches(picknpay_db):
+    from utils import analytics
+    from utils.metrics import render_metrics
+    analytics.store_performance(picknpay_db)
+    text = render_metrics()
+    assert '# TYPE analytics_cache_hits_total counter' in text
+    assert 'analytics_cache_entries{cache="datasets"}' in text
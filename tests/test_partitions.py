@@ -0,0 +1,73 @@
+import os
+import sqlite3
+
+import pandas as pd
+import pytest
+
+from partition_database import partition_database
+from utils import partitions
+from utils.partitions import StalePartitions, get_router, monthly_sales_analysis
+
+
+def _view(db_path, store_id=None):
+    with sqlite3.connect(db_path) as conn:
+        view = pd.read_sql_query('SELECT * FROM Monthly_Sales_Analysis', conn)
+    conn.close()
+    if store_id is not None:
+        view = view[view['store_id'] == store_id]
+    return view.sort_values(['month', 'store_id']).reset_index(drop=True)
+
+
+def _compare(routed, view):
+    routed = routed.sort_values(['month', 'store_id']).reset_index(drop=True)
+    assert routed[['month', 'store_id', 'transaction_count', 'unique_customers']].astype(str).equals(
+        view[['month', 'store_id', 'transaction_count', 'unique_customers']].astype(str))
+    for column in ('total_revenue', 'avg_transaction_value'):
+        assert routed[column].to_numpy() == pytest.approx(view[column].to_numpy())
+
+
+def test_router_matches_monthly_view(picknpay_db, tmp_path):
+    # Characters that mean something in a URI must survive in the partition paths
+    out_dir = str(tmp_path / 'parts #1?mode=rw')
+    partition_database(picknpay_db, out_dir)
+    router = get_router(out_dir)
+    try:
+        _compare(monthly_sales_analysis(router), _view(picknpay_db))
+        store_id = router.store_ids[0]
+        _compare(monthly_sales_analysis(router, store_id), _view(picknpay_db, store_id))
+    finally:
+        router.close()
+
+
+def test_stale_catalog_is_refused(picknpay_db):
+    partition_database(picknpay_db)
+    assert partitions.router_for(picknpay_db) is not None
+
+    conn = sqlite3.connect(picknpay_db)
+    with conn:
+        conn.execute('UPDATE Transactions SET total_amount = total_amount + 1000 WHERE id = 1')
+    conn.close()
+    with pytest.raises(StalePartitions):
+        get_router(partitions.partition_dir(picknpay_db))
+    assert get_router(partitions.partition_dir(picknpay_db), allow_stale=True) is not None
+    # The report falls back to the database itself, which has the new amount
+    assert partitions.router_for(picknpay_db) is None
+    with sqlite3.connect(picknpay_db) as conn:
+        revenue = conn.execute('SELECT SUM(total_amount) FROM Transactions').fetchone()[0]
+    conn.close()
+    assert partitions.monthly_sales(picknpay_db)['total_revenue'].sum() == pytest.approx(revenue)
+
+
+def test_monthly_sales_report_uses_store_partition(picknpay_db, tmp_path, monkeypatch):
+    from utils.pdf_generator import generate_report
+
+    partition_database(picknpay_db)
+    opened = []
+    run = partitions.PartitionRouter._run
+    monkeypatch.setattr(partitions.PartitionRouter, '_run',
+                        staticmethod(lambda path, sql, params: opened.append(path) or run(path, sql, params)))
+    output = str(tmp_path / 'monthly.pdf')
+    generate_report(picknpay_db, 'monthly_sales', {'store_id': 2}, output)
+    assert [os.path.basename(path) for path in opened] == ['store_2.db']
+    with open(output, 'rb') as pdf:
+        assert pdf.read(5) == b'%PDF-'
@@ -0,0 +1,92 @@
+import os
+import shutil
+import time
+
+import pytest
+
+from app import create_app
+from config import Config
+from utils import reports
+from utils.reports import ReportQueue, ReportQueueFull, _acquire_slot
+
+
+def _wait(queue, job_id, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = queue.job(job_id)
+        if job['status'] in ('done', 'failed'):
+            return job
+        time.sleep(0.1)
+    raise AssertionError(f"job {job_id} did not finish")
+
+
+@pytest.fixture
+def queue(tmp_path):
+    queue = ReportQueue(str(tmp_path / 'reports'), max_renders=1, max_queued=1)
+    yield queue
+    queue.shutdown()
+
+
+def test_jobs_are_shared_through_the_report_dir(queue, picknpay_db):
+    job = queue.submit(picknpay_db, 'store_performance', {})
+    # Another gunicorn worker has its own queue object over the same directory
+    other = ReportQueue(queue.report_dir, max_renders=1, max_queued=1)
+    assert other.submit(picknpay_db, 'store_performance', {})['id'] == job['id']
+    assert _wait(other, job['id'])['status'] == 'done'
+    with open(queue.report_path(job['key']), 'rb') as pdf:
+        assert pdf.read(5) == b'%PDF-'
+    cached = other.submit(picknpay_db, 'store_performance', {})
+    assert cached['status'] == 'done' and cached['cached']
+
+
+def test_render_slots_and_backlog_are_capped(queue, picknpay_db):
+    os.makedirs(queue.report_dir)
+    slot = _acquire_slot(queue.report_dir, queue.max_renders)
+    try:
+        first = queue.submit(picknpay_db, 'store_performance', {})
+        second = queue.submit(picknpay_db, 'top_products', {'limit': 5})
+        with pytest.raises(ReportQueueFull):
+            queue.submit(picknpay_db, 'category_revenue', {})
+        time.sleep(1)
+        assert queue.job(first['id'])['status'] == 'queued'
+    finally:
+        slot.close()
+    assert _wait(queue, first['id'])['status'] == 'done'
+    assert _wait(queue, second['id'])['status'] == 'done'
+
+
+def test_unknown_and_abandoned_jobs(queue, picknpay_db):
+    assert queue.job('../../etc/passwd') is None
+    assert queue.job('0' * 32) is None
+    os.makedirs(queue.report_dir)
+    reports._write_job(queue.job_path('1' * 32), {'id': '1' * 32, 'key': '1' * 32, 'status': 'running',
+                                                  'pid': 2 ** 22 + 1, 'finished': None})
+    assert queue.job('1' * 32)['status'] == 'failed'
+
+
+def test_report_routes(tmp_path, picknpay_db, monkeypatch):
+    class TestConfig(Config):
+        UPLOAD_FOLDER = str(tmp_path / 'uploads')
+        SQL_PROFILING = False
+
+    app = create_app(TestConfig)
+    os.makedirs(TestConfig.UPLOAD_FOLDER, exist_ok=True)
+    db_path = shutil.copy(picknpay_db, TestConfig.UPLOAD_FOLDER)
+    queue = ReportQueue(str(tmp_path / 'reports'))
+    monkeypatch.setattr(reports, 'report_queue', queue)
+    client = app.test_client()
+    try:
+        assert client.post('/reports/store_performance', data={}).status_code == 400
+        assert client.post('/reports/nope', data={'db_path': db_path}).status_code == 404
+        response = client.post('/reports/store_performance', data={'db_path': db_path})
+        assert response.status_code == 202
+        job_id = response.get_json()['id']
+        _wait(queue, job_id)
+        status = client.get(response.get_json()['status_url']).get_json()
+        assert status['status'] == 'done'
+        download = client.get(status['download_url'])
+        assert download.status_code == 200 and download.data.startswith(b'%PDF-')
+        assert client.post('/reports/store_performance', data={'db_path': db_path}).status_code == 200
+        assert client.get('/reports/jobs/' + 'f' * 32).status_code == 404
+    finally:
+        queue.shutdown()
@@ -0,0 +1,96 @@
+import sqlite3
+
+import pandas as pd
+import pytest
+
+from rollups import refresh_rollups
+
+# The analytic views as plain aggregates over the base tables
+BASE_SQL = {
+    'Customer_Purchase_Summary': '''
+        SELECT c.id AS customer_id, c.name, c.location, c.loyalty_tier,
+               COUNT(t.id) AS total_transactions,
+               SUM(t.total_amount) AS total_spent,
+               AVG(t.total_amount) AS avg_transaction_value,
+               MAX(t.timestamp) AS last_purchase_date
+        FROM Customers c
+        LEFT JOIN Transactions t ON t.customer_id = c.id
+        GROUP BY c.id, c.name, c.location, c.loyalty_tier''',
+    'Product_Sales_Performance': '''
+        SELECT p.id AS product_id, p.name, p.category,
+               SUM(ti.quantity) AS total_quantity_sold,
+               SUM(ti.quantity * ti.unit_price) AS total_revenue,
+               COUNT(DISTINCT ti.transaction_id) AS transaction_count,
+               AVG(ti.quantity) AS avg_quantity_per_transaction
+        FROM Products p
+        JOIN Transaction_Items ti ON ti.product_id = p.id
+        JOIN Transactions t ON t.id = ti.transaction_id
+        GROUP BY p.id, p.name, p.category''',
+    'Monthly_Sales_Analysis': '''
+        SELECT substr(timestamp, 1, 7) AS month, store_id,
+               COUNT(*) AS transaction_count,
+               SUM(total_amount) AS total_revenue,
+               AVG(total_amount) AS avg_transaction_value,
+               COUNT(DISTINCT customer_id) AS unique_customers
+        FROM Transactions
+        GROUP BY substr(timestamp, 1, 7), store_id''',
+    'Seasonal_Product_Performance': '''
+        SELECT p.category, substr(t.timestamp, 1, 7) AS month,
+               SUM(ti.quantity) AS total_quantity,
+               SUM(ti.quantity * ti.unit_price) AS total_revenue
+        FROM Transaction_Items ti
+        JOIN Transactions t ON t.id = ti.transaction_id
+        JOIN Products p ON p.id = ti.product_id
+        GROUP BY p.category, substr(t.timestamp, 1, 7)''',
+}
+
+
+def _assert_views_match(conn):
+    for view, base_sql in BASE_SQL.items():
+        base = pd.read_sql_query(base_sql, conn)
+        rolled = pd.read_sql_query(f'SELECT * FROM {view}', conn)[list(base.columns)]
+        keys = list(base.columns[:2])
+        base = base.sort_values(keys).reset_index(drop=True)
+        rolled = rolled.sort_values(keys).reset_index(drop=True)
+        assert len(rolled) == len(base), view
+        for column in base.columns:
+            if pd.api.types.is_float_dtype(base[column]):
+                assert rolled[column].to_numpy() == pytest.approx(base[column].to_numpy(), nan_ok=True), \
+                    (view, column)
+            else:
+                assert rolled[column].astype(str).tolist() == base[column].astype(str).tolist(), (view, column)
+
+
+def test_views_match_base_tables_after_appends_and_updates(picknpay_db):
+    conn = sqlite3.connect(picknpay_db)
+    try:
+        _assert_views_match(conn)
+
+        # A new transaction on an existing day, picked up by the id watermark
+        day, store_id = conn.execute('SELECT substr(timestamp, 1, 10), store_id FROM Transactions '
+                                     'ORDER BY id LIMIT 1').fetchone()
+        with conn:
+            cursor = conn.execute('INSERT INTO Transactions (customer_id, timestamp, total_amount, payment_method, '
+                                  'store_id) VALUES (1, ?, 30.0, ?, ?)', (f'{day} 12:00:00', 'Cash', store_id))
+            conn.execute('INSERT INTO Transaction_Items VALUES (?, 1, 3, 10.0)', (cursor.lastrowid,))
+        assert refresh_rollups(conn) == 1
+        _assert_views_match(conn)
+
+        # Take a customer's transactions at that store and month away from
+        # them and move them to another store: the customer leaves the month
+        # and the refreshed days leave the store
+        customer_id, = conn.execute('SELECT customer_id FROM Transactions WHERE substr(timestamp, 1, 10) = ? '
+                                    'AND store_id = ? AND customer_id IS NOT NULL ORDER BY id LIMIT 1',
+                                    (day, store_id)).fetchone()
+        selected = ('FROM Transactions WHERE customer_id = ? AND store_id = ? '
+                    'AND substr(timestamp, 1, 7) = substr(?, 1, 7)')
+        days = [row[0] for row in conn.execute(f'SELECT DISTINCT substr(timestamp, 1, 10) {selected}',
+                                               (customer_id, store_id, day))]
+        other_store, = conn.execute('SELECT MAX(store_id) + 1 FROM Transactions').fetchone()
+        with conn:
+            conn.execute(f'UPDATE Transactions SET customer_id = NULL, store_id = ? WHERE id IN (SELECT id {selected})',
+                         (other_store, customer_id, store_id, day))
+        refresh_rollups(conn, days=days)
+        _assert_views_match(conn)
+    finally:
+        conn.close()
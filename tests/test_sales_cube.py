@@ -0,0 +1,43 @@
+import numpy as np
+
+from create_picknpay_db import append_database
+from tests.conftest import SEED
+from utils import analytics, sales_cube
+from utils.sales_cube import _accumulate, get_cube
+
+
+def test_accumulate_sparse_days():
+    target = np.zeros((1000, 24, 2), dtype=np.int32)
+    day = np.array([0, 0, 999])
+    _accumulate(target, day, (np.array([3, 3, 5]), np.array([1, 1, 0])), None)
+    assert target[0, 3, 1] == 2 and target[999, 5, 0] == 1 and target.sum() == 3
+
+
+def test_cube_matches_analytics_after_append(picknpay_db):
+    get_cube(picknpay_db)
+    append_database(picknpay_db, seed=SEED, n_days=3)
+    cube = get_cube(picknpay_db).store_performance()
+    exact = analytics.store_performance(picknpay_db)
+    assert cube['transactions'].tolist() == exact['transactions'].tolist()
+    assert np.allclose(cube['revenue'], exact['revenue'], rtol=1e-5)
+
+
+def test_append_during_update_is_counted_once(picknpay_db, monkeypatch):
+    get_cube(picknpay_db)
+    append_database(picknpay_db, seed=SEED, n_days=2)
+    fill = sales_cube._fill
+    appended = []
+
+    def fill_with_concurrent_append(*args):
+        if not appended:
+            appended.append(True)
+            append_database(picknpay_db, seed=SEED + 1, n_days=2)
+        fill(*args)
+
+    monkeypatch.setattr(sales_cube, '_fill', fill_with_concurrent_append)
+    get_cube(picknpay_db)
+    assert appended
+    cube = get_cube(picknpay_db).store_performance()
+    exact = analytics.store_performance(picknpay_db)
+    assert cube['transactions'].tolist() == exact['transactions'].tolist()
+    assert np.allclose(cube['revenue'], exact['revenue'], rtol=1e-5)
@@ -0,0 +1,80 @@
+import sqlite3
+
+import numpy as np
+import pytest
+
+from create_picknpay_db import append_database
+from tests.conftest import SEED
+from utils import analytics, sampling
+from utils.sampling import build_sample, update_sample
+
+
+def _exact_categories(db_path):
+    return analytics.category_revenue(db_path).set_index('category')['revenue']
+
+
+def test_census_is_exact(picknpay_db):
+    sample = build_sample(picknpay_db, per_stratum=10 ** 6)
+    estimate = sample.category_revenue().set_index('category')
+    exact = _exact_categories(picknpay_db)
+    assert estimate['revenue'].reindex(exact.index).to_numpy() == pytest.approx(exact.to_numpy())
+    assert np.allclose(estimate['revenue_margin'], 0)
+
+    trends = sample.sales_trends('month')
+    assert np.allclose(trends['revenue_margin'], 0)
+    assert trends['revenue'].sum() == pytest.approx(analytics.store_performance(picknpay_db)['revenue'].sum())
+
+
+def test_chunked_items_match(picknpay_db, monkeypatch):
+    whole = build_sample(picknpay_db, per_stratum=10)
+    monkeypatch.setattr(sampling, 'ID_CHUNK', 7)
+    chunked = build_sample(picknpay_db, per_stratum=10)
+    for name in ('transaction_id', 'quantity', 'revenue'):
+        assert np.array_equal(whole.items[name], chunked.items[name])
+
+
+def test_intervals_cover_truth(picknpay_db):
+    sample = build_sample(picknpay_db, per_stratum=10)
+    estimate = sample.category_revenue().set_index('category')
+    exact = _exact_categories(picknpay_db).reindex(estimate.index)
+    covered = (estimate['revenue'] - exact).abs() <= estimate['revenue_margin']
+    assert covered.mean() >= 0.8
+    assert (estimate['revenue_margin'] > 0).all()
+
+
+def _transaction_count(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute('SELECT COUNT(*) FROM Transactions').fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_append_during_top_up_is_counted_once(picknpay_db, monkeypatch):
+    build_sample(picknpay_db, per_stratum=10)
+    append_database(picknpay_db, seed=SEED, n_days=2)
+    stream = sampling._stream
+    appended = []
+
+    def stream_with_concurrent_append(*args):
+        if not appended:
+            appended.append(True)
+            append_database(picknpay_db, seed=SEED + 1, n_days=2)
+        stream(*args)
+
+    monkeypatch.setattr(sampling, '_stream', stream_with_concurrent_append)
+    update_sample(picknpay_db, per_stratum=10)
+    sample = update_sample(picknpay_db, per_stratum=10)
+    assert appended
+    assert sample.population.sum() == _transaction_count(picknpay_db)
+    assert len(np.unique(sample.ids)) == len(sample.ids)
+
+
+def test_update_below_watermark_rebuilds(picknpay_db):
+    build_sample(picknpay_db, per_stratum=10 ** 6)
+    conn = sqlite3.connect(picknpay_db)
+    with conn:
+        conn.execute('UPDATE Transactions SET total_amount = total_amount + 1000 WHERE id = 1')
+    conn.close()
+    sample = update_sample(picknpay_db, per_stratum=10 ** 6)
+    assert sample.amounts.sum() == pytest.approx(analytics.store_performance(picknpay_db)['revenue'].sum())
@@ -0,0 +1,30 @@
+import numpy as np
+
+from utils import segmentation
+from utils.segmentation import build_segment_model
+
+
+def test_scaler_fitted_before_clusters(picknpay_db, tmp_path, monkeypatch):
+    # Several batches, so a scaler updated batch by batch would differ
+    monkeypatch.setattr(segmentation, 'FETCH_SIZE', 7)
+    model = build_segment_model(picknpay_db, str(tmp_path))
+    matrix = model._matrix(model.last_day, model.frequency, model.monetary, model.tier)
+    assert np.allclose(model.scaler.mean_, matrix.mean(axis=0))
+    assert len(model.labels) == len(model) > 0
+    assert set(model.cluster_segment) <= set(segmentation.SEGMENT_NAMES)
+
+
+def test_dashboard_segments_come_from_the_model(picknpay_db, tmp_path, monkeypatch):
+    from utils import analytics
+
+    monkeypatch.chdir(tmp_path)
+    model = segmentation.get_segment_model(picknpay_db)
+    profile = analytics.customer_segments(picknpay_db)
+    assert 'segment' not in analytics.customer_rfm(picknpay_db)
+    assert len(profile) == len(model) > 0
+    labels = model.customers(limit=len(model)).set_index('customer_id')['segment']
+    assert (profile.set_index('customer_id')['segment'] == labels.reindex(profile['customer_id'])).all()
+
+    one_store = analytics.customer_segments(picknpay_db, store_id=1)
+    assert set(one_store['segment']) <= set(model.cluster_segment)
+    assert model.segments_of([-1]).tolist() == [None]
@@ -0,0 +1,87 @@
+import os
+import sqlite3
+
+import numpy as np
+
+from utils import analytics, sketches
+from utils.pdf_generator import generate_report
+from utils.sketches import CountMin, SpaceSaving, get_sketches, sketch_path
+
+
+def _stream(seed=5, n=20_000, products=2_000):
+    rng = np.random.default_rng(seed)
+    items = rng.zipf(1.3, n) % products
+    return items.astype(np.int64), rng.uniform(1, 10, n)
+
+
+def _truth(items, weights, products):
+    return np.bincount(items, weights=weights, minlength=products)
+
+
+def test_space_saving_merge_keeps_bounds():
+    items, weights = _stream()
+    truth = _truth(items, weights, 2_000)
+    merged = SpaceSaving(64)
+    for part in np.array_split(np.arange(len(items)), 10):
+        merged = merged.merge(SpaceSaving.exact(items[part], weights[part], 64))
+
+    assert len(merged.items) <= 64
+    assert np.isclose(merged.total, weights.sum())
+    tracked = truth[merged.items]
+    assert (merged.counts >= tracked - 1e-9).all()
+    assert (merged.counts - merged.errors <= tracked + 1e-9).all()
+    untracked = np.setdiff1d(np.arange(2_000), merged.items)
+    assert truth[untracked].max() <= merged.floor + 1e-9
+    # The heaviest products are all tracked
+    assert set(np.argsort(-truth)[:5]) <= set(merged.items.tolist())
+
+
+def test_count_min_merge_and_error_bound():
+    items, weights = _stream()
+    truth = _truth(items, weights, 2_000)
+    whole = CountMin(128, 4)
+    whole.update(items, weights)
+    merged = CountMin(128, 4)
+    for part in np.array_split(np.arange(len(items)), 10):
+        sketch = CountMin(128, 4)
+        sketch.update(items[part], weights[part])
+        merged = merged.merge(sketch)
+    assert np.allclose(merged.table, whole.table) and np.isclose(merged.total, whole.total)
+
+    products = np.arange(2_000)
+    estimate = merged.estimate(products)
+    assert (estimate >= truth - 1e-9).all()
+    over = (estimate - truth) > merged.epsilon * merged.total
+    assert over.mean() <= merged.delta
+
+
+def test_top_products_bounds_and_storage(picknpay_db):
+    exact = analytics.top_products(picknpay_db, limit=1_000).set_index('product_id')['revenue']
+    top = sketches.top_products(picknpay_db, limit=5)
+    assert os.path.exists(sketch_path(picknpay_db))
+    assert os.path.dirname(sketch_path(picknpay_db)) == os.path.dirname(os.path.abspath(picknpay_db))
+    truth = exact.reindex(top['product_id']).fillna(0).to_numpy()
+    assert (top['revenue'].to_numpy() >= truth - 1e-6).all()
+    assert (top['lower_bound'].to_numpy() <= truth + 1e-6).all()
+
+    # A write makes the saved sketches stale; they are rebuilt in place
+    old = get_sketches(picknpay_db)
+    conn = sqlite3.connect(picknpay_db)
+    with conn:
+        conn.execute('UPDATE Transaction_Items SET quantity = quantity + 100 WHERE rowid = 1')
+    conn.close()
+    new = get_sketches(picknpay_db)
+    assert new.fingerprint != old.fingerprint
+    assert sketches.ProductSketches.load(sketch_path(picknpay_db)).fingerprint == new.fingerprint
+
+
+def test_top_products_report_uses_sketches(picknpay_db, tmp_path, monkeypatch):
+    calls = []
+    top_products = sketches.top_products
+    monkeypatch.setattr(sketches, 'top_products', lambda *args, **kwargs: calls.append(kwargs) or
+                        top_products(*args, **kwargs))
+    output = str(tmp_path / 'top.pdf')
+    generate_report(picknpay_db, 'top_products', {'approximate': True, 'limit': 5}, output)
+    assert calls[0]['approximate'] is True
+    with open(output, 'rb') as pdf:
+        assert pdf.read(5) == b'%PDF-'
@@ -0,0 +1,87 @@
+import hashlib
+import io
+import os
+import time
+
+import pytest
+
+from utils.index_advisor import schedule_optimization
+from utils.uploads import (UploadError, append_chunk, begin_upload, finish_upload, hash_file, original_path,
+                           store_upload, sweep_uploads)
+
+
+def test_original_stays_immutable(picknpay_template, tmp_path):
+    with open(picknpay_template, 'rb') as db_file:
+        content = db_file.read()
+    content_hash = hashlib.sha256(content).hexdigest()
+
+    result = store_upload(io.BytesIO(content), str(tmp_path))
+    assert not result['deduplicated']
+    schedule_optimization(result['path']).result()
+
+    original = original_path(str(tmp_path), content_hash)
+    assert hash_file(original) == content_hash
+    assert os.stat(original).st_mode & 0o222 == 0
+
+    again = store_upload(io.BytesIO(content), str(tmp_path))
+    assert again['deduplicated'] and again['path'] == result['path']
+
+
+def test_failed_finish_removes_partial_files(tmp_path):
+    upload_folder = str(tmp_path)
+    upload_id = begin_upload(upload_folder)
+    append_chunk(upload_folder, upload_id, 0, io.BytesIO(b'not a database' * 10))
+    with pytest.raises(UploadError):
+        finish_upload(upload_folder, upload_id)
+    assert os.listdir(os.path.join(upload_folder, '.partial')) == []
+
+
+def _client(tmp_path):
+    from app import create_app
+    from config import Config
+
+    class TestConfig(Config):
+        UPLOAD_FOLDER = str(tmp_path / 'uploads')
+        SQL_PROFILING = False
+
+    return create_app(TestConfig).test_client(), TestConfig.UPLOAD_FOLDER
+
+
+def test_multipart_upload_is_streamed_into_incoming(picknpay_template, tmp_path, monkeypatch):
+    from flask import Request
+
+    def no_spooling(*args, **kwargs):
+        raise AssertionError("the body was spooled by the default form parser")
+
+    monkeypatch.setattr(Request, '_get_file_stream', no_spooling)
+    client, upload_folder = _client(tmp_path)
+    with open(picknpay_template, 'rb') as db_file:
+        content = db_file.read()
+    response = client.post('/upload', data={'database': (io.BytesIO(content), 'shop.db'),
+                                            'extra': (io.BytesIO(b'ignored'), 'extra.bin')},
+                           content_type='multipart/form-data')
+    assert response.status_code == 201
+    assert response.get_json()['hash'] == hashlib.sha256(content).hexdigest()
+    assert os.listdir(os.path.join(upload_folder, '.incoming')) == []
+
+    missing = client.post('/upload', data={'other': (io.BytesIO(content), 'shop.db')},
+                          content_type='multipart/form-data')
+    assert missing.status_code == 400
+    assert os.listdir(os.path.join(upload_folder, '.incoming')) == []
+
+
+def test_abandoned_uploads_are_swept(tmp_path):
+    upload_folder = str(tmp_path)
+    old = begin_upload(upload_folder)
+    fresh = begin_upload(upload_folder)
+    append_chunk(upload_folder, fresh, 0, io.BytesIO(b'x' * 10))
+    os.makedirs(os.path.join(upload_folder, '.incoming'))
+    orphan = os.path.join(upload_folder, '.incoming', 'orphan.part')
+    open(orphan, 'wb').close()
+    day_ago = time.time() - 2 * 24 * 3600
+    for path in (os.path.join(upload_folder, '.partial', f'{old}.part'), orphan):
+        os.utime(path, (day_ago, day_ago))
+
+    assert sweep_uploads(upload_folder) == 3
+    assert sorted(os.listdir(os.path.join(upload_folder, '.partial'))) == [f'{fresh}.json', f'{fresh}.part']
+    assert not os.path.exists(orphan)
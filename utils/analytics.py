@@ -0,0 +1,399 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+from utils.columnar import find_snapshot
+from utils.database_utils import database_fingerprint, pool
+from utils.helpers import LRUCache
+from utils.schema_adapter import LOGICAL_MODEL, get_adapter
+
+MAX_DATASETS = 4                        # databases kept loaded in memory
+MAX_DATASET_BYTES = 2 * 1024 ** 3
+MAX_RESULTS = 512                       # cached metric results
+
+PERIODS = ('day', 'week', 'month')
+
+
+class SalesData:
+    """Columns needed by the dashboard metrics, loaded once per database.
+
+    Items carry the store and day of their transaction (looked up with a
+    sorted-id search), so every metric is a vectorized pass over arrays.
+    Items whose transaction does not exist are dropped and counted in
+    orphan_items. The frames are built over read-only arrays, since one
+    loaded dataset is shared by every request; shared() hands out frames
+    a caller can add columns to without touching the cache.
+    """
+
+    def __init__(self, transactions, items, products, customers, orphan_items=0):
+        self.transactions = _read_only(transactions)
+        self.items = _read_only(items)
+        self.products = _read_only(products)
+        self.customers = _read_only(customers)
+        self.orphan_items = orphan_items
+
+    def shared(self):
+        """New frames over the same read-only arrays"""
+        return SalesData(self.transactions, self.items, self.products, self.customers, self.orphan_items)
+
+    @property
+    def nbytes(self):
+        """Memory held by this process; columns mapped from a snapshot live in the shared page cache"""
+        total = 0
+        for frame in (self.transactions, self.items, self.products, self.customers):
+            usage = frame.memory_usage(index=True, deep=True)
+            total += usage['Index'] + sum(usage[name] for name in frame.columns if not _is_mapped(frame[name]))
+        return int(total)
+
+
+def _read_only(frame):
+    """The frame over read-only views of its columns (no data is copied)"""
+    columns = {}
+    for name in frame.columns:
+        column = frame[name]
+        if isinstance(column.dtype, pd.CategoricalDtype):
+            codes = column.array.codes.view()
+            codes.flags.writeable = False
+            columns[name] = pd.Categorical.from_codes(codes, dtype=column.dtype, validate=False)
+        else:
+            values = column.to_numpy(copy=False).view()
+            values.flags.writeable = False
+            columns[name] = values
+    return pd.DataFrame(columns, index=frame.index, copy=False)
+
+
+def _match_items(ids, transaction_ids):
+    """Row of each item's transaction in the sorted ids, and whether the item has one.
+
+    Items whose transaction_id matches no transaction (orphans) get an
+    arbitrary position and False.
+    """
+    position = np.clip(np.searchsorted(ids, transaction_ids), 0, max(len(ids) - 1, 0))
+    matched = ids[position] == transaction_ids if len(ids) else np.zeros(len(transaction_ids), dtype=bool)
+    return position, matched
+
+
+def _is_mapped(column):
+    values = column.array.codes if isinstance(column.dtype, pd.CategoricalDtype) else column.to_numpy(copy=False)
+    while values is not None:
+        if isinstance(values, np.memmap):
+            return True
+        values = getattr(values, 'base', None)
+    return False
+
+
+def _snapshot_column(snapshot, adapter, logical, name):
+    """A logical column from the snapshot, or None when the layout has no such physical column"""
+    alias = LOGICAL_MODEL[logical][1]
+    expression = adapter.columns[logical][name]
+    if not expression.startswith(alias + '.'):
+        return None
+    return snapshot.column(adapter.tables[logical], expression[len(alias) + 1:])
+
+
+def load_snapshot_data(snapshot, adapter):
+    """Analytics frames over a columnar snapshot's memory-mapped arrays.
+
+    Table columns are used in place, and the per-item store, day and
+    revenue are computed once and saved in the snapshot, so every worker
+    maps the same pages. Returns None when the snapshot cannot be used
+    (its timestamps are not stored as timestamps, or transactions are
+    not in id order).
+    """
+    tx_table, items_table = adapter.tables['transactions'], adapter.tables['items']
+    timestamp = snapshot.spec(tx_table, adapter.columns['transactions']['timestamp'].split('.')[-1])
+    if timestamp is None or timestamp['encoding'] != 'timestamp' or timestamp['nulls']:
+        return None
+    ids = _snapshot_column(snapshot, adapter, 'transactions', 'id')
+    if len(ids) and not (ids[1:] > ids[:-1]).all():
+        return None
+    rows = len(ids)
+
+    def column(logical, name, fallback):
+        values = _snapshot_column(snapshot, adapter, logical, name)
+        return fallback() if values is None else values
+
+    store_ids = column('transactions', 'store_id', lambda: snapshot.derived('transactions.store_id',
+                                                                            lambda: np.ones(rows, dtype=np.int64)))
+    days = snapshot.derived('transactions.day', lambda: snapshot.raw(tx_table, timestamp['name']) // 86400)
+    transactions = pd.DataFrame({
+        'id': ids,
+        'customer_id': column('transactions', 'customer_id', lambda: np.full(rows, np.nan)),
+        'store_id': store_ids,
+        'payment_method': column('transactions', 'payment_method',
+                                 lambda: pd.Categorical.from_codes(np.full(rows, -1, dtype=np.int8), [])),
+        'total_amount': _snapshot_column(snapshot, adapter, 'transactions', 'total_amount'),
+        'day': days.view('datetime64[D]'),
+    }, copy=False)
+
+    transaction_ids = _snapshot_column(snapshot, adapter, 'items', 'transaction_id')
+    quantity = _snapshot_column(snapshot, adapter, 'items', 'quantity')
+    unit_price = _snapshot_column(snapshot, adapter, 'items', 'unit_price')
+
+    def positions():
+        return _match_items(ids, transaction_ids)[0]
+    items = pd.DataFrame({
+        'transaction_id': transaction_ids,
+        'product_id': _snapshot_column(snapshot, adapter, 'items', 'product_id'),
+        'quantity': quantity,
+        'unit_price': unit_price,
+        'store_id': snapshot.derived('items.store_id', lambda: store_ids[positions()] if rows else
+                                     np.empty(0, dtype=np.int64)),
+        'day': snapshot.derived('items.day', lambda: days[positions()] if rows else
+                                np.empty(0, dtype=np.int64)).view('datetime64[D]'),
+        'revenue': snapshot.derived('items.revenue', lambda: quantity * unit_price),
+    }, copy=False)
+    # Usually empty; dropping orphans copies the item columns
+    orphans = snapshot.derived('items.orphans', lambda: np.flatnonzero(~_match_items(ids, transaction_ids)[1]))
+    if len(orphans):
+        items = items.drop(index=orphans).reset_index(drop=True)
+
+    products = pd.DataFrame({name: _snapshot_column(snapshot, adapter, 'products', name)
+                             for name in ('id', 'name', 'category', 'price')}, copy=False)
+    customer_ids = _snapshot_column(snapshot, adapter, 'customers', 'id')
+    customers = pd.DataFrame({'id': customer_ids, **{
+        name: column('customers', name, lambda: np.full(len(customer_ids), None, dtype=object))
+        for name in ('name', 'location', 'loyalty_tier')
+    }}, copy=False)
+    return SalesData(transactions, items, products, customers, len(orphans))
+
+
+def load_sales_data(db_path):
+    """Read the analytics columns from a database into NumPy-backed frames.
+
+    When a columnar snapshot of the database's current content exists
+    (see export_columnar.py), the frames map its arrays instead.
+    """
+    adapter = get_adapter(db_path)
+    snapshot = find_snapshot(db_path)
+    if snapshot is not None:
+        data = load_snapshot_data(snapshot, adapter)
+        if data is not None:
+            return data
+    with pool.connection(db_path) as conn:
+        transactions = pd.read_sql_query(adapter.sql('load_transactions'), conn)
+        items = pd.read_sql_query(adapter.sql('load_items'), conn)
+        products = pd.read_sql_query(adapter.sql('load_products'), conn)
+        customers = pd.read_sql_query(adapter.sql('load_customers'), conn)
+
+    transactions['day'] = pd.to_datetime(transactions['date_key'].astype('int64').astype(str),
+                                         format='%Y%m%d').values.astype('datetime64[D]')
+    transactions['payment_method'] = transactions['payment_method'].astype('category')
+
+    position, matched = _match_items(transactions['id'].values, items['transaction_id'].values)
+    orphans = len(items) - int(matched.sum())
+    if orphans:
+        items = items[matched].reset_index(drop=True)
+        position = position[matched]
+    items['store_id'] = transactions['store_id'].values[position] if len(transactions) else []
+    items['day'] = transactions['day'].values[position] if len(transactions) else []
+    items['revenue'] = items['quantity'].values * items['unit_price'].values
+    return SalesData(transactions, items, products, customers, orphans)
+
+
+_datasets = LRUCache(MAX_DATASETS, MAX_DATASET_BYTES, sizeof=lambda data: data.nbytes)
+_results = LRUCache(MAX_RESULTS)
+_load_locks = {}
+_load_locks_lock = threading.Lock()
+_path_fingerprints = {}
+
+
+def get_sales_data(db_path):
+    """Return the loaded dataset for a database, loading it on first use.
+
+    Datasets are cached by content fingerprint, so a file that changed on
+    disk is reloaded and concurrent requests load it only once. Callers
+    get their own shallow copy of the cached frames.
+    """
+    fingerprint = database_fingerprint(db_path)
+    previous = _path_fingerprints.get(db_path)
+    if previous != fingerprint:
+        _path_fingerprints[db_path] = fingerprint
+        if previous is not None and previous not in _path_fingerprints.values():
+            # The file changed on disk; nothing else refers to the old content
+            _datasets.pop(previous)
+            _results.discard_where(lambda key: key[0] == previous)
+
+    data = _datasets.get(fingerprint)
+    if data is not None:
+        return fingerprint, data.shared()
+
+    with _load_locks_lock:
+        lock = _load_locks.setdefault(fingerprint, threading.Lock())
+    with lock:
+        data = _datasets.get(fingerprint)
+        if data is None:
+            data = load_sales_data(db_path)
+            _datasets.put(fingerprint, data)
+    with _load_locks_lock:
+        _load_locks.pop(fingerprint, None)
+    return fingerprint, data.shared()
+
+
+def cached_metric(func):
+    """Cache a metric by (database fingerprint, metric name, parameters)"""
+    def wrapper(db_path, **params):
+        fingerprint, data = get_sales_data(db_path)
+        key = (fingerprint, func.__name__, tuple(sorted(params.items())))
+        result = _results.get(key)
+        if result is None:
+            result = func(data, **params)
+            _results.put(key, result)
+        return result
+    wrapper.__name__ = func.__name__
+    wrapper.__doc__ = func.__doc__
+    wrapper.compute = func
+    return wrapper
+
+
+def _select(frame, store_id=None, start=None, end=None):
+    """Boolean mask for a store and an inclusive YYYY-MM-DD date range"""
+    mask = np.ones(len(frame), dtype=bool)
+    if store_id is not None:
+        mask &= frame['store_id'].values == store_id
+    if start is not None:
+        mask &= frame['day'].values >= np.datetime64(start, 'D')
+    if end is not None:
+        mask &= frame['day'].values <= np.datetime64(end, 'D')
+    return mask
+
+
+def _period(days, period):
+    # pandas keeps datetime columns at second resolution; the week arithmetic needs days
+    days = days.astype('datetime64[D]')
+    if period == 'day':
+        return days
+    if period == 'week':
+        # Weeks start on Monday; 1970-01-01 was a Thursday
+        return days - ((days.astype('int64') + 3) % 7).astype('timedelta64[D]')
+    if period == 'month':
+        return days.astype('datetime64[M]').astype('datetime64[D]')
+    raise ValueError(f"period must be one of {PERIODS}")
+
+
+@cached_metric
+def sales_trends(data, period='day', store_id=None, start=None, end=None):
+    """Revenue, transactions, items and average basket per day, week or month"""
+    tx = data.transactions[_select(data.transactions, store_id, start, end)]
+    items = data.items[_select(data.items, store_id, start, end)]
+
+    tx_periods = _period(tx['day'].values, period)
+    revenue = pd.Series(tx['total_amount'].values).groupby(tx_periods).agg(['sum', 'count'])
+    quantity = pd.Series(items['quantity'].values).groupby(_period(items['day'].values, period)).sum()
+
+    trends = pd.DataFrame({
+        'period': revenue.index,
+        'revenue': revenue['sum'].values,
+        'transactions': revenue['count'].values,
+    })
+    trends['items_sold'] = quantity.reindex(revenue.index, fill_value=0).values
+    trends['avg_transaction_value'] = trends['revenue'] / trends['transactions']
+    return trends
+
+
+@cached_metric
+def customer_rfm(data, store_id=None, start=None, end=None):
+    """Recency/frequency/monetary profile of each customer over the selected transactions"""
+    tx = data.transactions[_select(data.transactions, store_id, start, end)]
+    tx = tx[tx['customer_id'].notna()]
+    if tx.empty:
+        return pd.DataFrame(columns=['customer_id', 'name', 'location', 'loyalty_tier', 'recency_days',
+                                     'frequency', 'monetary'])
+
+    last_day = tx['day'].values.max()
+    grouped = tx.groupby('customer_id').agg(
+        last_day=('day', 'max'), frequency=('id', 'size'), monetary=('total_amount', 'sum')
+    )
+    profile = grouped.reset_index()
+    profile['recency_days'] = (last_day - profile['last_day'].values).astype('timedelta64[D]').astype('int64')
+
+    customers = data.customers.rename(columns={'id': 'customer_id'})
+    profile = profile.merge(customers, on='customer_id', how='left')
+    return profile[['customer_id', 'name', 'location', 'loyalty_tier', 'recency_days',
+                    'frequency', 'monetary']]
+
+
+def customer_segments(db_path, store_id=None, start=None, end=None):
+    """customer_rfm with each customer's segment from utils.segmentation.
+
+    Segments are a property of the customer, fitted on all of their
+    transactions, so filtering by store or dates narrows the customers
+    and their figures but does not relabel them.
+    """
+    from utils.segmentation import get_segment_model
+
+    profile = customer_rfm(db_path, store_id=store_id, start=start, end=end).copy()
+    model = get_segment_model(db_path)
+    profile['segment'] = model.segments_of(profile['customer_id'].values.astype(np.int64))
+    return profile
+
+
+@cached_metric
+def top_products(data, limit=10, by='revenue', store_id=None, start=None, end=None):
+    """Best-selling products by revenue or quantity"""
+    items = data.items[_select(data.items, store_id, start, end)]
+    product_ids, index = np.unique(items['product_id'].values, return_inverse=True)
+    totals = pd.DataFrame({
+        'product_id': product_ids,
+        'quantity': np.bincount(index, weights=items['quantity'].values, minlength=len(product_ids)),
+        'revenue': np.bincount(index, weights=items['revenue'].values, minlength=len(product_ids)),
+        'transactions': np.bincount(index, minlength=len(product_ids)),
+    })
+    totals = totals.nlargest(limit, by if by in ('revenue', 'quantity') else 'revenue')
+    products = data.products.rename(columns={'id': 'product_id'})
+    return totals.merge(products[['product_id', 'name', 'category']], on='product_id', how='left')
+
+
+@cached_metric
+def category_revenue(data, store_id=None, start=None, end=None):
+    """Revenue, items sold and revenue share per product category"""
+    items = data.items[_select(data.items, store_id, start, end)]
+    products = data.products.set_index('id')['category']
+    categories = products.reindex(items['product_id'].values).values
+    grouped = pd.DataFrame({'category': categories, 'revenue': items['revenue'].values,
+                            'items_sold': items['quantity'].values}).groupby('category', sort=True).sum()
+    grouped['revenue_share'] = grouped['revenue'] / grouped['revenue'].sum()
+    return grouped.sort_values('revenue', ascending=False).reset_index()
+
+
+@cached_metric
+def store_performance(data, start=None, end=None):
+    """Revenue, traffic, basket size and reach per store"""
+    tx = data.transactions[_select(data.transactions, None, start, end)]
+    items = data.items[_select(data.items, None, start, end)]
+    stores = tx.groupby('store_id').agg(
+        revenue=('total_amount', 'sum'),
+        transactions=('id', 'size'),
+        unique_customers=('customer_id', 'nunique'),
+    )
+    stores['items_sold'] = items.groupby('store_id')['quantity'].sum().reindex(stores.index, fill_value=0)
+    stores['avg_transaction_value'] = stores['revenue'] / stores['transactions']
+    stores['items_per_transaction'] = stores['items_sold'] / stores['transactions']
+    stores['revenue_share'] = stores['revenue'] / stores['revenue'].sum()
+    return stores.reset_index()
+
+
+def dashboard_metrics(db_path, period='day', store_id=None, start=None, end=None, limit=10):
+    """All four metric families for one dashboard view"""
+    return {
+        'sales_trends': sales_trends(db_path, period=period, store_id=store_id, start=start, end=end),
+        'customer_segments': customer_segments(db_path, store_id=store_id, start=start, end=end),
+        'top_products': top_products(db_path, limit=limit, store_id=store_id, start=start, end=end),
+        'store_performance': store_performance(db_path, start=start, end=end),
+    }
+
+
+def invalidate(db_path=None):
+    """Drop cached datasets and results, for one database or all of them"""
+    if db_path is None:
+        _datasets.clear()
+        _results.clear()
+        return
+    fingerprint = database_fingerprint(db_path)
+    _datasets.pop(fingerprint)
+    _results.discard_where(lambda key: key[0] == fingerprint)
+
+
+def cache_stats():
+    return {'datasets': _datasets.stats(), 'results': _results.stats()}
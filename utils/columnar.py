@@ -0,0 +1,156 @@
+import json
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from utils.database_utils import database_fingerprint
+from utils.helpers import LRUCache
+
+SNAPSHOT_SUFFIX = '.columns'            # snapshot directory sits next to the database: <db>.columns/
+MANIFEST_FILE = 'manifest.json'
+DERIVED_DIR = 'derived'
+MAX_SNAPSHOTS = 16                      # opened snapshots kept in memory
+FORMAT_VERSION = 1
+
+# Low-cardinality text columns stored as integer codes into a dictionary
+DICTIONARY_COLUMNS = ('payment_method', 'category', 'location', 'loyalty_tier')
+NAT = np.iinfo(np.int64).min            # NULL timestamp; the int64 pattern of NaT
+
+
+def snapshot_dir(db_path):
+    return os.path.abspath(db_path) + SNAPSHOT_SUFFIX
+
+
+def code_dtype(size):
+    """Smallest code type for a dictionary, the one pandas keeps Categorical codes in"""
+    for dtype in (np.int8, np.int16, np.int32):
+        if size < np.iinfo(dtype).max:
+            return np.dtype(dtype)
+    return np.dtype(np.int64)
+
+
+class Snapshot:
+    """A columnar snapshot of a database, read through memory maps.
+
+    Every column is a .npy file opened with mmap_mode='r', so the arrays
+    handed to pandas are views of the page cache that every process
+    reading the snapshot shares. Dictionary columns become Categoricals
+    over the mapped codes and timestamps datetime64[s] views; only free
+    text columns are decoded into Python strings.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, MANIFEST_FILE), encoding='utf-8') as manifest_file:
+            self.manifest = json.load(manifest_file)
+        if self.manifest.get('version') != FORMAT_VERSION:
+            raise ValueError(f"Unsupported snapshot version in {path}")
+        self.fingerprint = self.manifest['fingerprint']
+        self._tables = {name.lower(): name for name in self.manifest['tables']}
+
+    def _table(self, table):
+        name = self._tables.get(table.lower())
+        if name is None:
+            raise KeyError(table)
+        return name, self.manifest['tables'][name]
+
+    def rows(self, table):
+        return self._table(table)[1]['rows']
+
+    def columns(self, table):
+        return {column['name']: column for column in self._table(table)[1]['columns']}
+
+    def spec(self, table, name):
+        """Manifest entry for a column, matched case-insensitively; None when absent"""
+        for column in self._table(table)[1]['columns']:
+            if column['name'].lower() == name.lower():
+                return column
+        return None
+
+    def _array(self, table, file_name):
+        return np.load(os.path.join(self.path, self._table(table)[0], file_name), mmap_mode='r')
+
+    def raw(self, table, name):
+        """The stored array of a column: values, codes or epoch seconds"""
+        spec = self.spec(table, name)
+        if spec is None:
+            raise KeyError(f"{table}.{name}")
+        if spec['encoding'] == 'string':
+            raise ValueError(f"{table}.{name} is a string column; use column()")
+        return self._array(table, f"{spec['name']}.npy")
+
+    def column(self, table, name):
+        """A column as pandas/NumPy data, zero-copy except for free text"""
+        spec = self.spec(table, name)
+        if spec is None:
+            raise KeyError(f"{table}.{name}")
+        if spec['encoding'] == 'dictionary':
+            return pd.Categorical.from_codes(self.raw(table, name), categories=spec['dictionary'], validate=False)
+        if spec['encoding'] == 'timestamp':
+            return self.raw(table, name).view('datetime64[s]')
+        if spec['encoding'] == 'string':
+            offsets = self._array(table, f"{spec['name']}.offsets.npy")
+            data = self._array(table, f"{spec['name']}.data.npy")
+            values = np.array([bytes(data[start:end]).decode('utf-8')
+                               for start, end in zip(offsets[:-1].tolist(), offsets[1:].tolist())], dtype=object)
+            if spec['nulls']:
+                values[~self._array(table, f"{spec['name']}.valid.npy")] = None
+            return values
+        return self.raw(table, name)
+
+    def table(self, table, columns=None):
+        """A DataFrame over the mapped columns (all of them by default)"""
+        names = columns or list(self.columns(table))
+        return pd.DataFrame({name: self.column(table, name) for name in names}, copy=False)
+
+    def derived(self, name, compute):
+        """An array computed from the snapshot once, saved beside it and mapped.
+
+        Processes that load the same snapshot later map the saved file
+        instead of computing (and holding) their own copy. If the snapshot
+        directory is not writable the computed array is returned as is.
+        """
+        path = os.path.join(self.path, DERIVED_DIR, f'{name}.npy')
+        try:
+            return np.load(path, mmap_mode='r')
+        except FileNotFoundError:
+            pass
+        values = np.ascontiguousarray(compute())
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp.npy'
+            np.save(tmp_path, values)
+            os.replace(tmp_path, path)
+        except OSError:
+            return values
+        return np.load(path, mmap_mode='r')
+
+
+_snapshots = LRUCache(MAX_SNAPSHOTS)
+
+
+def open_snapshot(path):
+    """Snapshot in a directory, reopened when its manifest is rewritten; None if there is none"""
+    try:
+        mtime = os.stat(os.path.join(path, MANIFEST_FILE)).st_mtime_ns
+    except OSError:
+        return None
+    key = (os.path.abspath(path), mtime)
+    snapshot = _snapshots.get(key)
+    if snapshot is None:
+        try:
+            snapshot = Snapshot(path)
+        except (OSError, ValueError, KeyError):
+            return None
+        _snapshots.put(key, snapshot)
+    return snapshot
+
+
+def find_snapshot(db_path):
+    """The snapshot next to a database if it was exported from its current content"""
+    snapshot = open_snapshot(snapshot_dir(db_path))
+    if snapshot is None or snapshot.fingerprint != database_fingerprint(db_path):
+        return None
+    return snapshot
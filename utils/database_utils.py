@@ -0,0 +1,285 @@
+import sqlite3
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from urllib.parse import quote
+
+from utils.profiling import connection_factory
+
+HASH_CHUNK = 1024 * 1024
+
+_fingerprints = {}
+_fingerprint_lock = threading.Lock()
+
+
+def file_signature(db_path):
+    """(size, mtime_ns) of a file, the cheap part of its fingerprint"""
+    stat = os.stat(db_path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def database_signature(db_path):
+    """Signatures of a database file and of its WAL (None without one).
+
+    Commits in WAL mode only append to the -wal file until a checkpoint,
+    so the main file alone does not show them.
+    """
+    wal = f'{db_path}-wal'
+    try:
+        wal_signature = file_signature(wal)
+    except FileNotFoundError:
+        wal_signature = None
+    return file_signature(db_path), wal_signature
+
+
+def database_fingerprint(db_path):
+    """Content fingerprint of a database file and its WAL.
+
+    The files are hashed once per (size, mtime) pair and the digest is
+    reused until either changes, so identical uploads share one
+    fingerprint and a modified database, checkpointed or not, gets a new
+    one. An empty or missing WAL adds nothing to the digest.
+    """
+    path = os.path.abspath(db_path)
+    signature = database_signature(path)
+    with _fingerprint_lock:
+        cached = _fingerprints.get(path)
+    if cached and cached[0] == signature:
+        return cached[1]
+
+    digest = hashlib.blake2b(digest_size=16)
+    for file_path in (path, f'{path}-wal'):
+        try:
+            with open(file_path, 'rb') as db_file:
+                for chunk in iter(lambda: db_file.read(HASH_CHUNK), b''):
+                    digest.update(chunk)
+        except FileNotFoundError:
+            if file_path == path:
+                raise
+    fingerprint = digest.hexdigest()
+
+    with _fingerprint_lock:
+        _fingerprints[path] = (signature, fingerprint)
+    return fingerprint
+
+
+def readonly_uri(db_path):
+    """SQLite URI opening a file read-only; the path is percent-encoded, as '?' or '#' would end it"""
+    return f'file:{quote(os.path.abspath(db_path))}?mode=ro'
+
+
+def connect_readonly(db_path):
+    """Open a database read-only"""
+    return sqlite3.connect(readonly_uri(db_path), uri=True, factory=connection_factory())
+
+
+@contextmanager
+def read_snapshot(conn):
+    """Run a block's queries against one snapshot of the database.
+
+    The read transaction is pinned by a first read, so rows committed while
+    the block runs are not seen. In WAL mode writers carry on meanwhile;
+    in rollback-journal mode they wait for the block to finish.
+    """
+    conn.execute('BEGIN')
+    try:
+        conn.execute('SELECT COUNT(*) FROM sqlite_master').fetchone()
+        yield conn
+    finally:
+        conn.rollback()
+
+
+def table_columns(conn, table):
+    return [row[1] for row in conn.execute(f'PRAGMA table_info({table})')]
+
+
+def enable_wal(db_path):
+    """Switch a database to WAL mode so readers never block on a writer.
+
+    journal_mode is stored in the file, so this is done once, when the
+    database is created or uploaded, with a short-lived writable
+    connection; read-only files are left as they are. The switch rewrites
+    the header and so changes the fingerprint. Returns True if the
+    database is in WAL mode afterwards.
+    """
+    try:
+        conn = sqlite3.connect(db_path, timeout=1)
+        try:
+            return conn.execute('PRAGMA journal_mode = WAL').fetchone()[0].lower() == 'wal'
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        return False
+
+
+class ConnectionPool:
+    """Pool of read-only, read-tuned SQLite connections keyed by database path.
+
+    Connections are opened with mode=ro and query_only, a large mmap and
+    page cache, and a per-connection prepared-statement cache. Idle
+    connections are reused, preferring the one the calling thread used last.
+    The number of open handles across all databases is capped: the least
+    recently used idle connection is closed to make room, and callers wait
+    when every connection is busy. Opening a database never changes it:
+    journal mode is left to whoever created the file (see enable_wal).
+    A file replaced on disk (by a rename, possibly in another process) is
+    noticed on the next acquire and its old connections are retired.
+    """
+
+    def __init__(self, max_connections=64, mmap_size=256 * 1024 * 1024,
+                 cache_size_kib=64 * 1024, statement_cache=256):
+        self.max_connections = max_connections
+        self.mmap_size = mmap_size
+        self.cache_size_kib = cache_size_kib
+        self.statement_cache = statement_cache
+
+        self._idle = OrderedDict()      # id(conn) -> (path, conn, owner thread), LRU first
+        self._in_use = {}               # id(conn) -> path
+        self._generation = {}           # path -> generation; bumped by close_path
+        self._conn_generation = {}      # id(conn) -> generation when opened
+        self._files = {}                # path -> (st_dev, st_ino) of the file last opened
+        self._condition = threading.Condition()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.waits = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    def _open(self, path):
+        conn = sqlite3.connect(readonly_uri(path), uri=True, check_same_thread=False,
+                               cached_statements=self.statement_cache, factory=connection_factory())
+        conn.execute('PRAGMA query_only = ON')
+        conn.execute(f'PRAGMA mmap_size = {int(self.mmap_size)}')
+        conn.execute(f'PRAGMA cache_size = {-int(self.cache_size_kib)}')
+        conn.execute('PRAGMA temp_store = MEMORY')
+        return conn
+
+    def _take_idle(self, path, thread):
+        fallback = None
+        for key, (idle_path, conn, owner) in self._idle.items():
+            if idle_path == path:
+                if owner == thread:
+                    return key, conn
+                fallback = fallback or (key, conn)
+        return fallback
+
+    def acquire(self, db_path):
+        path = os.path.abspath(db_path)
+        thread = threading.get_ident()
+        waited = None
+        try:
+            stat = os.stat(path)
+            identity = stat.st_dev, stat.st_ino
+        except OSError:
+            identity = None
+        with self._condition:
+            if identity != self._files.setdefault(path, identity):
+                self._retire(path)
+                self._files[path] = identity
+            while True:
+                found = self._take_idle(path, thread)
+                if found:
+                    key, conn = found
+                    del self._idle[key]
+                    self._in_use[key] = path
+                    self.hits += 1
+                    break
+                if len(self._idle) + len(self._in_use) < self.max_connections or self._idle:
+                    if len(self._idle) + len(self._in_use) >= self.max_connections:
+                        _, (_, old_conn, _) = self._idle.popitem(last=False)
+                        self._conn_generation.pop(id(old_conn), None)
+                        old_conn.close()
+                        self.evictions += 1
+                    conn = None
+                    self.misses += 1
+                    # Reserve the slot while the connection is opened outside the lock
+                    self._in_use[('opening', thread, path)] = path
+                    break
+                if waited is None:
+                    waited = time.perf_counter()
+                self._condition.wait()
+
+            if waited is not None:
+                wait = time.perf_counter() - waited
+                self.waits += 1
+                self.wait_seconds += wait
+                self.max_wait_seconds = max(self.max_wait_seconds, wait)
+
+        if conn is None:
+            try:
+                conn = self._open(path)
+            finally:
+                with self._condition:
+                    del self._in_use[('opening', thread, path)]
+                    if conn is not None:
+                        self._in_use[id(conn)] = path
+                        self._conn_generation[id(conn)] = self._generation.get(path, 0)
+                    self._condition.notify()
+        return conn
+
+    def release(self, conn):
+        with self._condition:
+            path = self._in_use.pop(id(conn))
+            if self._conn_generation.get(id(conn)) != self._generation.get(path, 0):
+                self._conn_generation.pop(id(conn), None)
+                conn.close()
+            else:
+                self._idle[id(conn)] = (path, conn, threading.get_ident())
+            self._condition.notify()
+
+    @contextmanager
+    def connection(self, db_path):
+        """Borrow a read-only connection for db_path"""
+        conn = self.acquire(db_path)
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close_path(self, db_path):
+        """Close connections to a file, e.g. after it was replaced on disk.
+
+        Busy connections are closed when they are released.
+        """
+        path = os.path.abspath(db_path)
+        with self._condition:
+            self._retire(path)
+            self._files.pop(path, None)
+
+    def _retire(self, path):
+        """Close idle connections to a path and mark busy ones to close on release; lock held"""
+        self._generation[path] = self._generation.get(path, 0) + 1
+        for key in [key for key, (idle_path, _, _) in self._idle.items() if idle_path == path]:
+            _, conn, _ = self._idle.pop(key)
+            self._conn_generation.pop(key, None)
+            conn.close()
+        self._condition.notify_all()
+
+    def close_all(self):
+        with self._condition:
+            for _, conn, _ in self._idle.values():
+                conn.close()
+            self._idle.clear()
+            self._conn_generation.clear()
+
+    def stats(self):
+        with self._condition:
+            return {
+                'open': len(self._idle) + len(self._in_use),
+                'in_use': len(self._in_use),
+                'idle': len(self._idle),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'waits': self.waits,
+                'wait_seconds_total': self.wait_seconds,
+                'wait_seconds_max': self.max_wait_seconds,
+            }
+
+
+pool = ConnectionPool()
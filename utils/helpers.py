@@ -0,0 +1,100 @@
+import fcntl
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+
+class LRUCache:
+    """Thread-safe least-recently-used cache bounded by entries and, optionally, bytes.
+
+    sizeof(value) gives the size charged for each entry when max_bytes is
+    set. Hit and miss counts are kept for monitoring.
+    """
+
+    def __init__(self, max_entries=128, max_bytes=None, sizeof=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof or (lambda value: 0)
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._sizes = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        size = self.sizeof(value) if self.max_bytes else 0
+        evicted = []
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= self._sizes.pop(key)
+                del self._entries[key]
+            self._entries[key] = value
+            self._sizes[key] = size
+            self._bytes += size
+            while len(self._entries) > 1 and (
+                len(self._entries) > self.max_entries
+                or (self.max_bytes and self._bytes > self.max_bytes)
+            ):
+                old_key, old_value = self._entries.popitem(last=False)
+                self._bytes -= self._sizes.pop(old_key)
+                evicted.append((old_key, old_value))
+        return evicted
+
+    def pop(self, key, default=None):
+        with self._lock:
+            if key not in self._entries:
+                return default
+            self._bytes -= self._sizes.pop(key)
+            return self._entries.pop(key)
+
+    def discard_where(self, predicate):
+        """Remove every entry whose key matches predicate; returns the removed values"""
+        with self._lock:
+            keys = [key for key in self._entries if predicate(key)]
+            removed = []
+            for key in keys:
+                self._bytes -= self._sizes.pop(key)
+                removed.append(self._entries.pop(key))
+        return removed
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._sizes.clear()
+            self._bytes = 0
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    @property
+    def size_bytes(self):
+        return self._bytes
+
+    def stats(self):
+        return {'entries': len(self), 'bytes': self._bytes, 'hits': self.hits, 'misses': self.misses}
+
+
+@contextmanager
+def file_lock(lock_path):
+    """Hold an exclusive flock on lock_path, excluding other threads and processes (gunicorn workers)"""
+    with open(lock_path, 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
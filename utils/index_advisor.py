@@ -0,0 +1,214 @@
+import sqlite3
+import argparse
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.database_utils import connect_readonly, file_signature, pool
+from utils.schema_adapter import LOGICAL_MODEL, SchemaAdapter, SchemaError
+
+# Compiled analytics queries (utils/schema_adapter.py) that filter or join
+# on an indexable column, with the alias that should be a SEARCH and the
+# index that makes it one: (query, alias, (index name, logical table,
+# logical columns)). Names match the indexes create_picknpay_db.py and
+# schema_migrations.py create, so an index that already exists is reused.
+# Indexes over columns a database does not have (a date_key computed from
+# the timestamp) are skipped.
+DATE_STORE_INDEX = ('idx_transactions_date_store', 'transactions',
+                    ('date_key', 'store_id', 'customer_id', 'total_amount'))
+ITEMS_BY_TRANSACTION = ('idx_transaction_items_transaction_id', 'items', ('transaction_id',))
+ADVISED_QUERIES = [
+    ('daily_store_sales', 't', DATE_STORE_INDEX),
+    ('store_performance', 't', DATE_STORE_INDEX),
+    ('monthly_sales', 't', DATE_STORE_INDEX),
+    ('customer_summary', 't', DATE_STORE_INDEX),
+    ('product_sales', 'ti', ITEMS_BY_TRANSACTION),
+    ('sample_items', 'ti', ITEMS_BY_TRANSACTION),
+    ('rfm_features_since', 't', ('idx_transactions_customer_id', 'transactions', ('customer_id',))),
+]
+
+
+def query_plan(conn, sql):
+    """EXPLAIN QUERY PLAN details for a query, with every parameter bound to NULL"""
+    params = dict.fromkeys(re.findall(r':(\w+)', sql)) if ':' in sql else [None] * sql.count('?')
+    return [row[3] for row in conn.execute(f'EXPLAIN QUERY PLAN {sql}', params)]
+
+
+def _searched(plan, alias):
+    """Whether the plan reads a table alias through a real index (not an automatic one)"""
+    return any(detail.startswith(f'SEARCH {alias} ') and 'AUTOMATIC' not in detail for detail in plan)
+
+
+def advise(conn):
+    """Check the compiled analytics queries against a database.
+
+    Returns one entry per applicable query with its plan and, for queries
+    that scan the table they filter (or build an automatic index for it),
+    the index that would fix it.
+    """
+    try:
+        adapter = SchemaAdapter(conn)
+    except SchemaError:
+        return []
+    report = []
+    for name, alias, (index_name, logical, columns) in ADVISED_QUERIES:
+        if not all(adapter.has_column(logical, column) for column in columns):
+            continue
+        physical = tuple(LOGICAL_MODEL[logical][2][column][0] for column in columns)
+        plan = query_plan(conn, adapter.sql(name))
+        indexed = _searched(plan, alias)
+        report.append({
+            'query': name,
+            'plan': plan,
+            'indexed': indexed,
+            'index': None if indexed else (index_name, adapter.tables[logical], physical),
+        })
+    return report
+
+
+def missing_indexes(report):
+    seen = {}
+    for entry in report:
+        if entry['index']:
+            seen.setdefault(entry['index'][0], entry['index'])
+    return list(seen.values())
+
+
+def _checkpoint(path):
+    """Copy committed WAL frames into the database and truncate the WAL.
+
+    Returns False when a reader or writer keeps the WAL from being emptied.
+    """
+    conn = sqlite3.connect(path, timeout=1)
+    try:
+        if conn.execute('PRAGMA journal_mode').fetchone()[0].lower() != 'wal':
+            return True
+        busy, log_frames, _ = conn.execute('PRAGMA wal_checkpoint(TRUNCATE)').fetchone()
+        return busy == 0 and log_frames == 0
+    except sqlite3.OperationalError:
+        return False
+    finally:
+        conn.close()
+
+
+def _state(path):
+    """Signature of a database and the size of its WAL, to detect writes during a build.
+
+    The WAL is emptied before the build, so any commit makes it grow; a
+    reader creating or opening the empty WAL does not count.
+    """
+    wal = f'{path}-wal'
+    return file_signature(path), os.path.getsize(wal) if os.path.exists(wal) else 0
+
+
+_swap_lock = threading.Lock()
+
+
+def optimize_database(db_path):
+    """Build the missing indexes on a private copy and swap it in.
+
+    The original stays readable throughout: its WAL is checkpointed and
+    emptied, the copy is taken with the backup API, indexed and analyzed,
+    then renamed over the original. The -wal and -shm files are left
+    alone, since readers in other processes may still use them; the empty
+    WAL is valid for the new file too. Connections to the old file are
+    retired when the pools notice the replaced file (and its new
+    fingerprint). If the original was written to in the meantime the copy
+    is discarded. Returns a summary dict.
+    """
+    path = os.path.abspath(db_path)
+    conn = connect_readonly(path)
+    try:
+        indexes = missing_indexes(advise(conn))
+    finally:
+        conn.close()
+    if not indexes:
+        return {'path': path, 'created': [], 'swapped': False}
+    if not _checkpoint(path):
+        return {'path': path, 'created': [], 'swapped': False, 'reason': 'WAL busy'}
+
+    before = _state(path)
+    tmp_path = f'{path}.optimizing'
+    for stale in (tmp_path, f'{tmp_path}-wal', f'{tmp_path}-shm'):
+        if os.path.exists(stale):
+            os.remove(stale)
+
+    source = connect_readonly(path)
+    copy = sqlite3.connect(tmp_path)
+    try:
+        source.backup(copy)
+        source.close()
+        for name, table, columns in indexes:
+            copy.execute(f'CREATE INDEX IF NOT EXISTS {name} ON {table}({", ".join(columns)})')
+        copy.execute('ANALYZE')
+        copy.commit()
+        # Same journal mode as the original; the copy's own WAL is
+        # checkpointed and removed when it is closed
+        copy.execute('PRAGMA journal_mode = WAL')
+        remaining = missing_indexes(advise(copy))
+    except BaseException:
+        copy.close()
+        for leftover in (tmp_path, f'{tmp_path}-wal', f'{tmp_path}-shm'):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+        raise
+    finally:
+        source.close()
+    copy.close()
+
+    with _swap_lock:
+        if _state(path) != before:
+            os.remove(tmp_path)
+            return {'path': path, 'created': [], 'swapped': False, 'reason': 'modified during build'}
+        os.replace(tmp_path, path)
+        pool.close_path(path)
+
+    return {'path': path, 'created': [index[0] for index in indexes], 'swapped': True,
+            'still_scanning': [index[0] for index in remaining]}
+
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='index-advisor')
+_jobs = {}
+_jobs_lock = threading.Lock()
+
+
+def schedule_optimization(db_path):
+    """Queue optimize_database() in the background worker; returns its Future.
+
+    A database that is already queued or being optimized is not queued again.
+    """
+    path = os.path.abspath(db_path)
+    with _jobs_lock:
+        job = _jobs.get(path)
+        if job is None or job.done():
+            job = _executor.submit(optimize_database, path)
+            _jobs[path] = job
+    return job
+
+
+def optimization_status(db_path):
+    """'pending', 'running', 'done' or 'failed' for a scheduled database, else None"""
+    with _jobs_lock:
+        job = _jobs.get(os.path.abspath(db_path))
+    if job is None:
+        return None
+    if job.running():
+        return 'running'
+    if not job.done():
+        return 'pending'
+    return 'failed' if job.exception() else 'done'
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Check a database against the analytics queries')
+    parser.add_argument('db', help='database file')
+    parser.add_argument('--apply', action='store_true', help='build the missing indexes and swap them in')
+    args = parser.parse_args()
+
+    conn = connect_readonly(args.db)
+    for entry in advise(conn):
+        status = 'ok  ' if entry['indexed'] else 'SCAN'
+        print(f"{status} {entry['query']}: {'; '.join(entry['plan'])}")
+    conn.close()
+    if args.apply:
+        print(optimize_database(args.db))
@@ -0,0 +1,72 @@
+import sys
+
+from flask import Blueprint, Response
+
+from utils.database_utils import pool
+from utils.profiling import BUCKETS, profiler
+
+metrics = Blueprint('metrics', __name__)
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', ' ')
+
+
+def _family(lines, name, kind, help_text):
+    lines.append(f'# HELP {name} {help_text}')
+    lines.append(f'# TYPE {name} {kind}')
+
+
+def render_metrics():
+    """Prometheus text exposition of the query profile, pool and caches"""
+    lines = []
+    statements = profiler.statements()
+
+    _family(lines, 'sqlite_statement_duration_seconds', 'histogram',
+            'Execute plus fetch time per SQL statement')
+    for s in statements:
+        label = f'statement="{s["statement_id"]}"'
+        cumulative = 0
+        for bound, count in zip(BUCKETS + ('+Inf',), s['buckets']):
+            cumulative += count
+            lines.append(f'sqlite_statement_duration_seconds_bucket{{{label},le="{bound}"}} {cumulative}')
+        lines.append(f'sqlite_statement_duration_seconds_sum{{{label}}} {s["seconds"]:.6f}')
+        lines.append(f'sqlite_statement_duration_seconds_count{{{label}}} {s["count"]}')
+
+    _family(lines, 'sqlite_statement_rows_total', 'counter', 'Rows returned or changed per SQL statement')
+    lines.extend(f'sqlite_statement_rows_total{{statement="{s["statement_id"]}"}} {s["rows"]}' for s in statements)
+    _family(lines, 'sqlite_statement_errors_total', 'counter', 'Failed executions per SQL statement')
+    lines.extend(f'sqlite_statement_errors_total{{statement="{s["statement_id"]}"}} {s["errors"]}'
+                 for s in statements)
+    _family(lines, 'sqlite_statement_info', 'gauge', 'SQL text of each statement id (truncated)')
+    lines.extend(f'sqlite_statement_info{{statement="{s["statement_id"]}",sql="{_label(s["sql"][:300])}"}} 1'
+                 for s in statements)
+
+    stats = pool.stats()
+    for key in ('open', 'in_use', 'idle'):
+        _family(lines, f'sqlite_pool_{key}_connections', 'gauge', f'Pooled connections ({key})')
+        lines.append(f'sqlite_pool_{key}_connections {stats[key]}')
+    for key in ('hits', 'misses', 'evictions', 'waits'):
+        _family(lines, f'sqlite_pool_{key}_total', 'counter', f'Connection pool {key}')
+        lines.append(f'sqlite_pool_{key}_total {stats[key]}')
+    _family(lines, 'sqlite_pool_wait_seconds_total', 'counter', 'Time spent waiting for a connection')
+    lines.append(f'sqlite_pool_wait_seconds_total {stats["wait_seconds_total"]:.6f}')
+
+    # Only a worker that already loaded the analytics has caches to report;
+    # importing them here would pull pandas into every scraped worker
+    analytics = sys.modules.get('utils.analytics')
+    caches = analytics.cache_stats() if analytics is not None else {}
+    for key in ('hits', 'misses'):
+        _family(lines, f'analytics_cache_{key}_total', 'counter', f'Analytics cache {key}')
+        lines.extend(f'analytics_cache_{key}_total{{cache="{cache}"}} {values[key]}'
+                     for cache, values in caches.items())
+    _family(lines, 'analytics_cache_entries', 'gauge', 'Entries held by each analytics cache')
+    lines.extend(f'analytics_cache_entries{{cache="{cache}"}} {values["entries"]}' for cache, values in caches.items())
+    _family(lines, 'analytics_cache_bytes', 'gauge', 'Bytes held by each analytics cache')
+    lines.extend(f'analytics_cache_bytes{{cache="{cache}"}} {values["bytes"]}' for cache, values in caches.items())
+    return '\n'.join(lines) + '\n'
+
+
+@metrics.route('/metrics')
+def metrics_endpoint():
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,221 @@
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from utils.database_utils import database_fingerprint, pool
+from utils.schema_adapter import get_adapter
+
+PARTITION_SUFFIX = '.partitions'        # as in partition_database.py: <db>.partitions/
+CATALOG_FILE = 'catalog.json'
+FULL_RANGE = {'start': 0, 'end': 99_999_999}    # every date_key
+MAX_WORKERS = min(32, os.cpu_count() or 1)
+
+# How each compiled query's partial results combine: group keys and the
+# merge function per column. Counts merge by summing. A store lives in
+# exactly one partition, so distinct customers per store also add up.
+MERGES = {
+    'daily_store_sales': (('date_key', 'store_id'), {'transactions': 'sum', 'revenue': 'sum'}),
+    'product_sales': (('product_id',), {'quantity': 'sum', 'revenue': 'sum', 'transactions': 'sum'}),
+    'customer_summary': (('customer_id',), {'frequency': 'sum', 'monetary': 'sum', 'last_date_key': 'max'}),
+    'store_performance': (('store_id',), {'transactions': 'sum', 'revenue': 'sum', 'unique_customers': 'sum'}),
+    'monthly_sales': (('month_key', 'store_id'), {'transactions': 'sum', 'revenue': 'sum', 'min_amount': 'min',
+                                                  'max_amount': 'max', 'unique_customers': 'sum'}),
+}
+# Averages are recomputed from merged sums and counts, never averaged
+AVERAGES = {'avg_transaction_value': ('revenue', 'transactions')}
+
+log = logging.getLogger('partitions')
+
+
+class StalePartitions(RuntimeError):
+    """Raised when the source database has changed since it was partitioned"""
+
+
+def partition_dir(db_path):
+    return os.path.abspath(db_path) + PARTITION_SUFFIX
+
+
+class PartitionRouter:
+    """Routes queries to the per-store databases listed in a partition catalog.
+
+    A query for one store opens only that store's file; other queries run
+    on every partition in a thread pool and their partial results are
+    merged with sum, min or max per column, with averages derived from the
+    merged sums and counts.
+    """
+
+    def __init__(self, catalog_path, max_workers=MAX_WORKERS):
+        if os.path.isdir(catalog_path):
+            catalog_path = os.path.join(catalog_path, CATALOG_FILE)
+        with open(catalog_path, encoding='utf-8') as catalog_file:
+            self.catalog = json.load(catalog_file)
+        base = os.path.dirname(os.path.abspath(catalog_path))
+        self.paths = {partition['store_id']: os.path.join(base, partition['path'])
+                      for partition in self.catalog['partitions']}
+        self.max_workers = max_workers
+        self._executor = None
+        self._lock = threading.Lock()
+
+    @property
+    def store_ids(self):
+        return list(self.paths)
+
+    def _pool(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='partition')
+            return self._executor
+
+    def _targets(self, store_id=None):
+        if store_id is None:
+            return list(self.paths.values())
+        return [self.paths[store_id]] if store_id in self.paths else []
+
+    @staticmethod
+    def _run(path, sql, params):
+        with pool.connection(path) as conn:
+            cursor = conn.execute(sql, params)
+            columns = [column[0] for column in cursor.description]
+            return pd.DataFrame.from_records(cursor.fetchall(), columns=columns)
+
+    def map(self, sql, params=(), store_id=None):
+        """Run raw SQL on the partitions it concerns; one DataFrame per partition"""
+        targets = self._targets(store_id)
+        if len(targets) <= 1:
+            return [self._run(path, sql, params) for path in targets]
+        return list(self._pool().map(lambda path: self._run(path, sql, params), targets))
+
+    def map_query(self, name, params=None, store_id=None):
+        """Run a compiled schema-adapter query on the partitions"""
+        params = dict(FULL_RANGE, **(params or {}))
+        targets = self._targets(store_id)
+
+        def run(path):
+            return self._run(path, get_adapter(path).sql(name), params)
+        if len(targets) <= 1:
+            return [run(path) for path in targets]
+        return list(self._pool().map(run, targets))
+
+    def aggregate(self, name, params=None, store_id=None):
+        """A compiled aggregate query merged across partitions, as in MERGES"""
+        keys, merge = MERGES[name]
+        return merge_partials(self.map_query(name, params, store_id), keys, merge)
+
+    def close(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
+
+
+def merge_partials(frames, keys, merge):
+    """Combine per-partition aggregates: group by keys and apply sum/count/min/max per column"""
+    frames = [frame for frame in frames if not frame.empty]
+    if not frames:
+        return pd.DataFrame(columns=list(keys) + list(merge) +
+                            [name for name, (total, count) in AVERAGES.items() if total in merge and count in merge])
+    combined = pd.concat(frames, ignore_index=True)
+    how = {column: 'sum' if func == 'count' else func for column, func in merge.items()}
+    merged = combined.groupby(list(keys), sort=True, dropna=False).agg(how).reset_index()
+    for name, (total, count) in AVERAGES.items():
+        if total in merged and count in merged:
+            counts = merged[count].to_numpy(dtype=np.float64)
+            merged[name] = np.divide(merged[total].to_numpy(dtype=np.float64), counts,
+                                     out=np.full(len(merged), np.nan), where=counts != 0)
+    return merged
+
+
+def _monthly_frame(months):
+    months.insert(0, 'month', [f'{key // 100:04d}-{key % 100:02d}' for key in months.pop('month_key')])
+    return months.rename(columns={'transactions': 'transaction_count', 'revenue': 'total_revenue'})[
+        ['month', 'store_id', 'transaction_count', 'total_revenue', 'avg_transaction_value', 'unique_customers']]
+
+
+def monthly_sales_analysis(router, store_id=None):
+    """Monthly_Sales_Analysis computed by fanning out over the partitions"""
+    return _monthly_frame(router.aggregate('monthly_sales', store_id=store_id))
+
+
+def chain_daily_sales(router, start=None, end=None):
+    """Chain-wide revenue and transactions per day, merged across all stores"""
+    params = {'start': start or FULL_RANGE['start'], 'end': end or FULL_RANGE['end']}
+    days = router.aggregate('daily_store_sales', params)
+    return merge_partials([days], ('date_key',), {'transactions': 'sum', 'revenue': 'sum'})
+
+
+_routers = {}
+_routers_lock = threading.Lock()
+
+
+def check_catalog(catalog):
+    """Raise StalePartitions when a catalog's source database no longer has the content it was split from"""
+    source, fingerprint = catalog.get('source'), catalog.get('source_fingerprint')
+    if fingerprint is None:
+        raise StalePartitions("The catalog does not record its source's fingerprint; re-run partition_database.py")
+    if os.path.exists(source) and database_fingerprint(source) != fingerprint:
+        raise StalePartitions(f"{source} has changed since it was partitioned "
+                              f"(up to transaction {catalog.get('max_transaction_id')}); re-run partition_database.py")
+
+
+def get_router(catalog_path, allow_stale=False):
+    """Router for a catalog, reloaded when the catalog file changes.
+
+    Raises StalePartitions when the source database has changed since the
+    catalog was written, unless allow_stale is set, in which case the
+    change is logged and the partitions are used as they are.
+    """
+    path = os.path.abspath(catalog_path)
+    if os.path.isdir(path):
+        path = os.path.join(path, CATALOG_FILE)
+    mtime = os.stat(path).st_mtime_ns
+    with _routers_lock:
+        cached = _routers.get(path)
+    if cached and cached[0] == mtime:
+        router = cached[1]
+    else:
+        router = PartitionRouter(path)
+        with _routers_lock:
+            _routers[path] = (mtime, router)
+        if cached:
+            cached[1].close()
+    try:
+        check_catalog(router.catalog)
+    except StalePartitions as e:
+        if not allow_stale:
+            raise
+        log.warning("%s", e)
+    return router
+
+
+def router_for(db_path):
+    """Router over a database's <db>.partitions, or None when it has none or they are stale"""
+    catalog_path = os.path.join(partition_dir(db_path), CATALOG_FILE)
+    if not os.path.exists(catalog_path):
+        return None
+    try:
+        return get_router(catalog_path)
+    except StalePartitions as e:
+        log.info("Not using partitions: %s", e)
+        return None
+
+
+def monthly_sales(db_path, store_id=None):
+    """Monthly_Sales_Analysis for a database.
+
+    Read from its store partitions when they are current, so a single-store
+    query opens only that store's file; otherwise computed on the database.
+    """
+    router = router_for(db_path)
+    if router is not None:
+        return monthly_sales_analysis(router, store_id)
+    keys, merge = MERGES['monthly_sales']
+    with pool.connection(db_path) as conn:
+        months = pd.read_sql_query(get_adapter(db_path).sql('monthly_sales'), conn, params=FULL_RANGE)
+    if store_id is not None:
+        months = months[months['store_id'] == store_id]
+    return _monthly_frame(merge_partials([months], keys, merge))
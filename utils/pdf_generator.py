@@ -0,0 +1,184 @@
+import os
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from utils import analytics, partitions, sampling, segmentation, sketches
+
+# A4 in points
+PAGE_WIDTH = 595
+PAGE_HEIGHT = 842
+MARGIN = 40
+FONT_SIZE = 9
+LINE_HEIGHT = 13
+CHAR_WIDTH = 0.52 * FONT_SIZE           # average Helvetica glyph width, for column sizing
+
+
+def _escape(text):
+    text = str(text).encode('latin-1', 'replace').decode('latin-1')
+    return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+
+def _format(value):
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return ''
+    if isinstance(value, (float, np.floating)):
+        return f'{value:,.2f}'
+    if isinstance(value, (np.datetime64, pd.Timestamp)):
+        return str(pd.Timestamp(value).date())
+    return str(value)
+
+
+def _layout(frame):
+    """Header, formatted rows and column widths (points) that fit the page"""
+    header = [str(column) for column in frame.columns]
+    rows = [[_format(value) for value in row] for row in frame.itertuples(index=False)]
+    widths = [max([len(header[i])] + [len(row[i]) for row in rows]) for i in range(len(header))]
+    available = (PAGE_WIDTH - 2 * MARGIN) / CHAR_WIDTH
+    scale = min(1.0, available / max(sum(widths) + len(widths), 1))
+    chars = [max(4, int((width + 1) * scale) - 1) for width in widths]
+    return header, rows, chars
+
+
+class _Page:
+    def __init__(self):
+        self.commands = []
+        self.y = PAGE_HEIGHT - MARGIN
+
+    def text(self, x, text, font='F1', size=FONT_SIZE):
+        self.commands.append(f'BT /{font} {size} Tf {x:.1f} {self.y:.1f} Td ({_escape(text)}) Tj ET')
+
+    def line(self):
+        y = self.y + LINE_HEIGHT - 3
+        self.commands.append(f'0.6 w {MARGIN} {y:.1f} m {PAGE_WIDTH - MARGIN} {y:.1f} l S')
+
+
+def _write_pdf(pages, path):
+    """Write pages of content commands as a PDF using the standard Helvetica fonts"""
+    objects = [
+        '<< /Type /Catalog /Pages 2 0 R >>',
+        None,
+        '<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>',
+        '<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding /WinAnsiEncoding >>',
+    ]
+    page_ids = []
+    for page in pages:
+        stream = '\n'.join(page.commands).encode('latin-1')
+        objects.append(f'<< /Length {len(stream)} >>\nstream\n'.encode('latin-1') + stream + b'\nendstream')
+        page_ids.append(len(objects) + 1)
+        objects.append(f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {PAGE_WIDTH} {PAGE_HEIGHT}] '
+                       f'/Resources << /Font << /F1 3 0 R /F2 4 0 R >> >> /Contents {len(objects)} 0 R >>')
+    objects[1] = f'<< /Type /Pages /Kids [{" ".join(f"{i} 0 R" for i in page_ids)}] /Count {len(page_ids)} >>'
+
+    with open(path, 'wb') as pdf:
+        pdf.write(b'%PDF-1.4\n')
+        offsets = []
+        for number, body in enumerate(objects, start=1):
+            offsets.append(pdf.tell())
+            body = body if isinstance(body, bytes) else body.encode('latin-1')
+            pdf.write(f'{number} 0 obj\n'.encode() + body + b'\nendobj\n')
+        xref = pdf.tell()
+        pdf.write(f'xref\n0 {len(objects) + 1}\n0000000000 65535 f \n'.encode())
+        for offset in offsets:
+            pdf.write(f'{offset:010d} 00000 n \n'.encode())
+        pdf.write(f'trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n'.encode())
+
+
+def render_report(title, sections, path, subtitle=None):
+    """Render (heading, DataFrame) sections as paginated tables into a PDF file.
+
+    Table headers are repeated on every page a table continues onto.
+    """
+    pages = [_Page()]
+    page = pages[0]
+
+    def new_page():
+        nonlocal page
+        page = _Page()
+        pages.append(page)
+
+    page.text(MARGIN, title, 'F2', 16)
+    page.y -= 20
+    page.text(MARGIN, subtitle or f"Generated {datetime.now():%Y-%m-%d %H:%M}", 'F1', FONT_SIZE)
+    page.y -= 2 * LINE_HEIGHT
+
+    for heading, frame in sections:
+        header, rows, chars = _layout(frame)
+        positions = np.concatenate([[MARGIN], MARGIN + np.cumsum([(c + 1) * CHAR_WIDTH for c in chars])[:-1]])
+        if page.y < MARGIN + 4 * LINE_HEIGHT:
+            new_page()
+        page.text(MARGIN, heading, 'F2', 12)
+        page.y -= 1.5 * LINE_HEIGHT
+        for i, row in enumerate([None] + rows):
+            if page.y < MARGIN or i == 0:
+                if i:
+                    new_page()
+                for x, name, width in zip(positions, header, chars):
+                    page.text(x, name[:width], 'F2')
+                page.y -= LINE_HEIGHT
+                page.line()
+                if i == 0:
+                    continue
+            for x, value, width in zip(positions, row, chars):
+                page.text(x, value[:width])
+            page.y -= LINE_HEIGHT
+        if not rows:
+            page.text(MARGIN, 'No data for the selected filters.')
+            page.y -= LINE_HEIGHT
+        page.y -= LINE_HEIGHT
+
+    _write_pdf(pages, path)
+    return path
+
+
+def _filters(params):
+    parts = [f"{name.replace('_', ' ')} {value}" for name, value in sorted(params.items()) if value is not None]
+    return 'Filters: ' + ', '.join(parts) if parts else None
+
+
+def sales_trends_report(db_path, approximate=False, **params):
+    return 'Sales Trends', [('Revenue by period', sampling.sales_trends(db_path, approximate=approximate, **params))]
+
+
+def category_revenue_report(db_path, approximate=False, **params):
+    return 'Category Revenue', [('Revenue by category',
+                                 sampling.category_revenue(db_path, approximate=approximate, **params))]
+
+
+def customer_segments_report(db_path, limit=50, segment=None):
+    return 'Customer Segments', [
+        ('Segments', segmentation.segment_summary(db_path)),
+        ('Top customers', segmentation.segment_customers(db_path, segment, limit=limit)),
+    ]
+
+
+def top_products_report(db_path, approximate=False, **params):
+    return 'Top Products', [('Best sellers', sketches.top_products(db_path, approximate=approximate, **params))]
+
+
+def monthly_sales_report(db_path, store_id=None):
+    return 'Monthly Sales', [('Sales by month', partitions.monthly_sales(db_path, store_id))]
+
+
+def store_performance_report(db_path, **params):
+    return 'Store Performance', [('Stores', analytics.store_performance(db_path, **params))]
+
+
+REPORTS = {
+    'sales_trends': sales_trends_report,
+    'category_revenue': category_revenue_report,
+    'customer_segments': customer_segments_report,
+    'top_products': top_products_report,
+    'monthly_sales': monthly_sales_report,
+    'store_performance': store_performance_report,
+}
+
+
+def generate_report(db_path, report_type, params, output_path):
+    """Compute one analytics report and write it as a PDF to output_path"""
+    title, sections = REPORTS[report_type](db_path, **params)
+    tmp_path = f'{output_path}.{os.getpid()}.tmp'
+    render_report(title, sections, tmp_path, _filters(params))
+    os.replace(tmp_path, output_path)
+    return output_path
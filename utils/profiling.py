@@ -0,0 +1,246 @@
+import sqlite3
+import hashlib
+import logging
+import threading
+from time import perf_counter
+
+# Histogram bucket upper bounds, in seconds
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SLOW_QUERY_SECONDS = 0.25
+MAX_STATEMENTS = 500                    # distinct statements tracked; the rest are counted as 'other'
+ITER_BATCH = 256                        # rows fetched per step when a cursor is iterated
+EXPLAINABLE = ('SELECT', 'WITH', 'INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+
+slow_log = logging.getLogger('sql.slow')
+
+
+class StatementStats:
+    __slots__ = ('statement_id', 'sql', 'count', 'errors', 'seconds', 'rows', 'buckets', 'plan')
+
+    def __init__(self, statement_id, sql):
+        self.statement_id = statement_id
+        self.sql = sql
+        self.count = 0
+        self.errors = 0
+        self.seconds = 0.0
+        self.rows = 0
+        self.buckets = [0] * (len(BUCKETS) + 1)
+        self.plan = None
+
+
+def _bucket(seconds):
+    for i, bound in enumerate(BUCKETS):
+        if seconds <= bound:
+            return i
+    return len(BUCKETS)
+
+
+class QueryProfiler:
+    """Per-statement latency histograms, row counts and slow-query plans.
+
+    Statements are keyed by their SQL text, which is stable because the
+    analytics use compiled, parameterized queries. Recording costs two
+    perf_counter calls per execute/fetch and one short lock per statement.
+    """
+
+    def __init__(self, slow_seconds=SLOW_QUERY_SECONDS, max_statements=MAX_STATEMENTS):
+        self.enabled = False
+        self.slow_seconds = slow_seconds
+        self.max_statements = max_statements
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def enable(self, slow_seconds=None, log_path=None):
+        """Turn profiling on for connections opened from now on"""
+        if slow_seconds is not None:
+            self.slow_seconds = slow_seconds
+        if log_path and not any(getattr(h, 'baseFilename', None) == log_path for h in slow_log.handlers):
+            handler = logging.FileHandler(log_path)
+            handler.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+            slow_log.addHandler(handler)
+            slow_log.setLevel(logging.INFO)
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def _entry(self, sql):
+        stats = self._stats.get(sql)
+        if stats is None:
+            if len(self._stats) >= self.max_statements:
+                sql = 'other'
+                stats = self._stats.get(sql)
+            if stats is None:
+                statement_id = hashlib.blake2b(sql.encode(), digest_size=6).hexdigest()
+                stats = self._stats[sql] = StatementStats(statement_id, ' '.join(sql.split()))
+        return stats
+
+    def record(self, sql, seconds, rows, cursor=None, params=()):
+        with self._lock:
+            stats = self._entry(sql)
+            stats.count += 1
+            stats.seconds += seconds
+            stats.rows += rows
+            stats.buckets[_bucket(seconds)] += 1
+            explain = seconds >= self.slow_seconds and stats.plan is None and stats.sql != 'other'
+            if explain:
+                stats.plan = []         # claimed: explained once per statement
+        if seconds >= self.slow_seconds:
+            plan = self._explain(cursor, sql, params) if explain else stats.plan
+            if explain:
+                stats.plan = plan
+            slow_log.info("slow query %.3fs rows=%d id=%s sql=%s plan=%s",
+                          seconds, rows, stats.statement_id, stats.sql, ' | '.join(plan or []))
+
+    def record_error(self, sql):
+        with self._lock:
+            self._entry(sql).errors += 1
+
+    @staticmethod
+    def _explain(cursor, sql, params):
+        if cursor is None or not sql.lstrip().upper().startswith(EXPLAINABLE):
+            return []
+        try:
+            rows = cursor.connection.cursor(sqlite3.Cursor).execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            return [row[3] for row in rows]
+        except sqlite3.Error:
+            return []
+
+    def statements(self):
+        """Snapshot of the per-statement stats, slowest total time first"""
+        with self._lock:
+            snapshot = [(s.statement_id, s.sql, s.count, s.errors, s.seconds, s.rows, list(s.buckets), s.plan)
+                        for s in self._stats.values()]
+        keys = ('statement_id', 'sql', 'count', 'errors', 'seconds', 'rows', 'buckets', 'plan')
+        return sorted((dict(zip(keys, row)) for row in snapshot), key=lambda s: -s['seconds'])
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+
+profiler = QueryProfiler()
+
+
+class ProfiledCursor(sqlite3.Cursor):
+    """Cursor that reports each statement's execute + fetch time and row count.
+
+    A query is recorded once its results are exhausted, the cursor is
+    closed or reused; other statements are recorded after execute.
+    """
+
+    _sql = None
+
+    def _start(self, sql, params):
+        self._finish()
+        self._sql = sql
+        self._params = params
+        self._rows = 0
+        self._elapsed = 0.0
+
+    def _finish(self):
+        if self._sql is not None:
+            sql, self._sql = self._sql, None
+            profiler.record(sql, self._elapsed, self._rows, self, self._params)
+
+    def execute(self, sql, parameters=()):
+        self._start(sql, parameters)
+        start = perf_counter()
+        try:
+            super().execute(sql, parameters)
+        except Exception:
+            self._sql = None
+            profiler.record_error(sql)
+            raise
+        self._elapsed += perf_counter() - start
+        if self.description is None:
+            self._rows = max(self.rowcount, 0)
+            self._finish()
+        return self
+
+    def executemany(self, sql, seq_of_parameters):
+        self._start(sql, ())
+        start = perf_counter()
+        try:
+            super().executemany(sql, seq_of_parameters)
+        except Exception:
+            self._sql = None
+            profiler.record_error(sql)
+            raise
+        self._elapsed += perf_counter() - start
+        self._rows = max(self.rowcount, 0)
+        self._finish()
+        return self
+
+    def fetchone(self):
+        start = perf_counter()
+        row = super().fetchone()
+        self._elapsed += perf_counter() - start
+        if row is None:
+            self._finish()
+        else:
+            self._rows += 1
+        return row
+
+    def fetchmany(self, size=None):
+        size = self.arraysize if size is None else size
+        start = perf_counter()
+        rows = super().fetchmany(size)
+        self._elapsed += perf_counter() - start
+        self._rows += len(rows)
+        if len(rows) < size:
+            self._finish()
+        return rows
+
+    def fetchall(self):
+        start = perf_counter()
+        rows = super().fetchall()
+        self._elapsed += perf_counter() - start
+        self._rows += len(rows)
+        self._finish()
+        return rows
+
+    def __iter__(self):
+        # Iterating in fetchmany batches keeps the per-row cost out of Python
+        while True:
+            rows = self.fetchmany(ITER_BATCH)
+            yield from rows
+            if len(rows) < ITER_BATCH:
+                return
+
+    def __next__(self):
+        start = perf_counter()
+        try:
+            row = super().__next__()
+        except StopIteration:
+            self._elapsed += perf_counter() - start
+            self._finish()
+            raise
+        self._elapsed += perf_counter() - start
+        self._rows += 1
+        return row
+
+    def close(self):
+        self._finish()
+        super().close()
+
+    def __del__(self):
+        self._finish()
+
+
+class ProfiledConnection(sqlite3.Connection):
+    """Connection whose cursors (including Connection.execute) are profiled"""
+
+    def cursor(self, factory=ProfiledCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+def connection_factory():
+    """Connection class for sqlite3.connect(factory=...) given the profiler state"""
+    return ProfiledConnection if profiler.enabled else sqlite3.Connection
@@ -0,0 +1,303 @@
+import fcntl
+import hashlib
+import json
+import multiprocessing
+import os
+import re
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from flask import Blueprint, abort, current_app, jsonify, request, send_file, url_for
+
+from utils.database_utils import database_fingerprint
+from utils.helpers import file_lock
+
+REPORT_DIR = 'database/reports'
+MAX_RENDERS = 2                         # PDFs rendered at the same time
+MAX_QUEUED = 32                         # jobs waiting for a render slot
+JOB_TTL = 3600                          # seconds finished jobs stay queryable
+SLOT_POLL = 0.2                         # seconds between tries for a free render slot
+
+
+def flag(value):
+    """A form, query-string or JSON boolean"""
+    return str(value).lower() in ('1', 'true', 'yes', 'on')
+
+
+# Accepted parameters per report type and how to parse them
+REPORT_PARAMS = {
+    'sales_trends': {'period': str, 'store_id': int, 'start': str, 'end': str, 'approximate': flag},
+    'category_revenue': {'store_id': int, 'start': str, 'end': str, 'approximate': flag},
+    'customer_segments': {'segment': str, 'limit': int},
+    'top_products': {'limit': int, 'by': str, 'store_id': int, 'start': str, 'end': str, 'approximate': flag},
+    'monthly_sales': {'store_id': int},
+    'store_performance': {'start': str, 'end': str},
+}
+
+
+class ReportQueueFull(RuntimeError):
+    """Raised when MAX_QUEUED renders are already waiting"""
+
+
+def report_key(fingerprint, report_type, params):
+    """Cache key for a report of one database content with given parameters"""
+    payload = json.dumps([fingerprint, report_type, params], sort_keys=True, default=str)
+    return hashlib.blake2b(payload.encode(), digest_size=16).hexdigest()
+
+
+def _read_job(path):
+    try:
+        with open(path, encoding='utf-8') as job_file:
+            return json.load(job_file)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_job(path, job):
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as job_file:
+        json.dump(job, job_file)
+    os.replace(tmp_path, path)
+
+
+def _acquire_slot(report_dir, max_renders):
+    """Lock one of max_renders slot files, waiting until one is free.
+
+    The slots are flocks, so they are shared by the render processes of
+    every web worker; the open file is returned and closing it frees the slot.
+    """
+    while True:
+        for slot in range(max_renders):
+            slot_file = open(os.path.join(report_dir, f'render-{slot}.lock'), 'a')
+            try:
+                fcntl.flock(slot_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                slot_file.close()
+                continue
+            return slot_file
+        time.sleep(SLOT_POLL)
+
+
+def render_report(db_path, report_type, params, output_path, job_path, max_renders):
+    """Render in a pool process once a render slot is free, recording progress in the job file.
+
+    The PDF code pulls in pandas and scikit-learn, which the web workers
+    only import when they need them.
+    """
+    slot = _acquire_slot(os.path.dirname(output_path), max_renders)
+    try:
+        job = _read_job(job_path) or {}
+        _write_job(job_path, dict(job, status='running'))
+        try:
+            from utils.pdf_generator import generate_report
+            generate_report(db_path, report_type, params, output_path)
+        except Exception as e:
+            _write_job(job_path, dict(job, status='failed', error=str(e), finished=time.time()))
+            raise
+        _write_job(job_path, dict(job, status='done', finished=time.time()))
+    finally:
+        slot.close()
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def parse_params(report_type, values):
+    """Keep the known parameters for a report type, converted to their types"""
+    if report_type not in REPORT_PARAMS:
+        raise KeyError(report_type)
+    params = {}
+    for name, kind in REPORT_PARAMS[report_type].items():
+        value = values.get(name)
+        if value not in (None, ''):
+            params[name] = kind(value)
+    return params
+
+
+class ReportQueue:
+    """Renders reports in a process pool and caches the PDFs on disk.
+
+    Reports are cached as REPORT_DIR/<key>.pdf, where the key covers the
+    database fingerprint, the report type and its parameters, so a report
+    already rendered for the same content is returned without a job. The
+    key is also the job id: a job's state lives in REPORT_DIR/<key>.json,
+    so every gunicorn worker sees every job and identical requests share
+    one. Render slots are file locks, which caps concurrent renders at
+    max_renders across all workers; max_queued caps the backlog.
+    """
+
+    def __init__(self, report_dir=REPORT_DIR, max_renders=MAX_RENDERS, max_queued=MAX_QUEUED):
+        self.report_dir = report_dir
+        self.max_renders = max_renders
+        self.max_queued = max_queued
+        self._executor = None
+        self._executor_pid = None
+        self._lock = threading.Lock()
+
+    def _pool(self):
+        with self._lock:
+            if self._executor is None or self._executor_pid != os.getpid():
+                # spawn: the web process has threads and open SQLite handles
+                self._executor = ProcessPoolExecutor(self.max_renders,
+                                                     mp_context=multiprocessing.get_context('spawn'))
+                self._executor_pid = os.getpid()
+            return self._executor
+
+    def report_path(self, key):
+        return os.path.join(self.report_dir, f'{key}.pdf')
+
+    def job_path(self, key):
+        return os.path.join(self.report_dir, f'{key}.json')
+
+    def _active(self, job):
+        # A job whose web worker died without finishing it is abandoned
+        return job is not None and job['status'] in ('queued', 'running') and _alive(job['pid'])
+
+    def _jobs(self):
+        try:
+            names = [name for name in os.listdir(self.report_dir) if name.endswith('.json')]
+        except FileNotFoundError:
+            return []
+        jobs = [_read_job(os.path.join(self.report_dir, name)) for name in names]
+        return [job for job in jobs if job is not None]
+
+    def submit(self, db_path, report_type, params):
+        """Queue a report; returns its job dict (already 'done' when cached)"""
+        db_path = os.path.abspath(db_path)
+        key = report_key(database_fingerprint(db_path), report_type, params)
+        path, job_path = self.report_path(key), self.job_path(key)
+        os.makedirs(self.report_dir, exist_ok=True)
+        with file_lock(os.path.join(self.report_dir, 'queue.lock')):
+            self._expire()
+            job = _read_job(job_path)
+            if self._active(job):
+                return job
+            job = {'id': key, 'key': key, 'report_type': report_type, 'params': params,
+                   'status': 'queued', 'error': None, 'created': time.time(), 'finished': None,
+                   'pid': os.getpid(), 'cached': False}
+            if os.path.exists(path):
+                job.update(status='done', cached=True, finished=time.time())
+                _write_job(job_path, job)
+                return job
+            if sum(self._active(other) for other in self._jobs()) >= self.max_queued + self.max_renders:
+                raise ReportQueueFull("Too many reports are being rendered, try again shortly")
+            _write_job(job_path, job)
+
+        args = (render_report, db_path, report_type, params, path, job_path, self.max_renders)
+        try:
+            try:
+                future = self._pool().submit(*args)
+            except BrokenProcessPool:
+                # A worker died (e.g. killed for memory); start a fresh pool
+                with self._lock:
+                    self._executor = None
+                future = self._pool().submit(*args)
+        except Exception as e:
+            job.update(status='failed', error=str(e), finished=time.time())
+            _write_job(job_path, job)
+            return job
+        future.add_done_callback(lambda done: self._finish(job, done))
+        return job
+
+    def _finish(self, job, future):
+        # The render process records its own outcome; this covers a pool that died under it
+        error = 'cancelled' if future.cancelled() else future.exception()
+        if error is not None:
+            recorded = _read_job(self.job_path(job['key']))
+            if recorded is None or recorded['status'] != 'failed':
+                _write_job(self.job_path(job['key']), dict(job, status='failed', error=str(error),
+                                                           finished=time.time()))
+
+    def _expire(self):
+        """Drop the state of jobs finished more than JOB_TTL ago; the PDFs stay cached"""
+        cutoff = time.time() - JOB_TTL
+        for job in self._jobs():
+            if job['finished'] and job['finished'] < cutoff:
+                try:
+                    os.remove(self.job_path(job['key']))
+                except FileNotFoundError:
+                    pass
+
+    def job(self, job_id):
+        """A job by id (its cache key), or None for an unknown id"""
+        if not re.fullmatch(r'[0-9a-f]{32}', job_id):
+            return None
+        job = _read_job(self.job_path(job_id))
+        if job is None:
+            return None
+        if job['status'] in ('queued', 'running') and not _alive(job['pid']):
+            job.update(status='failed', error='The worker rendering this report stopped')
+        return job
+
+    def stats(self):
+        jobs = [self.job(job['key']) for job in self._jobs()]
+        statuses = [job['status'] for job in jobs if job is not None]
+        return {status: statuses.count(status) for status in ('queued', 'running', 'done', 'failed')}
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+
+report_queue = ReportQueue()
+
+reports = Blueprint('reports', __name__)
+
+
+def _job_response(job, status_code=200):
+    body = {key: job[key] for key in ('id', 'report_type', 'params', 'status', 'error')}
+    body['status_url'] = url_for('reports.report_status', job_id=job['id'])
+    if job['status'] == 'done':
+        body['download_url'] = url_for('reports.download_report', job_id=job['id'])
+    return jsonify(body), status_code
+
+
+@reports.route('/reports/<report_type>', methods=['POST'])
+def request_report(report_type):
+    """Queue a report for the database at db_path; returns a job to poll"""
+    values = request.get_json(silent=True) or request.values
+    db_path = values.get('db_path')
+    if not db_path:
+        abort(400, description='db_path is required')
+    db_path = os.path.abspath(db_path)
+    if os.path.dirname(db_path) != os.path.abspath(current_app.config['UPLOAD_FOLDER']) or not os.path.exists(db_path):
+        abort(404)
+    try:
+        params = parse_params(report_type, values)
+    except KeyError:
+        abort(404)
+    except ValueError as e:
+        abort(400, description=str(e))
+    try:
+        job = report_queue.submit(db_path, report_type, params)
+    except ReportQueueFull as e:
+        return jsonify({'error': str(e)}), 503, {'Retry-After': '5'}
+    return _job_response(job, 200 if job['status'] == 'done' else 202)
+
+
+@reports.route('/reports/jobs/<job_id>')
+def report_status(job_id):
+    job = report_queue.job(job_id)
+    if job is None:
+        abort(404)
+    return _job_response(job)
+
+
+@reports.route('/reports/jobs/<job_id>/download')
+def download_report(job_id):
+    job = report_queue.job(job_id)
+    if job is None or job['status'] != 'done':
+        abort(404)
+    return send_file(os.path.abspath(report_queue.report_path(job['key'])), mimetype='application/pdf',
+                     as_attachment=True, download_name=f"{job['report_type']}.pdf")
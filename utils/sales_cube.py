@@ -0,0 +1,469 @@
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from utils.database_utils import database_fingerprint, pool, read_snapshot
+from utils.helpers import LRUCache, file_lock
+from utils.schema_adapter import get_adapter
+
+CUBE_SUFFIX = '.cube'                   # cube directory sits next to the database: <db>.cube/
+FETCH_SIZE = 50_000                     # joined rows per SQL batch
+MAX_CUBES = 16                          # opened cubes kept in memory
+MAX_CELLS = 250_000_000                 # about 2 GB on disk for the two item measures
+HOURS = 24
+FORMAT_VERSION = 1
+
+# Item measures span day x hour x store x category x payment method;
+# transaction measures have no category axis, since one basket spans several.
+ITEM_MEASURES = {'revenue': np.float32, 'quantity': np.int32}
+TRANSACTION_MEASURES = {'transactions': np.int32, 'amount': np.float32}
+AXES = ('day', 'hour', 'store_id', 'category', 'payment_method')
+PERIODS = ('day', 'week', 'month')
+
+
+def cube_dir(db_path):
+    return os.path.abspath(db_path) + CUBE_SUFFIX
+
+
+def _days(date_keys):
+    """YYYYMMDD integer keys to days since 1970-01-01, converting each distinct key once"""
+    keys, inverse = np.unique(np.asarray(date_keys, dtype=np.int64), return_inverse=True)
+    days = (pd.to_datetime(keys.astype(str), format='%Y%m%d').values
+            .astype('datetime64[D]').astype(np.int64))
+    return days[inverse]
+
+
+def _axis_order(values):
+    # Numbers sort numerically and strings alphabetically; NULL goes last
+    return sorted(set(values), key=lambda value: (value is None, isinstance(value, str), value or 0))
+
+
+def _codes(values, axis):
+    """Positions of values on an axis; values are already known to be on it"""
+    codes, uniques = pd.factorize(np.array(values, dtype=object), use_na_sentinel=False)
+    index = {value: i for i, value in enumerate(axis)}
+    return np.array([index[None if pd.isna(value) else value] for value in uniques], dtype=np.int64)[codes]
+
+
+def _accumulate(target, day, coords, weights):
+    """Add weights into target[day, *coords], touching only the cells the batch hits.
+
+    Totals are summed per distinct cell, so the work and memory scale with
+    the batch, not with the days it spans (a late row does not allocate
+    the whole window between it and the rest).
+    """
+    low, high = int(day.min()), int(day.max())
+    window = target[low:high + 1]
+    flat = np.ravel_multi_index((day - low,) + coords, window.shape)
+    cells, inverse = np.unique(flat, return_inverse=True)
+    totals = np.bincount(inverse, weights=weights, minlength=len(cells))
+    flat_window = window.reshape(-1)
+    flat_window[cells] += totals.astype(window.dtype)
+
+
+def _extend_npy(path, days):
+    """Grow a C-ordered .npy file by `days` zeroed rows on its first axis.
+
+    The shape in the header is rewritten in place and the file is extended
+    with zeros, so existing data is not copied unless the new header no
+    longer fits in the padding of the old one.
+    """
+    with open(path, 'r+b') as npy_file:
+        version = np.lib.format.read_magic(npy_file)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(npy_file)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(npy_file)
+        offset = npy_file.tell()
+        new_shape = (shape[0] + days,) + tuple(shape[1:])
+        header = repr({'descr': np.lib.format.dtype_to_descr(dtype),
+                       'fortran_order': fortran_order, 'shape': new_shape})
+        length_size = 2 if version == (1, 0) else 4
+        room = offset - 8 - length_size
+        if len(header) + 1 <= room:
+            npy_file.seek(8 + length_size)
+            npy_file.write((header.ljust(room - 1) + '\n').encode('latin1'))
+            npy_file.truncate(offset + int(np.prod(new_shape)) * dtype.itemsize)
+            return
+
+    old = np.load(path, mmap_mode='r')
+    grown = np.lib.format.open_memmap(path + '.tmp', mode='w+', dtype=old.dtype, shape=new_shape)
+    grown[:shape[0]] = old
+    grown.flush()
+    del grown, old
+    os.replace(path + '.tmp', path)
+
+
+class SalesCube:
+    """Dense, memory-mapped sales measures for one database.
+
+    revenue and quantity (item lines) have shape
+    (days, 24, stores, categories, payment methods); transactions and
+    amount (transaction totals) have shape (days, 24, stores, payment methods).
+    Days are a contiguous range from first_day, so a date range is a slice
+    of the first axis and appending days grows the files at their end.
+    """
+
+    def __init__(self, path, meta):
+        self.path = path
+        self.meta = meta
+        self.fingerprint = meta['fingerprint']
+        self.watermark = meta['watermark']
+        self.first_day = np.datetime64(meta['first_day'], 'D')
+        self.stores = meta['stores']
+        self.categories = meta['categories']
+        self.payment_methods = meta['payment_methods']
+        for name in list(ITEM_MEASURES) + list(TRANSACTION_MEASURES):
+            setattr(self, name, np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r'))
+
+    @property
+    def days(self):
+        return self.first_day + np.arange(self.meta['n_days'])
+
+    def _day_slice(self, start=None, end=None):
+        n_days = self.meta['n_days']
+        low = 0 if start is None else int((np.datetime64(start, 'D') - self.first_day).astype(np.int64))
+        high = n_days if end is None else int((np.datetime64(end, 'D') - self.first_day).astype(np.int64)) + 1
+        return slice(min(max(low, 0), n_days), min(max(high, 0), n_days))
+
+    @staticmethod
+    def _pick(axis, value):
+        """Index list for a filter value on an axis; an unknown value selects nothing"""
+        if value is None:
+            return slice(None)
+        values = value if isinstance(value, (list, tuple, set)) else [value]
+        return [axis.index(v) for v in values if v in axis]
+
+    def totals(self, by=('day',), start=None, end=None, store_id=None, category=None,
+               payment_method=None, hours=None):
+        """Measures summed over every axis not in `by`, as a DataFrame.
+
+        Filters take a value or a list of values; start and end are an
+        inclusive YYYY-MM-DD range. Transaction counts and amounts are only
+        included when neither grouping nor filtering is by category.
+        """
+        by = (by,) if isinstance(by, str) else tuple(by)
+        unknown = [axis for axis in by if axis not in AXES]
+        if unknown:
+            raise ValueError(f"cannot group by {', '.join(unknown)}; axes are {AXES}")
+        selection = {
+            'day': self._day_slice(start, end),
+            'hour': self._pick(list(range(HOURS)), hours),
+            'store_id': self._pick(self.stores, store_id),
+            'category': self._pick(self.categories, category),
+            'payment_method': self._pick(self.payment_methods, payment_method),
+        }
+        labels = {
+            'day': self.days[selection['day']],
+            'hour': np.arange(HOURS),
+            'store_id': np.array(self.stores, dtype=object),
+            'category': np.array(self.categories, dtype=object),
+            'payment_method': np.array(self.payment_methods, dtype=object),
+        }
+        for axis in AXES[1:]:
+            labels[axis] = labels[axis][selection[axis]]
+
+        with_transactions = 'category' not in by and category is None
+        measures = [(name, self._reduce(getattr(self, name), AXES, selection, by, dtype))
+                    for name, dtype in (('revenue', np.float64), ('quantity', np.int64))]
+        if with_transactions:
+            axes = tuple(axis for axis in AXES if axis != 'category')
+            measures += [(name, self._reduce(getattr(self, name), axes, selection, by, dtype))
+                         for name, dtype in (('transactions', np.int64), ('amount', np.float64))]
+
+        grid = np.meshgrid(*(labels[axis] for axis in by), indexing='ij') if by else []
+        frame = pd.DataFrame({axis: values.reshape(-1) for axis, values in zip(by, grid)})
+        for name, values in measures:
+            frame[name] = values.reshape(-1)
+        return frame
+
+    @staticmethod
+    def _reduce(array, axes, selection, by, dtype):
+        # Apply one fancy index at a time; a basic slice on the mmap stays a view
+        view = array[selection['day']]
+        for position, axis in enumerate(axes[1:], start=1):
+            index = selection[axis]
+            if not isinstance(index, slice):
+                view = np.take(view, index, axis=position)
+        summed = view.sum(axis=tuple(i for i, axis in enumerate(axes) if axis not in by), dtype=dtype)
+        kept = [axis for axis in axes if axis in by]
+        return np.transpose(summed, [kept.index(axis) for axis in by]) if by else np.asarray(summed)
+
+    def sales_trends(self, period='day', store_id=None, start=None, end=None):
+        """Revenue, transactions, items and average basket per day, week or month"""
+        days = self.totals(('day',), start, end, store_id)
+        if period == 'week':
+            days['day'] = days['day'].values - ((days['day'].values.astype('int64') + 3) % 7).astype('timedelta64[D]')
+        elif period == 'month':
+            days['day'] = days['day'].values.astype('datetime64[M]').astype('datetime64[D]')
+        elif period != 'day':
+            raise ValueError(f"period must be one of {PERIODS}")
+        grouped = days.groupby('day', sort=True)[['amount', 'transactions', 'quantity']].sum()
+        grouped = grouped[grouped['transactions'] > 0]
+        trends = pd.DataFrame({
+            'period': grouped.index.values,
+            'revenue': grouped['amount'].values,
+            'transactions': grouped['transactions'].values,
+            'items_sold': grouped['quantity'].values,
+        })
+        trends['avg_transaction_value'] = trends['revenue'] / trends['transactions']
+        return trends
+
+    def store_performance(self, start=None, end=None):
+        """Revenue, traffic and basket size per store (no unique-customer reach)"""
+        stores = self.totals(('store_id',), start, end)
+        stores = stores[stores['transactions'] > 0].rename(columns={'quantity': 'items_sold'})
+        stores = stores.assign(revenue=stores['amount'])[['store_id', 'revenue', 'transactions', 'items_sold']]
+        stores['avg_transaction_value'] = stores['revenue'] / stores['transactions']
+        stores['items_per_transaction'] = stores['items_sold'] / stores['transactions']
+        stores['revenue_share'] = stores['revenue'] / stores['revenue'].sum()
+        return stores.reset_index(drop=True)
+
+
+def _read_meta(path):
+    try:
+        with open(os.path.join(path, 'meta.json'), encoding='utf-8') as meta_file:
+            meta = json.load(meta_file)
+    except (OSError, ValueError):
+        return None
+    return meta if meta.get('version') == FORMAT_VERSION else None
+
+
+def _write_meta(path, meta):
+    tmp_path = os.path.join(path, 'meta.json.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as meta_file:
+        json.dump(meta, meta_file)
+    os.replace(tmp_path, os.path.join(path, 'meta.json'))
+
+
+def _distinct(conn, sql, params):
+    return [row[0] for row in conn.execute(sql, params)]
+
+
+def _shapes(n_days, meta):
+    item_shape = (n_days, HOURS, len(meta['stores']), len(meta['categories']), len(meta['payment_methods']))
+    return item_shape, item_shape[:3] + item_shape[4:]
+
+
+def _fill(conn, adapter, arrays, meta, after_id, max_id):
+    """Stream transactions after_id < id <= max_id into the arrays in one pass.
+
+    Each row is an item joined to its transaction, ordered by transaction
+    id; the transaction measures are taken from its first row (a basket
+    without items still has one), the item measures from every row whose
+    product is known. The arrays' first day is meta['first_day'].
+    """
+    first_day = np.datetime64(meta['first_day'], 'D').astype(np.int64)
+    stores, categories, payments = meta['stores'], meta['categories'], meta['payment_methods']
+
+    cursor = conn.execute(adapter.sql('cube_rows'), {'after_id': after_id, 'max_id': max_id})
+    previous_id = None
+    while True:
+        rows = cursor.fetchmany(FETCH_SIZE)
+        if not rows:
+            break
+        ids, date_keys, hour_keys, store_ids, payment, amount, product_ids, category, quantity, revenue = zip(*rows)
+        ids = np.array(ids, dtype=np.int64)
+        first = np.empty(len(ids), dtype=bool)
+        first[0] = ids[0] != previous_id
+        first[1:] = ids[1:] != ids[:-1]
+        previous_id = ids[-1]
+
+        day = _days(date_keys) - first_day
+        hours, store_codes = np.array(hour_keys, dtype=np.int64), _codes(store_ids, stores)
+        payment_codes = _codes(payment, payments)
+        coords = (hours[first], store_codes[first], payment_codes[first])
+        _accumulate(arrays['transactions'], day[first], coords, None)
+        _accumulate(arrays['amount'], day[first], coords,
+                    np.array([value or 0 for value in amount], dtype=np.float64)[first])
+
+        known = np.array([product_id is not None for product_id in product_ids])
+        if known.any():
+            coords = (hours[known], store_codes[known],
+                      _codes([value for value, ok in zip(category, known) if ok], categories),
+                      payment_codes[known])
+            _accumulate(arrays['revenue'], day[known], coords, np.array(revenue, dtype=np.float64)[known])
+            _accumulate(arrays['quantity'], day[known], coords, np.array(quantity, dtype=np.float64)[known])
+
+
+def _open_arrays(path, mode, shapes=None):
+    item_shape, transaction_shape = shapes or (None, None)
+    arrays = {}
+    for measures, shape in ((ITEM_MEASURES, item_shape), (TRANSACTION_MEASURES, transaction_shape)):
+        for name, dtype in measures.items():
+            file_path = os.path.join(path, f'{name}.npy')
+            if mode == 'w+':
+                arrays[name] = np.lib.format.open_memmap(file_path, mode='w+', dtype=dtype, shape=shape)
+            else:
+                arrays[name] = np.load(file_path, mmap_mode=mode)
+    return arrays
+
+
+def _flush(arrays):
+    for array in arrays.values():
+        array.flush()
+
+
+def _lock_path(db_path):
+    # Beside the cube directory rather than in it, since a rebuild swaps the directory
+    return cube_dir(db_path) + '.lock'
+
+
+def _build(db_path):
+    adapter = get_adapter(db_path)
+    path = cube_dir(db_path)
+    tmp_path = path + '.tmp'
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+
+    # Taken before the read: a commit in between is then folded in again by
+    # the next update instead of being labelled as already in the cube
+    fingerprint = database_fingerprint(db_path)
+    with pool.connection(db_path) as conn, read_snapshot(conn):
+        max_id = conn.execute(adapter.sql('transaction_range')).fetchone()[0]
+        bounds = {'after_id': -1, 'max_id': max_id}
+        first_key, last_key = conn.execute(adapter.sql('cube_dimensions'), bounds).fetchone()
+        meta = {
+            'version': FORMAT_VERSION,
+            'fingerprint': fingerprint,
+            'watermark': max_id,
+            'stores': _axis_order(_distinct(conn, adapter.sql('cube_stores'), bounds)),
+            'categories': _axis_order(_distinct(conn, adapter.sql('cube_categories'), {})),
+            'payment_methods': _axis_order(_distinct(conn, adapter.sql('cube_payment_methods'), bounds)),
+        }
+        if first_key is None:
+            meta['first_day'], n_days = '1970-01-01', 0
+        else:
+            first, last = _days([first_key, last_key])
+            meta['first_day'], n_days = str(np.datetime64(int(first), 'D')), int(last - first + 1)
+        meta['n_days'] = n_days
+        item_shape, transaction_shape = _shapes(n_days, meta)
+        if np.prod(item_shape) > MAX_CELLS:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            raise ValueError(f"sales cube of shape {item_shape} exceeds {MAX_CELLS:,} cells")
+        arrays = _open_arrays(tmp_path, 'w+', (item_shape, transaction_shape))
+        if n_days:
+            _fill(conn, adapter, arrays, meta, -1, max_id)
+        _flush(arrays)
+        del arrays
+
+    _write_meta(tmp_path, meta)
+    old_path = path + '.old'
+    shutil.rmtree(old_path, ignore_errors=True)
+    if os.path.exists(path):
+        os.rename(path, old_path)
+    os.rename(tmp_path, path)
+    shutil.rmtree(old_path, ignore_errors=True)
+    return SalesCube(path, meta)
+
+
+def _update(db_path):
+    path = cube_dir(db_path)
+    meta = _read_meta(path)
+    if meta is None or not meta.get('complete', True):
+        return _build(db_path)
+
+    adapter = get_adapter(db_path)
+    fingerprint = database_fingerprint(db_path)
+    with pool.connection(db_path) as conn, read_snapshot(conn):
+        max_id = conn.execute(adapter.sql('transaction_range')).fetchone()[0]
+        if max_id < meta['watermark']:
+            return _build(db_path)
+        bounds = {'after_id': meta['watermark'], 'max_id': max_id}
+        first_key, last_key = conn.execute(adapter.sql('cube_dimensions'), bounds).fetchone()
+        if first_key is not None:
+            stores = _distinct(conn, adapter.sql('cube_stores'), bounds)
+            payments = _distinct(conn, adapter.sql('cube_payment_methods'), bounds)
+            categories = _distinct(conn, adapter.sql('cube_categories'), {})
+            first_day = np.datetime64(meta['first_day'], 'D').astype(np.int64)
+            first, last = _days([first_key, last_key])
+            if (not set(stores) <= set(meta['stores']) or not set(payments) <= set(meta['payment_methods'])
+                    or not set(categories) <= set(meta['categories']) or first < first_day):
+                return _build(db_path)
+
+            n_days = max(meta['n_days'], int(last - first_day + 1))
+            item_shape, _ = _shapes(n_days, meta)
+            if np.prod(item_shape) > MAX_CELLS:
+                raise ValueError(f"sales cube of shape {item_shape} exceeds {MAX_CELLS:,} cells")
+            # Marked incomplete while the files are modified, so a crash means a rebuild
+            _write_meta(path, dict(meta, complete=False))
+            if n_days > meta['n_days']:
+                for name in list(ITEM_MEASURES) + list(TRANSACTION_MEASURES):
+                    _extend_npy(os.path.join(path, f'{name}.npy'), n_days - meta['n_days'])
+            meta['n_days'] = n_days
+            arrays = _open_arrays(path, 'r+')
+            _fill(conn, adapter, arrays, meta, meta['watermark'], max_id)
+            _flush(arrays)
+            del arrays
+        meta['watermark'] = max_id
+
+    meta['fingerprint'] = fingerprint
+    meta['complete'] = True
+    _write_meta(path, meta)
+    return SalesCube(path, meta)
+
+
+def build_cube(db_path):
+    """Build a database's cube from scratch in one pass over the sales tables.
+
+    The pass reads one snapshot of the database, and a lock file keeps
+    other threads and worker processes from building or updating the same
+    cube meanwhile.
+    """
+    with file_lock(_lock_path(db_path)):
+        return _build(db_path)
+
+
+def update_cube(db_path):
+    """Fold transactions added since the cube was built into it.
+
+    New days are appended to the end of the .npy files and late rows for
+    existing days are added in place. The cube is rebuilt instead when the
+    new rows bring a store, category or payment method it has no slot for,
+    fall before its first day, or the watermark is above the database's
+    highest transaction id (rows were deleted or the file replaced). Holds
+    the same lock as build_cube.
+    """
+    with file_lock(_lock_path(db_path)):
+        return _update(db_path)
+
+
+_cubes = LRUCache(MAX_CUBES)
+
+
+def get_cube(db_path):
+    """Sales cube for a database's current content, opened, updated or built on first use"""
+    fingerprint = database_fingerprint(db_path)
+    cube = _cubes.get(fingerprint)
+    if cube is not None:
+        return cube
+
+    path = cube_dir(db_path)
+    with file_lock(_lock_path(db_path)):
+        cube = _cubes.get(fingerprint)
+        if cube is None:
+            # Another worker may have brought the cube up to date while this one waited
+            meta = _read_meta(path)
+            if meta is not None and meta['fingerprint'] == fingerprint and meta.get('complete', True):
+                cube = SalesCube(path, meta)
+            else:
+                cube = _update(db_path)
+            _cubes.put(fingerprint, cube)
+    return cube
+
+
+if __name__ == '__main__':
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description='Build or update the sales cube next to a database')
+    parser.add_argument('db_path', help='SQLite database')
+    parser.add_argument('--rebuild', action='store_true', help='rebuild from scratch instead of updating')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    cube = build_cube(args.db_path) if args.rebuild else update_cube(args.db_path)
+    print(f"🧊 Cube {cube.revenue.shape} written to {cube.path} in {time.perf_counter() - start:.2f}s")
@@ -0,0 +1,467 @@
+import json
+import os
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+
+from utils.database_utils import database_fingerprint, pool, read_snapshot
+from utils.helpers import LRUCache, file_lock
+from utils.schema_adapter import get_adapter
+
+SAMPLE_SUFFIX = '.sample.npz'           # sample file sits next to the database: <db>.sample.npz
+FETCH_SIZE = 50_000                     # transaction rows per SQL batch
+ID_CHUNK = 5_000                        # sampled transaction ids per item query
+MAX_SAMPLES = 8                         # opened samples kept in memory
+PER_STRATUM = 400                       # transactions kept per (store, month)
+CONFIDENCE = 0.95
+FORMAT_VERSION = 2
+PERIODS = ('day', 'week', 'month')
+
+
+def sample_path(db_path):
+    return os.path.abspath(db_path) + SAMPLE_SUFFIX
+
+
+def _keys(ids):
+    """Uniform [0, 1) sampling key per transaction id (splitmix64).
+
+    Keeping the rows with the smallest keys makes each stratum a uniform
+    sample that does not depend on the order rows are read in, so a
+    topped-up sample equals one built from scratch.
+    """
+    x = np.asarray(ids, dtype=np.int64).astype(np.uint64) + np.uint64(0x9E3779B97F4A7C15)
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    x = x ^ (x >> np.uint64(31))
+    return (x >> np.uint64(11)).astype(np.float64) * 2.0 ** -53
+
+
+def _stratum_codes(store_ids, date_keys):
+    # store_id * 10^6 + YYYYMM; stores without an id are -1
+    return np.asarray(store_ids, dtype=np.int64) * 1_000_000 + np.asarray(date_keys, dtype=np.int64) // 100
+
+
+def _days(date_keys):
+    """YYYYMMDD integer keys to datetime64[D]"""
+    keys = np.asarray(date_keys, dtype=np.int64)
+    months = ((keys // 10000 - 1970) * 12 + keys // 100 % 100 - 1).astype('datetime64[M]')
+    return months.astype('datetime64[D]') + (keys % 100 - 1).astype('timedelta64[D]')
+
+
+def _period(days, period):
+    if period == 'day':
+        return days
+    if period == 'week':
+        # Weeks start on Monday; 1970-01-01 was a Thursday
+        return days - ((days.astype('int64') + 3) % 7).astype('timedelta64[D]')
+    if period == 'month':
+        return days.astype('datetime64[M]').astype('datetime64[D]')
+    raise ValueError(f"period must be one of {PERIODS}")
+
+
+class Reservoir:
+    """Bottom-k reservoir per stratum, filled one batch of transactions at a time.
+
+    Each stratum keeps the `per_stratum` rows with the smallest sampling
+    keys and counts every row it has seen, which is what the estimator
+    scales by. Rows whose key is above their stratum's current threshold
+    are dropped before any sorting.
+    """
+
+    def __init__(self, per_stratum=PER_STRATUM, strata=None, population=None, rows=None):
+        self.per_stratum = per_stratum
+        self.strata = np.empty(0, dtype=np.int64) if strata is None else strata         # sorted codes
+        self.population = np.empty(0, dtype=np.int64) if population is None else population
+        self.rows = rows if rows is not None else {
+            'id': np.empty(0, dtype=np.int64), 'code': np.empty(0, dtype=np.int64),
+            'key': np.empty(0, dtype=np.float64), 'date_key': np.empty(0, dtype=np.int64),
+            'total_amount': np.empty(0, dtype=np.float64),
+        }
+        self._thresholds()
+
+    def _thresholds(self):
+        """Largest kept key of every full stratum; rows above it cannot get in"""
+        self.threshold = np.full(len(self.strata), np.inf)
+        if not len(self.rows['id']):
+            return
+        position = np.searchsorted(self.strata, self.rows['code'])
+        kept = np.bincount(position, minlength=len(self.strata))
+        largest = np.full(len(self.strata), -np.inf)
+        np.maximum.at(largest, position, self.rows['key'])
+        full = kept >= self.per_stratum
+        self.threshold[full] = largest[full]
+
+    def add(self, ids, store_ids, date_keys, amounts):
+        codes = _stratum_codes(store_ids, date_keys)
+        uniques, counts = np.unique(codes, return_counts=True)
+        strata = np.union1d(self.strata, uniques)
+        if len(strata) != len(self.strata):
+            population = np.zeros(len(strata), dtype=np.int64)
+            population[np.searchsorted(strata, self.strata)] = self.population
+            threshold = np.full(len(strata), np.inf)
+            threshold[np.searchsorted(strata, self.strata)] = self.threshold
+            self.strata, self.population, self.threshold = strata, population, threshold
+        self.population[np.searchsorted(self.strata, uniques)] += counts
+
+        keys = _keys(ids)
+        candidates = keys < self.threshold[np.searchsorted(self.strata, codes)]
+        if not candidates.any():
+            return
+        batch = {'id': np.asarray(ids, dtype=np.int64)[candidates], 'code': codes[candidates],
+                 'key': keys[candidates], 'date_key': np.asarray(date_keys, dtype=np.int64)[candidates],
+                 'total_amount': np.asarray(amounts, dtype=np.float64)[candidates]}
+        rows = {name: np.concatenate([self.rows[name], batch[name]]) for name in self.rows}
+        order = np.lexsort((rows['key'], rows['code']))
+        codes = rows['code'][order]
+        first = np.searchsorted(codes, codes)           # first row of each row's stratum
+        keep = order[np.arange(len(order)) - first < self.per_stratum]
+        self.rows = {name: values[keep] for name, values in rows.items()}
+        self._thresholds()
+
+
+class TransactionSample:
+    """A stratified sample of transactions and their items, with estimators.
+
+    Strata are (store, month). A total over any filter or grouping is the
+    sum over strata of population / sampled times the sampled total, with
+    a normal-approximation confidence interval from the within-stratum
+    variance (zero for strata that are kept whole). Averages are ratio
+    estimates with linearized variance.
+    """
+
+    def __init__(self, reservoir, items, categories, watermark, fingerprint=None, checksum=None):
+        self.reservoir = reservoir
+        self.watermark = watermark
+        self.fingerprint = fingerprint
+        self.checksum = checksum
+        self.categories = categories
+        rows = reservoir.rows
+        order = np.argsort(rows['id'], kind='stable')
+        self.ids = rows['id'][order]
+        self.stratum = np.searchsorted(reservoir.strata, rows['code'][order])
+        self.store_ids = rows['code'][order] // 1_000_000
+        self.days = _days(rows['date_key'][order])
+        self.amounts = rows['total_amount'][order]
+        self.items = items
+        self.item_position = np.searchsorted(self.ids, items['transaction_id'])
+        self.sampled = np.bincount(self.stratum, minlength=len(reservoir.strata))
+
+    @property
+    def population(self):
+        return self.reservoir.population
+
+    def _select(self, store_id=None, start=None, end=None):
+        mask = np.ones(len(self.ids), dtype=bool)
+        if store_id is not None:
+            mask &= self.store_ids == store_id
+        if start is not None:
+            mask &= self.days >= np.datetime64(start, 'D')
+        if end is not None:
+            mask &= self.days <= np.datetime64(end, 'D')
+        return mask
+
+    def _estimate(self, stratum, group, values, n_groups):
+        """Estimated totals per group and their variances.
+
+        Rows are (stratum, group, value) with at most one row per sampled
+        transaction and group; transactions without a row count as zero.
+        """
+        n_strata = len(self.population)
+        cell = stratum * n_groups + group
+        s1 = np.bincount(cell, weights=values, minlength=n_strata * n_groups).reshape(n_strata, n_groups)
+        s2 = np.bincount(cell, weights=values * values, minlength=n_strata * n_groups).reshape(n_strata, n_groups)
+        n = self.sampled.astype(np.float64)[:, None]
+        big_n = self.population.astype(np.float64)[:, None]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            totals = np.where(n > 0, big_n / n * s1, 0.0).sum(axis=0)
+            spread = np.where(n > 1, (s2 - s1 * s1 / n) / (n - 1), 0.0)
+            variances = np.where(n > 0, big_n * big_n * (1 - n / big_n) * spread / n, 0.0).sum(axis=0)
+        return totals, np.maximum(variances, 0.0)
+
+    def _ratio_variance(self, stratum, group, numerator, ratio, denominator, n_groups):
+        """Linearized variance of numerator/denominator totals, per-transaction denominator of 1"""
+        _, variances = self._estimate(stratum, group, numerator - ratio[group], n_groups)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return variances / (denominator * denominator)
+
+    def sales_trends(self, period='day', store_id=None, start=None, end=None, confidence=CONFIDENCE):
+        """Estimated revenue, transactions, items and average basket per period, with margins"""
+        mask = self._select(store_id, start, end)
+        periods, group = np.unique(_period(self.days[mask], period), return_inverse=True)
+        stratum = self.stratum[mask]
+        quantity = np.bincount(self.item_position, weights=self.items['quantity'], minlength=len(self.ids))[mask]
+
+        z = NormalDist().inv_cdf((1 + confidence) / 2)
+        revenue, revenue_var = self._estimate(stratum, group, self.amounts[mask], len(periods))
+        transactions, transactions_var = self._estimate(stratum, group, np.ones(len(group)), len(periods))
+        items_sold, items_var = self._estimate(stratum, group, quantity, len(periods))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            average = revenue / transactions
+        average_var = self._ratio_variance(stratum, group, self.amounts[mask], average, transactions, len(periods))
+
+        trends = pd.DataFrame({
+            'period': periods,
+            'sampled': np.bincount(group, minlength=len(periods)),
+            'revenue': revenue,
+            'revenue_margin': z * np.sqrt(revenue_var),
+            'transactions': transactions,
+            'transactions_margin': z * np.sqrt(transactions_var),
+            'items_sold': items_sold,
+            'items_sold_margin': z * np.sqrt(items_var),
+            'avg_transaction_value': average,
+            'avg_transaction_value_margin': z * np.sqrt(average_var),
+        })
+        trends.attrs['sample'] = self._summary(mask, confidence)
+        return trends
+
+    def category_revenue(self, store_id=None, start=None, end=None, confidence=CONFIDENCE):
+        """Estimated revenue, items sold and revenue share per category, with margins"""
+        mask = self._select(store_id, start, end)
+        selected = mask[self.item_position]
+        positions = self.item_position[selected]
+        n_categories = len(self.categories)
+        # One row per sampled transaction and category it bought from
+        cells, inverse = np.unique(positions * n_categories + self.items['category'][selected], return_inverse=True)
+        revenue_rows = np.bincount(inverse, weights=self.items['revenue'][selected], minlength=len(cells))
+        quantity_rows = np.bincount(inverse, weights=self.items['quantity'][selected], minlength=len(cells))
+        stratum = self.stratum[cells // n_categories]
+        group = cells % n_categories
+
+        z = NormalDist().inv_cdf((1 + confidence) / 2)
+        revenue, revenue_var = self._estimate(stratum, group, revenue_rows, n_categories)
+        items_sold, items_var = self._estimate(stratum, group, quantity_rows, n_categories)
+        categories = pd.DataFrame({
+            'category': np.asarray(self.categories, dtype=object),
+            'sampled': np.bincount(group, minlength=n_categories),
+            'revenue': revenue,
+            'revenue_margin': z * np.sqrt(revenue_var),
+            'items_sold': items_sold,
+            'items_sold_margin': z * np.sqrt(items_var),
+        })
+        categories = categories[categories['sampled'] > 0]
+        categories['revenue_share'] = categories['revenue'] / categories['revenue'].sum()
+        categories = categories.sort_values('revenue', ascending=False).reset_index(drop=True)
+        categories.attrs['sample'] = self._summary(mask, confidence)
+        return categories
+
+    def _summary(self, mask, confidence):
+        strata = np.unique(self.stratum[mask])
+        return {
+            'confidence': confidence,
+            'sampled_transactions': int(mask.sum()),
+            'strata': len(strata),
+            'population': int(self.population[strata].sum()),
+            'per_stratum': self.reservoir.per_stratum,
+        }
+
+    def save(self, path):
+        rows = self.reservoir.rows
+        tmp_path = path + '.tmp.npz'
+        np.savez(tmp_path,
+                 meta=np.array(json.dumps({'version': FORMAT_VERSION, 'per_stratum': self.reservoir.per_stratum,
+                                           'watermark': self.watermark, 'fingerprint': self.fingerprint,
+                                           'checksum': self.checksum})),
+                 strata=self.reservoir.strata, population=self.reservoir.population,
+                 categories=np.array(self.categories, dtype=str),
+                 **{f'tx_{name}': values for name, values in rows.items()},
+                 **{f'item_{name}': values for name, values in self.items.items()})
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """A saved sample, or None when it is missing or from another format version"""
+        try:
+            with np.load(path) as arrays:
+                data = {name: arrays[name] for name in arrays.files}
+        except (OSError, ValueError):
+            return None
+        meta = json.loads(str(data['meta']))
+        if meta.get('version') != FORMAT_VERSION:
+            return None
+        rows = {name[3:]: values for name, values in data.items() if name.startswith('tx_')}
+        items = {name[5:]: values for name, values in data.items() if name.startswith('item_')}
+        reservoir = Reservoir(meta['per_stratum'], data['strata'], data['population'], rows)
+        return cls(reservoir, items, data['categories'].tolist(), meta['watermark'], meta['fingerprint'],
+                   meta['checksum'])
+
+
+def _fetch_items(conn, adapter, ids, categories):
+    """Items of the given sampled transactions (sorted ids); category codes index into categories.
+
+    The ids are sent ID_CHUNK at a time, each chunk also bounded by its
+    first and last id so the item lookup is a range search, which keeps
+    every bound parameter small whatever the sample size.
+    """
+    items = {'transaction_id': [], 'category': [], 'quantity': [], 'revenue': []}
+    index = {name: i for i, name in enumerate(categories)}
+    for start in range(0, len(ids), ID_CHUNK):
+        chunk = ids[start:start + ID_CHUNK]
+        cursor = conn.execute(adapter.sql('sample_items'), {'first_id': int(chunk[0]), 'last_id': int(chunk[-1]),
+                                                            'ids': json.dumps(chunk.tolist())})
+        while True:
+            rows = cursor.fetchmany(FETCH_SIZE)
+            if not rows:
+                break
+            transaction_ids, names, quantity, revenue = zip(*rows)
+            for name in names:
+                if name not in index:
+                    index[name] = len(categories)
+                    categories.append(name)
+            items['transaction_id'].append(np.array(transaction_ids, dtype=np.int64))
+            items['category'].append(np.array([index[name] for name in names], dtype=np.int32))
+            items['quantity'].append(np.array(quantity, dtype=np.float64))
+            items['revenue'].append(np.array(revenue, dtype=np.float64))
+    dtypes = {'transaction_id': np.int64, 'category': np.int32, 'quantity': np.float64, 'revenue': np.float64}
+    return {name: np.concatenate(parts) if parts else np.empty(0, dtype=dtypes[name])
+            for name, parts in items.items()}
+
+
+def _stream(conn, adapter, reservoir, after_id, max_id):
+    cursor = conn.execute(adapter.sql('sample_transactions'), {'after_id': after_id, 'max_id': max_id})
+    while True:
+        rows = cursor.fetchmany(FETCH_SIZE)
+        if not rows:
+            break
+        ids, store_ids, date_keys, amounts = zip(*rows)
+        reservoir.add(ids, store_ids, date_keys, amounts)
+
+
+def _checksum(conn, adapter, after_id, max_id):
+    """Integer sums over the transactions after_id < id <= max_id and their items.
+
+    The sums are exact, so the checksum of a range is the sum of the
+    checksums of its parts; an UPDATE or DELETE below the watermark
+    changes the checksum of the rows the sample was built from.
+    """
+    bounds = {'after_id': after_id, 'max_id': max_id}
+    return (list(conn.execute(adapter.sql('sample_transactions_checksum'), bounds).fetchone())
+            + list(conn.execute(adapter.sql('sample_items_checksum'), bounds).fetchone()))
+
+
+def _build(db_path, per_stratum):
+    adapter = get_adapter(db_path)
+    reservoir = Reservoir(per_stratum)
+    categories = []
+    fingerprint = database_fingerprint(db_path)
+    with pool.connection(db_path) as conn, read_snapshot(conn):
+        max_id = conn.execute(adapter.sql('transaction_range')).fetchone()[0]
+        _stream(conn, adapter, reservoir, -1, max_id)
+        items = _fetch_items(conn, adapter, np.sort(reservoir.rows['id']), categories)
+        checksum = _checksum(conn, adapter, -1, max_id)
+    sample = TransactionSample(reservoir, items, categories, max_id, fingerprint, checksum)
+    sample.save(sample_path(db_path))
+    return sample
+
+
+def _update(db_path, per_stratum):
+    sample = TransactionSample.load(sample_path(db_path))
+    if sample is None or sample.reservoir.per_stratum != per_stratum:
+        return _build(db_path, per_stratum)
+
+    adapter = get_adapter(db_path)
+    reservoir = sample.reservoir
+    categories = list(sample.categories)
+    fingerprint = database_fingerprint(db_path)
+    with pool.connection(db_path) as conn, read_snapshot(conn):
+        max_id = conn.execute(adapter.sql('transaction_range')).fetchone()[0]
+        appended = (max_id >= sample.watermark
+                    and _checksum(conn, adapter, -1, sample.watermark) == sample.checksum)
+        if appended and max_id > sample.watermark:
+            _stream(conn, adapter, reservoir, sample.watermark, max_id)
+            new_ids = np.sort(reservoir.rows['id'][reservoir.rows['id'] > sample.watermark])
+            new_items = _fetch_items(conn, adapter, new_ids, categories)
+            added = _checksum(conn, adapter, sample.watermark, max_id)
+    if not appended:
+        return _build(db_path, per_stratum)
+    if max_id > sample.watermark:
+        kept = np.isin(sample.items['transaction_id'], reservoir.rows['id'])
+        items = {name: np.concatenate([values[kept], new_items[name]]) for name, values in sample.items.items()}
+        checksum = [old + new for old, new in zip(sample.checksum, added)]
+    else:
+        items, checksum = sample.items, sample.checksum
+    sample = TransactionSample(reservoir, items, categories, max_id, fingerprint, checksum)
+    sample.save(sample_path(db_path))
+    return sample
+
+
+def _lock_path(db_path):
+    return sample_path(db_path) + '.lock'
+
+
+def build_sample(db_path, per_stratum=PER_STRATUM):
+    """Sample a database's transactions in one streaming pass, fetch their items and save.
+
+    The pass and the item lookups read one snapshot of the database, up
+    to the highest transaction id at its start.
+    """
+    with file_lock(_lock_path(db_path)):
+        return _build(db_path, per_stratum)
+
+
+def update_sample(db_path, per_stratum=PER_STRATUM):
+    """Top up a saved sample with the transactions added since it was built.
+
+    New rows go through the same reservoirs: they join their stratum if
+    their key is small enough, displacing rows (and those rows' items)
+    with larger keys. The sample is rebuilt instead when there is none,
+    it was built with another per_stratum, or the rows up to the watermark
+    are no longer the ones it was built from (rows updated or deleted, or
+    the file replaced), as told by their checksum.
+    """
+    with file_lock(_lock_path(db_path)):
+        return _update(db_path, per_stratum)
+
+
+_samples = LRUCache(MAX_SAMPLES)
+
+
+def get_sample(db_path):
+    """Sample for a database's current content, loaded, topped up or built on first use"""
+    fingerprint = database_fingerprint(db_path)
+    sample = _samples.get(fingerprint)
+    if sample is not None:
+        return sample
+
+    path = sample_path(db_path)
+    with file_lock(_lock_path(db_path)):
+        sample = _samples.get(fingerprint)
+        if sample is None:
+            sample = TransactionSample.load(path)
+            if sample is None or sample.fingerprint != fingerprint:
+                sample = _update(db_path, PER_STRATUM)
+            _samples.put(fingerprint, sample)
+    return sample
+
+
+def sales_trends(db_path, period='day', store_id=None, start=None, end=None, approximate=True):
+    """Sales trends estimated from the sample, or exact from the analytics when approximate is False"""
+    if not approximate:
+        from utils.analytics import sales_trends as exact_sales_trends
+        return exact_sales_trends(db_path, period=period, store_id=store_id, start=start, end=end)
+    return get_sample(db_path).sales_trends(period, store_id, start, end)
+
+
+def category_revenue(db_path, store_id=None, start=None, end=None, approximate=True):
+    """Revenue per category estimated from the sample, or exact when approximate is False"""
+    if not approximate:
+        from utils.analytics import category_revenue as exact_category_revenue
+        return exact_category_revenue(db_path, store_id=store_id, start=start, end=end)
+    return get_sample(db_path).category_revenue(store_id, start, end)
+
+
+if __name__ == '__main__':
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description='Build or top up the stratified transaction sample of a database')
+    parser.add_argument('db_path', help='SQLite database')
+    parser.add_argument('--per-stratum', type=int, default=PER_STRATUM, help='transactions kept per store and month')
+    parser.add_argument('--rebuild', action='store_true', help='rebuild from scratch instead of topping up')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    build = build_sample if args.rebuild else update_sample
+    sample = build(args.db_path, args.per_stratum)
+    print(f"🎲 Sampled {len(sample.ids):,} of {int(sample.population.sum()):,} transactions "
+          f"({len(sample.population):,} strata) into {sample_path(args.db_path)} in {time.perf_counter() - start:.2f}s")
@@ -0,0 +1,285 @@
+import hashlib
+import threading
+
+from utils.database_utils import database_fingerprint, pool
+from utils.helpers import LRUCache
+
+MAX_DATABASES = 1024                    # database fingerprint -> adapter entries kept
+
+
+class SchemaError(ValueError):
+    """Raised when a database cannot be mapped to the logical model"""
+
+
+# Logical model used by the analytics. Each logical table has a fixed alias
+# and maps logical columns to (physical column, fallback expression). A
+# missing column without a fallback makes the database unusable. The
+# fallbacks cover the differences between the init_db.py layout
+# (transactions / transaction_items with surrogate item ids and discount)
+# and the create_picknpay_db.py layout (Transactions / Transaction_Items
+# keyed by (transaction_id, product_id), no discount).
+LOGICAL_MODEL = {
+    'transactions': ('Transactions', 't', {
+        'id': ('id', None),
+        'customer_id': ('customer_id', None),
+        'timestamp': ('timestamp', None),
+        'total_amount': ('total_amount', None),
+        'payment_method': ('payment_method', 'NULL'),
+        'store_id': ('store_id', '1'),
+        'date_key': ('date_key', "CAST(strftime('%Y%m%d', {alias}.timestamp) AS INTEGER)"),
+        'hour_key': ('hour_key', "CAST(strftime('%H', {alias}.timestamp) AS INTEGER)"),
+    }),
+    'items': ('Transaction_Items', 'ti', {
+        'id': ('id', '{alias}.rowid'),
+        'transaction_id': ('transaction_id', None),
+        'product_id': ('product_id', None),
+        'quantity': ('quantity', None),
+        'unit_price': ('unit_price', None),
+        'discount': ('discount', '0'),
+    }),
+    'products': ('Products', 'p', {
+        'id': ('id', None),
+        'name': ('name', None),
+        'category': ('category', None),
+        'price': ('price', None),
+    }),
+    'customers': ('Customers', 'c', {
+        'id': ('id', None),
+        'name': ('name', None),
+        'location': ('location', 'NULL'),
+        'loyalty_tier': ('loyalty_tier', 'NULL'),
+    }),
+}
+
+# Every analytics query, written against the logical model: {transactions}
+# is the physical table and {t.date_key} the expression for a column.
+QUERY_TEMPLATES = {
+    'load_transactions': '''
+        SELECT {t.id} AS id, {t.customer_id} AS customer_id, {t.store_id} AS store_id,
+               {t.payment_method} AS payment_method, {t.total_amount} AS total_amount,
+               {t.date_key} AS date_key, {t.hour_key} AS hour_key
+        FROM {transactions} t ORDER BY {t.id}''',
+    'load_items': '''
+        SELECT {ti.transaction_id} AS transaction_id, {ti.product_id} AS product_id,
+               {ti.quantity} AS quantity, {ti.unit_price} AS unit_price
+        FROM {items} ti''',
+    'load_products': '''
+        SELECT {p.id} AS id, {p.name} AS name, {p.category} AS category, {p.price} AS price
+        FROM {products} p''',
+    'load_customers': '''
+        SELECT {c.id} AS id, {c.name} AS name, {c.location} AS location, {c.loyalty_tier} AS loyalty_tier
+        FROM {customers} c''',
+    'daily_store_sales': '''
+        SELECT {t.date_key} AS date_key, {t.store_id} AS store_id,
+               COUNT(*) AS transactions, SUM({t.total_amount}) AS revenue
+        FROM {transactions} t
+        WHERE {t.date_key} BETWEEN :start AND :end
+        GROUP BY 1, 2''',
+    'product_sales': '''
+        SELECT {ti.product_id} AS product_id, SUM({ti.quantity}) AS quantity,
+               SUM({ti.quantity} * {ti.unit_price}) AS revenue, COUNT(*) AS transactions
+        FROM {transactions} t
+        JOIN {items} ti ON {ti.transaction_id} = {t.id}
+        WHERE {t.date_key} BETWEEN :start AND :end
+        GROUP BY 1''',
+    'customer_summary': '''
+        SELECT {t.customer_id} AS customer_id, COUNT(*) AS frequency,
+               SUM({t.total_amount}) AS monetary, MAX({t.date_key}) AS last_date_key
+        FROM {transactions} t
+        WHERE {t.date_key} BETWEEN :start AND :end AND {t.customer_id} IS NOT NULL
+        GROUP BY 1''',
+    'store_performance': '''
+        SELECT {t.store_id} AS store_id, COUNT(*) AS transactions,
+               SUM({t.total_amount}) AS revenue, COUNT(DISTINCT {t.customer_id}) AS unique_customers
+        FROM {transactions} t
+        WHERE {t.date_key} BETWEEN :start AND :end
+        GROUP BY 1''',
+    'monthly_sales': '''
+        SELECT {t.date_key} / 100 AS month_key, {t.store_id} AS store_id,
+               COUNT(*) AS transactions, SUM({t.total_amount}) AS revenue,
+               MIN({t.total_amount}) AS min_amount, MAX({t.total_amount}) AS max_amount,
+               COUNT(DISTINCT {t.customer_id}) AS unique_customers
+        FROM {transactions} t
+        WHERE {t.date_key} BETWEEN :start AND :end
+        GROUP BY 1, 2''',
+    'cube_dimensions': '''
+        SELECT MIN({t.date_key}) AS first_date_key, MAX({t.date_key}) AS last_date_key
+        FROM {transactions} t
+        WHERE {t.id} > :after_id AND {t.id} <= :max_id''',
+    'cube_stores': '''
+        SELECT DISTINCT {t.store_id} FROM {transactions} t WHERE {t.id} > :after_id AND {t.id} <= :max_id''',
+    'cube_payment_methods': '''
+        SELECT DISTINCT {t.payment_method} FROM {transactions} t WHERE {t.id} > :after_id AND {t.id} <= :max_id''',
+    'cube_categories': '''
+        SELECT DISTINCT {p.category} FROM {products} p''',
+    'cube_rows': '''
+        SELECT {t.id} AS id, {t.date_key} AS date_key, {t.hour_key} AS hour_key, {t.store_id} AS store_id,
+               {t.payment_method} AS payment_method, {t.total_amount} AS total_amount,
+               {p.id} AS product_id, {p.category} AS category,
+               {ti.quantity} AS quantity, {ti.quantity} * {ti.unit_price} AS revenue
+        FROM {transactions} t
+        LEFT JOIN {items} ti ON {ti.transaction_id} = {t.id}
+        LEFT JOIN {products} p ON {p.id} = {ti.product_id}
+        WHERE {t.id} > :after_id AND {t.id} <= :max_id
+        ORDER BY {t.id}''',
+    'sketch_items': '''
+        SELECT {t.store_id} AS store_id, {t.date_key} / 100 AS month_key, {ti.product_id} AS product_id,
+               {ti.quantity} AS quantity, {ti.quantity} * {ti.unit_price} AS revenue
+        FROM {items} ti
+        JOIN {transactions} t ON {t.id} = {ti.transaction_id}''',
+    'sample_transactions': '''
+        SELECT {t.id} AS id, COALESCE({t.store_id}, -1) AS store_id, {t.date_key} AS date_key,
+               {t.total_amount} AS total_amount
+        FROM {transactions} t
+        WHERE {t.id} > :after_id AND {t.id} <= :max_id''',
+    'sample_transactions_checksum': '''
+        SELECT COUNT(*), COALESCE(SUM({t.id}), 0), COALESCE(SUM(COALESCE({t.store_id}, -1)), 0),
+               COALESCE(SUM({t.date_key}), 0), COALESCE(SUM(CAST(ROUND({t.total_amount} * 100) AS INTEGER)), 0)
+        FROM {transactions} t
+        WHERE {t.id} > :after_id AND {t.id} <= :max_id''',
+    'sample_items_checksum': '''
+        SELECT COUNT(*), COALESCE(SUM({ti.product_id}), 0), COALESCE(SUM(CAST(ROUND({ti.quantity} * 100) AS INTEGER)), 0),
+               COALESCE(SUM(CAST(ROUND({ti.quantity} * {ti.unit_price} * 100) AS INTEGER)), 0)
+        FROM {items} ti
+        WHERE {ti.transaction_id} > :after_id AND {ti.transaction_id} <= :max_id''',
+    'sample_items': '''
+        SELECT {ti.transaction_id} AS transaction_id, {p.category} AS category,
+               {ti.quantity} AS quantity, {ti.quantity} * {ti.unit_price} AS revenue
+        FROM {items} ti
+        JOIN {products} p ON {p.id} = {ti.product_id}
+        WHERE {ti.transaction_id} BETWEEN :first_id AND :last_id
+          AND {ti.transaction_id} IN (SELECT value FROM json_each(:ids))''',
+    'transaction_range': '''
+        SELECT COALESCE(MAX({t.id}), 0) AS max_id, MAX({t.date_key}) AS max_date_key
+        FROM {transactions} t''',
+    'rfm_features': '''
+        SELECT {t.customer_id} AS customer_id, MAX({t.date_key}) AS last_date_key,
+               COUNT(*) AS frequency, SUM({t.total_amount}) AS monetary,
+               {c.loyalty_tier} AS loyalty_tier, {c.location} AS location
+        FROM {transactions} t
+        LEFT JOIN {customers} c ON {c.id} = {t.customer_id}
+        WHERE {t.customer_id} IS NOT NULL
+        GROUP BY {t.customer_id}''',
+    'rfm_features_since': '''
+        SELECT {t.customer_id} AS customer_id, MAX({t.date_key}) AS last_date_key,
+               COUNT(*) AS frequency, SUM({t.total_amount}) AS monetary,
+               {c.loyalty_tier} AS loyalty_tier, {c.location} AS location
+        FROM {transactions} t
+        LEFT JOIN {customers} c ON {c.id} = {t.customer_id}
+        WHERE {t.customer_id} IN (SELECT r.customer_id FROM {transactions} r WHERE r.id > :after_id)
+        GROUP BY {t.customer_id}''',
+}
+
+
+class _Columns:
+    """Attribute access to column expressions, for str.format templates"""
+
+    def __init__(self, expressions):
+        self.__dict__.update(expressions)
+
+
+def _table_info(conn, table):
+    return [(row[1].lower(), row[2].upper(), row[5]) for row in conn.execute(f'PRAGMA table_info({table})')]
+
+
+def schema_fingerprint(conn):
+    """Hash of the physical layout of the tables in the logical model.
+
+    Columns, declared types and primary keys take part, row data does not,
+    so every database produced by the same tool shares one fingerprint.
+    """
+    digest = hashlib.blake2b(digest_size=8)
+    for logical, (table, _, _) in sorted(LOGICAL_MODEL.items()):
+        name = conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = ? COLLATE NOCASE",
+                            (table,)).fetchone()
+        digest.update(repr((logical, name[0] if name else None,
+                            _table_info(conn, table) if name else None)).encode())
+    return digest.hexdigest()
+
+
+class SchemaAdapter:
+    """A database layout mapped to the logical model, with its compiled queries.
+
+    Built once per schema fingerprint; `queries` holds the final SQL text
+    for every template, so using it involves no introspection or string
+    building. Identical SQL text also lets each pooled connection reuse
+    its prepared statement.
+    """
+
+    def __init__(self, conn, fingerprint=None):
+        self.fingerprint = fingerprint or schema_fingerprint(conn)
+        self.tables = {}
+        self.columns = {}
+        self.missing = {}
+        params = {}
+        for logical, (table, alias, columns) in LOGICAL_MODEL.items():
+            row = conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = ? COLLATE NOCASE",
+                               (table,)).fetchone()
+            if row is None:
+                raise SchemaError(f"Missing table: {table}")
+            physical = {name for name, _, _ in _table_info(conn, row[0])}
+            expressions = {}
+            for name, (column, fallback) in columns.items():
+                if column in physical:
+                    expressions[name] = f'{alias}.{column}'
+                elif fallback is not None:
+                    expressions[name] = fallback.format(alias=alias)
+                    self.missing.setdefault(logical, []).append(name)
+                else:
+                    raise SchemaError(f"Table {row[0]} is missing column: {column}")
+            self.tables[logical] = row[0]
+            self.columns[logical] = expressions
+            params[logical] = row[0]
+            params[alias] = _Columns(expressions)
+        self.queries = {name: ' '.join(template.split()).format(**params)
+                        for name, template in QUERY_TEMPLATES.items()}
+
+    @property
+    def layout(self):
+        """Which generator's layout this is, for reporting"""
+        if not self.missing:
+            return 'init_db'
+        if self.missing == {'items': ['id', 'discount']}:
+            return 'create_picknpay_db'
+        return 'other'
+
+    def has_column(self, table, column):
+        return column not in self.missing.get(table, ())
+
+    def sql(self, name):
+        return self.queries[name]
+
+
+_adapters = {}                          # schema fingerprint -> SchemaAdapter
+_adapters_lock = threading.Lock()
+_databases = LRUCache(MAX_DATABASES)    # database fingerprint -> SchemaAdapter
+
+
+def get_adapter(db_path):
+    """Adapter for a database, introspecting it only the first time it is seen.
+
+    Lookups go through the database's content fingerprint (cached by size
+    and mtime), and databases with the same layout share one adapter.
+    """
+    fingerprint = database_fingerprint(db_path)
+    adapter = _databases.get(fingerprint)
+    if adapter is not None:
+        return adapter
+
+    with pool.connection(db_path) as conn:
+        schema = schema_fingerprint(conn)
+        with _adapters_lock:
+            adapter = _adapters.get(schema)
+        if adapter is None:
+            adapter = SchemaAdapter(conn, schema)
+            with _adapters_lock:
+                adapter = _adapters.setdefault(schema, adapter)
+    _databases.put(fingerprint, adapter)
+    return adapter
+
+
+def query(db_path, name, params=()):
+    """Run a compiled analytics query on a pooled connection; returns all rows"""
+    adapter = get_adapter(db_path)
+    with pool.connection(db_path) as conn:
+        return conn.execute(adapter.queries[name], params).fetchall()
@@ -0,0 +1,330 @@
+import json
+import os
+import threading
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.cluster import MiniBatchKMeans
+from sklearn.preprocessing import StandardScaler
+
+from utils.database_utils import database_fingerprint, pool
+from utils.helpers import LRUCache
+from utils.schema_adapter import get_adapter
+
+SEGMENT_DIR = 'database/segments'
+N_SEGMENTS = 5
+FETCH_SIZE = 50_000                     # customers per SQL batch and per partial_fit
+MAX_MODELS = 8                          # fitted models kept in memory
+RANDOM_STATE = 0
+
+# Cluster names from best to worst, given to clusters in order of centroid value
+SEGMENT_NAMES = ['Champions', 'Loyal', 'Promising', 'At Risk', 'Dormant']
+TIER_RANK = {'bronze': 1, 'silver': 2, 'gold': 3, 'platinum': 4}
+
+
+def _days(date_keys):
+    """YYYYMMDD integer keys to days since 1970-01-01"""
+    keys = np.asarray(date_keys, dtype=np.int64)
+    return (pd.to_datetime(keys.astype(str), format='%Y%m%d').values
+            .astype('datetime64[D]').astype(np.int32))
+
+
+class _Codes:
+    """Growing string -> small int code table for tier and location columns"""
+
+    def __init__(self):
+        self.names = []
+        self._index = {}
+
+    def encode(self, values):
+        codes = np.empty(len(values), dtype=np.int16)
+        for i, value in enumerate(values):
+            code = self._index.get(value)
+            if code is None:
+                code = self._index[value] = len(self.names)
+                self.names.append(value)
+            codes[i] = code
+        return codes
+
+
+class SegmentModel:
+    """RFM features and a MiniBatchKMeans segmentation for one database.
+
+    Per-customer state is kept in flat NumPy arrays (about 30 bytes per
+    customer) sorted by customer id. Features are log-scaled frequency and
+    monetary value, recency in days and loyalty tier rank. A fit makes two
+    passes over the stored customers: the scaler sees all of them before
+    any centroid is learned, and is then kept fixed so centroids stay
+    comparable across incremental updates.
+    """
+
+    def __init__(self):
+        self.fingerprint = None
+        self.watermark = 0                  # highest transaction id included
+        self.reference_day = 0              # latest transaction day, days since epoch
+        self.customer_id = np.empty(0, dtype=np.int64)
+        self.last_day = np.empty(0, dtype=np.int32)
+        self.frequency = np.empty(0, dtype=np.int32)
+        self.monetary = np.empty(0, dtype=np.float64)
+        self.tier = np.empty(0, dtype=np.int16)
+        self.location = np.empty(0, dtype=np.int16)
+        self.tiers = _Codes()
+        self.locations = _Codes()
+        self.scaler = StandardScaler()
+        self.kmeans = None
+        self.labels = np.empty(0, dtype=np.int8)
+        self.cluster_segment = []           # cluster index -> segment name
+
+    def __len__(self):
+        return len(self.customer_id)
+
+    def _tier_rank(self, tier_codes):
+        ranks = np.array([TIER_RANK.get(str(name).lower(), 0) for name in self.tiers.names] or [0],
+                         dtype=np.float64)
+        return ranks[tier_codes]
+
+    def _matrix(self, last_day, frequency, monetary, tier_codes):
+        return np.column_stack([
+            (self.reference_day - last_day).astype(np.float64),
+            np.log1p(frequency),
+            np.log1p(np.maximum(monetary, 0)),
+            self._tier_rank(tier_codes),
+        ])
+
+    def _batches(self, conn, sql, params):
+        """Stream (customer_id, last_day, frequency, monetary, tier, location) arrays"""
+        cursor = conn.execute(sql, params)
+        while True:
+            rows = cursor.fetchmany(FETCH_SIZE)
+            if not rows:
+                break
+            ids, last_keys, frequency, monetary, tiers, locations = zip(*rows)
+            yield (np.array(ids, dtype=np.int64), _days(last_keys),
+                   np.array(frequency, dtype=np.int32), np.array(monetary, dtype=np.float64),
+                   self.tiers.encode(tiers), self.locations.encode(locations))
+
+    def _partial_fit(self, matrix):
+        if self.kmeans is None:
+            self.kmeans = MiniBatchKMeans(n_clusters=min(N_SEGMENTS, len(matrix)), n_init=3,
+                                          random_state=RANDOM_STATE)
+        self.kmeans.partial_fit(self.scaler.transform(matrix))
+
+    def fit(self, conn, adapter, max_id, max_date_key):
+        """Fit from scratch in one aggregate pass over the transactions"""
+        self.watermark = max_id
+        self.reference_day = int(_days([max_date_key])[0]) if max_date_key else 0
+        parts = list(self._batches(conn, adapter.sql('rfm_features'), {}))
+        if parts:
+            self._store([np.concatenate(column) for column in zip(*parts)])
+        self._fit_stored()
+        self._relabel()
+
+    def _stored_matrices(self):
+        for start in range(0, len(self), FETCH_SIZE):
+            part = slice(start, start + FETCH_SIZE)
+            yield self._matrix(self.last_day[part], self.frequency[part], self.monetary[part], self.tier[part])
+
+    def _fit_stored(self):
+        """Fit the scaler on every stored customer, then the clusters in the final scaling"""
+        self.scaler = StandardScaler()
+        self.kmeans = None
+        for matrix in self._stored_matrices():
+            self.scaler.partial_fit(matrix)
+        for matrix in self._stored_matrices():
+            self._partial_fit(matrix)
+
+    def update(self, conn, adapter, max_id, max_date_key):
+        """Fold in transactions above the watermark.
+
+        Only customers with new transactions are re-aggregated and fed to
+        partial_fit; recency for everyone else moves with the reference day.
+        """
+        if max_date_key:
+            self.reference_day = max(self.reference_day, int(_days([max_date_key])[0]))
+        added = []
+        for batch in self._batches(conn, adapter.sql('rfm_features_since'), {'after_id': self.watermark}):
+            ids = batch[0]
+            position = np.searchsorted(self.customer_id, ids)
+            position = np.minimum(position, max(len(self.customer_id) - 1, 0))
+            known = (self.customer_id[position] == ids) if len(self.customer_id) else np.zeros(len(ids), bool)
+            for array, values in zip((self.last_day, self.frequency, self.monetary, self.tier, self.location),
+                                     batch[1:]):
+                array[position[known]] = values[known]
+            added.append([column[~known] for column in batch])
+            if self.kmeans is not None:
+                self._partial_fit(self._matrix(batch[1], batch[2], batch[3], batch[4]))
+        if added:
+            current = [self.customer_id, self.last_day, self.frequency, self.monetary, self.tier, self.location]
+            self._store([np.concatenate([column] + [part[i] for part in added])
+                         for i, column in enumerate(current)])
+        if self.kmeans is None:
+            # Nothing was fitted yet (empty database): fit on everything now
+            self._fit_stored()
+        self.watermark = max_id
+        self._relabel()
+
+    def _store(self, columns):
+        order = np.argsort(columns[0], kind='stable')
+        (self.customer_id, self.last_day, self.frequency,
+         self.monetary, self.tier, self.location) = (column[order] for column in columns)
+
+    def _relabel(self):
+        """Assign every customer to its nearest centroid and name the clusters"""
+        self.labels = np.empty(len(self), dtype=np.int8)
+        if self.kmeans is None:
+            self.cluster_segment = []
+            return
+        for start, matrix in zip(range(0, len(self), FETCH_SIZE), self._stored_matrices()):
+            self.labels[start:start + FETCH_SIZE] = self.kmeans.predict(self.scaler.transform(matrix))
+
+        centers = self.kmeans.cluster_centers_
+        value = -centers[:, 0] + centers[:, 1] + centers[:, 2]
+        k = len(centers)
+        self.cluster_segment = [''] * k
+        for rank, cluster in enumerate(np.argsort(-value)):
+            name_index = round(rank * (len(SEGMENT_NAMES) - 1) / (k - 1)) if k > 1 else 0
+            self.cluster_segment[cluster] = SEGMENT_NAMES[name_index]
+
+    def segments_of(self, customer_ids):
+        """Segment name of each customer id; None for customers the model has not seen"""
+        customer_ids = np.asarray(customer_ids, dtype=np.int64)
+        segments = np.full(len(customer_ids), None, dtype=object)
+        if not len(self) or not len(customer_ids):
+            return segments
+        index = np.minimum(np.searchsorted(self.customer_id, customer_ids), len(self) - 1)
+        known = self.customer_id[index] == customer_ids
+        segments[known] = np.array(self.cluster_segment, dtype=object)[self.labels[index[known]]]
+        return segments
+
+    def summary(self):
+        """Customers and average recency, frequency and monetary value per segment"""
+        frame = pd.DataFrame({
+            'segment': np.array(self.cluster_segment, dtype=object)[self.labels] if len(self) else [],
+            'recency_days': self.reference_day - self.last_day,
+            'frequency': self.frequency,
+            'monetary': self.monetary,
+        })
+        summary = frame.groupby('segment').agg(
+            customers=('frequency', 'size'),
+            avg_recency_days=('recency_days', 'mean'),
+            avg_frequency=('frequency', 'mean'),
+            avg_monetary=('monetary', 'mean'),
+            total_monetary=('monetary', 'sum'),
+        )
+        summary['share'] = summary['customers'] / max(len(self), 1)
+        order = [name for name in SEGMENT_NAMES if name in summary.index]
+        return summary.reindex(order).reset_index()
+
+    def customers(self, segment=None, offset=0, limit=100):
+        """One page of customers with their features and segment, by monetary value"""
+        segments = np.array(self.cluster_segment, dtype=object)[self.labels] if len(self) else np.empty(0, object)
+        index = np.flatnonzero(segments == segment) if segment else np.arange(len(self))
+        index = index[np.argsort(-self.monetary[index], kind='stable')][offset:offset + limit]
+        return pd.DataFrame({
+            'customer_id': self.customer_id[index],
+            'segment': segments[index],
+            'recency_days': self.reference_day - self.last_day[index],
+            'frequency': self.frequency[index],
+            'monetary': self.monetary[index],
+            'loyalty_tier': np.array(self.tiers.names, dtype=object)[self.tier[index]] if len(index) else [],
+            'location': np.array(self.locations.names, dtype=object)[self.location[index]] if len(index) else [],
+        })
+
+
+def model_path(fingerprint, segment_dir=SEGMENT_DIR):
+    return os.path.join(segment_dir, f'{fingerprint}.joblib')
+
+
+def _lineage_path(segment_dir):
+    return os.path.join(segment_dir, 'lineage.json')
+
+
+def _previous_fingerprint(db_path, segment_dir):
+    """Fingerprint the latest model for this path was saved under"""
+    try:
+        with open(_lineage_path(segment_dir), encoding='utf-8') as lineage_file:
+            return json.load(lineage_file).get(os.path.abspath(db_path))
+    except (OSError, ValueError):
+        return None
+
+
+def _save(model, db_path, segment_dir):
+    os.makedirs(segment_dir, exist_ok=True)
+    tmp_path = model_path(model.fingerprint, segment_dir) + '.tmp'
+    joblib.dump(model, tmp_path)
+    os.replace(tmp_path, model_path(model.fingerprint, segment_dir))
+    with _lineage_lock:
+        try:
+            with open(_lineage_path(segment_dir), encoding='utf-8') as lineage_file:
+                lineage = json.load(lineage_file)
+        except (OSError, ValueError):
+            lineage = {}
+        previous = lineage.get(os.path.abspath(db_path))
+        lineage[os.path.abspath(db_path)] = model.fingerprint
+        with open(_lineage_path(segment_dir) + '.tmp', 'w', encoding='utf-8') as lineage_file:
+            json.dump(lineage, lineage_file)
+        os.replace(_lineage_path(segment_dir) + '.tmp', _lineage_path(segment_dir))
+        # The model for the file's previous content has been superseded
+        if previous and previous not in lineage.values() and os.path.exists(model_path(previous, segment_dir)):
+            os.remove(model_path(previous, segment_dir))
+
+
+def _load(fingerprint, segment_dir):
+    if fingerprint and os.path.exists(model_path(fingerprint, segment_dir)):
+        return joblib.load(model_path(fingerprint, segment_dir))
+    return None
+
+
+_models = LRUCache(MAX_MODELS)
+_build_locks = {}
+_build_locks_lock = threading.Lock()
+_lineage_lock = threading.Lock()
+
+
+def build_segment_model(db_path, segment_dir=SEGMENT_DIR):
+    """Fit or update the segmentation for a database's current content.
+
+    A model saved for an earlier version of the same file is updated with
+    the transactions added since; otherwise the model is fitted from scratch.
+    """
+    fingerprint = database_fingerprint(db_path)
+    adapter = get_adapter(db_path)
+    with pool.connection(db_path) as conn:
+        max_id, max_date_key = conn.execute(adapter.sql('transaction_range')).fetchone()
+        model = _load(_previous_fingerprint(db_path, segment_dir), segment_dir)
+        if model is not None and model.watermark <= max_id:
+            model.update(conn, adapter, max_id, max_date_key)
+        else:
+            model = SegmentModel()
+            model.fit(conn, adapter, max_id, max_date_key)
+    model.fingerprint = fingerprint
+    _save(model, db_path, segment_dir)
+    return model
+
+
+def get_segment_model(db_path, segment_dir=SEGMENT_DIR):
+    """Segmentation for a database, from memory, disk, or built on first use"""
+    fingerprint = database_fingerprint(db_path)
+    model = _models.get(fingerprint)
+    if model is not None:
+        return model
+
+    with _build_locks_lock:
+        lock = _build_locks.setdefault(fingerprint, threading.Lock())
+    with lock:
+        model = _models.get(fingerprint) or _load(fingerprint, segment_dir)
+        if model is None:
+            model = build_segment_model(db_path, segment_dir)
+        _models.put(fingerprint, model)
+    with _build_locks_lock:
+        _build_locks.pop(fingerprint, None)
+    return model
+
+
+def segment_summary(db_path):
+    return get_segment_model(db_path).summary()
+
+
+def segment_customers(db_path, segment=None, offset=0, limit=100):
+    return get_segment_model(db_path).customers(segment, offset, limit)
@@ -0,0 +1,350 @@
+import math
+import os
+from functools import reduce
+
+import numpy as np
+import pandas as pd
+
+from utils.database_utils import database_fingerprint, pool, read_snapshot
+from utils.helpers import LRUCache, file_lock
+from utils.schema_adapter import get_adapter
+
+SKETCH_SUFFIX = '.sketches.npz'         # sketch file sits next to the database: <db>.sketches.npz
+FETCH_SIZE = 50_000                     # item rows per SQL batch
+MAX_SKETCHES = 8                        # databases' sketches kept in memory
+CAPACITY = 256                          # Space-Saving counters per cell
+CM_WIDTH = 512                          # Count-Min columns: error <= e / width of the cell's total
+CM_DEPTH = 4                            # Count-Min rows: bound holds with probability 1 - exp(-depth)
+MEASURES = ('revenue', 'quantity')
+
+# Multiply-add-shift hashing: odd multipliers and offsets over 64 bits
+_HASH_A, _HASH_B = np.random.default_rng(20250901).integers(0, 1 << 64, size=(2, CM_DEPTH), dtype=np.uint64)
+_HASH_A |= np.uint64(1)
+
+
+class SpaceSaving:
+    """Mergeable Space-Saving summary of the heaviest products by a weight.
+
+    Keeps at most `capacity` products with an upper bound (counts) and the
+    amount it may overstate them by (errors), so each tracked product's
+    true weight is within [counts - errors, counts]. Any product that is
+    not tracked weighs at most `floor`. Two summaries merge by adding the
+    bounds, which is what makes per-store and per-month summaries combine.
+    """
+
+    def __init__(self, capacity=CAPACITY, items=None, counts=None, errors=None, floor=0.0, total=0.0):
+        self.capacity = capacity
+        self.items = np.empty(0, dtype=np.int64) if items is None else items      # sorted product ids
+        self.counts = np.empty(0, dtype=np.float64) if counts is None else counts
+        self.errors = np.empty(0, dtype=np.float64) if errors is None else errors
+        self.floor = floor
+        self.total = total
+
+    @classmethod
+    def exact(cls, items, weights, capacity=CAPACITY):
+        """Summary of a batch of (product, weight) rows, trimmed to capacity"""
+        uniques, inverse = np.unique(items, return_inverse=True)
+        counts = np.bincount(inverse, weights=weights, minlength=len(uniques))
+        summary = cls(capacity, uniques, counts, np.zeros(len(uniques)), 0.0, float(np.sum(weights)))
+        summary._trim()
+        return summary
+
+    def _bounds(self, items):
+        """Upper bound and overstatement for any products, tracked or not"""
+        if not len(self.items):
+            return np.full(len(items), self.floor), np.full(len(items), self.floor)
+        position = np.minimum(np.searchsorted(self.items, items), len(self.items) - 1)
+        tracked = self.items[position] == items
+        return (np.where(tracked, self.counts[position], self.floor),
+                np.where(tracked, self.errors[position], self.floor))
+
+    def _trim(self):
+        if len(self.items) <= self.capacity:
+            return
+        keep = np.zeros(len(self.items), dtype=bool)
+        keep[np.argpartition(-self.counts, self.capacity - 1)[:self.capacity]] = True
+        self.floor = max(self.floor, float(self.counts[~keep].max()))
+        self.items, self.counts, self.errors = self.items[keep], self.counts[keep], self.errors[keep]
+
+    def merge(self, other):
+        items = np.union1d(self.items, other.items)
+        counts, errors = self._bounds(items)
+        other_counts, other_errors = other._bounds(items)
+        merged = SpaceSaving(self.capacity, items, counts + other_counts, errors + other_errors,
+                             self.floor + other.floor, self.total + other.total)
+        merged._trim()
+        return merged
+
+
+class CountMin:
+    """Count-Min sketch of product weights.
+
+    Estimates never understate a product's weight, and overstate it by at
+    most epsilon * total with probability 1 - delta.
+    """
+
+    def __init__(self, width=CM_WIDTH, depth=CM_DEPTH, table=None, total=0.0):
+        self.width = width
+        self.depth = depth
+        self.table = np.zeros((depth, width), dtype=np.float64) if table is None else table
+        self.total = total
+
+    @property
+    def epsilon(self):
+        return math.e / self.width
+
+    @property
+    def delta(self):
+        return math.exp(-self.depth)
+
+    def _buckets(self, items):
+        # The high 32 bits of a * key + b (wrapping at 2^64) are pairwise independent
+        # across keys; taking the low bits instead, as a modulo does, is not
+        keys = np.asarray(items, dtype=np.int64).astype(np.uint64)
+        hashed = (_HASH_A[:self.depth, None] * keys[None, :] + _HASH_B[:self.depth, None]) >> np.uint64(32)
+        return ((hashed * np.uint64(self.width)) >> np.uint64(32)).astype(np.int64)
+
+    def update(self, items, weights):
+        for row, buckets in enumerate(self._buckets(items)):
+            self.table[row] += np.bincount(buckets, weights=weights, minlength=self.width)
+        self.total += float(np.sum(weights))
+
+    def estimate(self, items):
+        if not len(items):
+            return np.empty(0)
+        return self.table[np.arange(self.depth)[:, None], self._buckets(items)].min(axis=0)
+
+    def merge(self, other):
+        return CountMin(self.width, self.depth, self.table + other.table, self.total + other.total)
+
+
+class ProductSketches:
+    """Top-product sketches for one database, one cell per (store, month).
+
+    Every cell holds a Space-Saving summary and a Count-Min sketch for
+    revenue and for quantity (about 30 KB per cell), so any set of stores
+    and months is answered by merging its cells.
+    """
+
+    def __init__(self, capacity=CAPACITY, width=CM_WIDTH, depth=CM_DEPTH):
+        self.capacity = capacity
+        self.width = width
+        self.depth = depth
+        self.fingerprint = None
+        self.cells = {}                 # (store_id, month_key) -> {measure: (SpaceSaving, CountMin)}
+
+    def add(self, store_ids, month_keys, products, measures):
+        """Fold a batch of item rows into their cells"""
+        codes, cells = pd.factorize(pd.MultiIndex.from_arrays([store_ids, month_keys]))
+        order = np.argsort(codes, kind='stable')
+        bounds = np.searchsorted(codes[order], np.arange(len(cells) + 1))
+        for code, key in enumerate(cells):
+            rows = order[bounds[code]:bounds[code + 1]]
+            cell = self.cells.get(key)
+            if cell is None:
+                cell = self.cells[key] = {measure: (SpaceSaving(self.capacity), CountMin(self.width, self.depth))
+                                          for measure in MEASURES}
+            for measure in MEASURES:
+                summary, sketch = cell[measure]
+                weights = measures[measure][rows]
+                sketch.update(products[rows], weights)
+                cell[measure] = (summary.merge(SpaceSaving.exact(products[rows], weights, self.capacity)), sketch)
+
+    def combined(self, by='revenue', store_id=None, months=None):
+        """Merged (SpaceSaving, CountMin) over a store and an inclusive (first, last) month-key range"""
+        low, high = months or (None, None)
+        cells = [cell[by] for (store, month), cell in self.cells.items()
+                 if (store_id is None or store == store_id)
+                 and (low is None or month >= low) and (high is None or month <= high)]
+        empty = (SpaceSaving(self.capacity), CountMin(self.width, self.depth))
+        return reduce(lambda a, b: (a[0].merge(b[0]), a[1].merge(b[1])), cells, empty)
+
+    def top(self, limit=10, by='revenue', store_id=None, months=None):
+        """Estimated top products with bounds; error figures are in the frame's attrs"""
+        summary, sketch = self.combined(by, store_id, months)
+        upper = np.minimum(summary.counts, sketch.estimate(summary.items))
+        lower = summary.counts - summary.errors
+        order = np.argsort(-upper, kind='stable')
+        head = order[:limit]
+        # A product is surely in the top `limit` if nothing outside can outweigh it
+        runner_up = max(upper[order[limit]] if len(order) > limit else 0.0, summary.floor)
+        frame = pd.DataFrame({
+            'product_id': summary.items[head],
+            by: upper[head],
+            'lower_bound': lower[head],
+            'guaranteed': lower[head] >= runner_up,
+        })
+        frame.attrs['error_bounds'] = {
+            'total': summary.total,
+            'untracked_max': summary.floor,
+            'count_min_epsilon': sketch.epsilon,
+            'count_min_delta': sketch.delta,
+            'count_min_max_error': sketch.epsilon * sketch.total,
+            'exact': bool(summary.floor == 0 and not summary.errors.any()),
+        }
+        return frame
+
+    def save(self, path):
+        keys = list(self.cells)
+        arrays = {
+            'fingerprint': np.array(self.fingerprint or ''),
+            'shape': np.array([self.capacity, self.width, self.depth]),
+            'stores': np.array([store for store, _ in keys], dtype=np.int64),
+            'months': np.array([month for _, month in keys], dtype=np.int64),
+        }
+        for measure in MEASURES:
+            items = np.full((len(keys), self.capacity), -1, dtype=np.int64)
+            counts = np.zeros((len(keys), self.capacity))
+            errors = np.zeros((len(keys), self.capacity))
+            for i, key in enumerate(keys):
+                summary = self.cells[key][measure][0]
+                items[i, :len(summary.items)] = summary.items
+                counts[i, :len(summary.items)] = summary.counts
+                errors[i, :len(summary.items)] = summary.errors
+            arrays[f'{measure}_items'] = items
+            arrays[f'{measure}_counts'] = counts
+            arrays[f'{measure}_errors'] = errors
+            arrays[f'{measure}_floor'] = np.array([self.cells[key][measure][0].floor for key in keys])
+            arrays[f'{measure}_total'] = np.array([self.cells[key][measure][0].total for key in keys])
+            arrays[f'{measure}_table'] = np.array([self.cells[key][measure][1].table for key in keys]).reshape(
+                len(keys), self.depth, self.width)
+        tmp_path = path + '.tmp.npz'
+        np.savez(tmp_path, **arrays)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """Saved sketches, or None when the file is missing or from an older layout"""
+        try:
+            arrays = np.load(path)
+        except (OSError, ValueError):
+            return None
+        with arrays:
+            if 'fingerprint' not in arrays.files:
+                return None
+            capacity, width, depth = (int(value) for value in arrays['shape'])
+            sketches = cls(capacity, width, depth)
+            data = {name: arrays[name] for name in arrays.files}
+        sketches.fingerprint = str(data['fingerprint']) or None
+        for i, key in enumerate(zip(data['stores'].tolist(), data['months'].tolist())):
+            cell = sketches.cells[key] = {}
+            for measure in MEASURES:
+                tracked = data[f'{measure}_items'][i] >= 0
+                total = float(data[f'{measure}_total'][i])
+                summary = SpaceSaving(capacity, data[f'{measure}_items'][i][tracked],
+                                      data[f'{measure}_counts'][i][tracked], data[f'{measure}_errors'][i][tracked],
+                                      float(data[f'{measure}_floor'][i]), total)
+                cell[measure] = (summary, CountMin(width, depth, data[f'{measure}_table'][i], total))
+        return sketches
+
+
+def sketch_path(db_path):
+    return os.path.abspath(db_path) + SKETCH_SUFFIX
+
+
+def _lock_path(db_path):
+    return sketch_path(db_path) + '.lock'
+
+
+def _build(db_path):
+    adapter = get_adapter(db_path)
+    sketches = ProductSketches()
+    # Taken before the pass: a commit during it makes the saved sketches stale, not mislabelled
+    sketches.fingerprint = database_fingerprint(db_path)
+    with pool.connection(db_path) as conn, read_snapshot(conn):
+        cursor = conn.execute(adapter.sql('sketch_items'))
+        while True:
+            rows = cursor.fetchmany(FETCH_SIZE)
+            if not rows:
+                break
+            store_ids, month_keys, products, quantity, revenue = zip(*rows)
+            sketches.add(np.array(store_ids, dtype=np.int64), np.array(month_keys, dtype=np.int64),
+                         np.array(products, dtype=np.int64),
+                         {'revenue': np.array(revenue, dtype=np.float64),
+                          'quantity': np.array(quantity, dtype=np.float64)})
+    # Replaces the sketches of the database's previous content
+    sketches.save(sketch_path(db_path))
+    return sketches
+
+
+def build_sketches(db_path):
+    """Sketch a database's item lines in one streaming pass and save them next to it"""
+    with file_lock(_lock_path(db_path)):
+        return _build(db_path)
+
+
+_sketches = LRUCache(MAX_SKETCHES)
+
+
+def get_sketches(db_path):
+    """Sketches for a database, from memory, disk, or built on first use"""
+    fingerprint = database_fingerprint(db_path)
+    sketches = _sketches.get(fingerprint)
+    if sketches is not None:
+        return sketches
+
+    with file_lock(_lock_path(db_path)):
+        sketches = _sketches.get(fingerprint)
+        if sketches is None:
+            sketches = ProductSketches.load(sketch_path(db_path))
+            if sketches is None or sketches.fingerprint != fingerprint:
+                sketches = _build(db_path)
+            _sketches.put(fingerprint, sketches)
+    return sketches
+
+
+def _month_range(start=None, end=None):
+    """(first, last) YYYYMM keys for a date range made of whole months, else None"""
+    first = last = None
+    if start is not None:
+        start = np.datetime64(start, 'D')
+        if start != start.astype('datetime64[M]').astype('datetime64[D]'):
+            return None
+        first = int(str(start)[:7].replace('-', ''))
+    if end is not None:
+        end = np.datetime64(end, 'D')
+        if (end + 1) != (end + 1).astype('datetime64[M]').astype('datetime64[D]'):
+            return None
+        last = int(str(end)[:7].replace('-', ''))
+    return first, last
+
+
+def top_products(db_path, limit=10, by='revenue', store_id=None, start=None, end=None, approximate=True):
+    """Best-selling products, estimated from the sketches.
+
+    Falls back to the exact analytics when approximate is False, when more
+    products are asked for than a summary tracks, or when start/end do not
+    cover whole months (the sketch cells are monthly).
+    """
+    months = _month_range(start, end)
+    if not approximate or by not in MEASURES or limit > CAPACITY or months is None:
+        from utils.analytics import top_products as exact_top_products
+        return exact_top_products(db_path, limit=limit, by=by, store_id=store_id, start=start, end=end)
+
+    frame = get_sketches(db_path).top(limit, by, store_id, months)
+    adapter = get_adapter(db_path)
+    with pool.connection(db_path) as conn:
+        products = pd.read_sql_query(adapter.sql('load_products'), conn)
+    products = products.rename(columns={'id': 'product_id'})[['product_id', 'name', 'category']]
+    result = frame.merge(products, on='product_id', how='left')
+    result.attrs = frame.attrs
+    return result
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Approximate top products from heavy-hitter sketches')
+    parser.add_argument('db_path', help='SQLite database')
+    parser.add_argument('--limit', type=int, default=10)
+    parser.add_argument('--by', choices=MEASURES, default='revenue')
+    parser.add_argument('--store', type=int, help='store id')
+    parser.add_argument('--start', help='first day of the first month, YYYY-MM-01')
+    parser.add_argument('--end', help='last day of the last month')
+    parser.add_argument('--exact', action='store_true', help='compute exactly instead')
+    args = parser.parse_args()
+
+    top = top_products(args.db_path, args.limit, args.by, args.store, args.start, args.end, not args.exact)
+    print(top.to_string(index=False))
+    for key, value in top.attrs.get('error_bounds', {}).items():
+        print(f"📏 {key}: {value}")
@@ -0,0 +1,407 @@
+import sqlite3
+import hashlib
+import json
+import os
+import re
+import shutil
+import stat
+import time
+import uuid
+
+from flask import Blueprint, current_app, jsonify, request
+from werkzeug.formparser import parse_form_data
+
+from utils.database_utils import enable_wal, readonly_uri
+from utils.index_advisor import schedule_optimization
+
+CHUNK_SIZE = 1024 * 1024
+PARTIAL_TTL = 24 * 3600                 # seconds an upload may sit idle before it is swept
+SQLITE_HEADER = b'SQLite format 3\x00'
+
+# Tables (and columns) every uploaded database needs for the analytics.
+# SQLite names are case-insensitive, so both sample schemas match.
+REQUIRED_SCHEMA = {
+    'transactions': {'id', 'customer_id', 'timestamp', 'total_amount', 'store_id'},
+    'transaction_items': {'transaction_id', 'product_id', 'quantity', 'unit_price'},
+    'products': {'id', 'name', 'category'},
+}
+
+UPLOAD_ID_RE = re.compile(r'^[0-9a-f]{32}$')
+
+
+class UploadError(ValueError):
+    """Raised when an upload is incomplete or is not a usable database"""
+
+
+def validate_database(path):
+    """Check the SQLite header and the required schema of a file on disk.
+
+    Only the 100-byte header and sqlite_master are read, so this costs the
+    same for any file size.
+    """
+    with open(path, 'rb') as db_file:
+        header = db_file.read(100)
+    if len(header) < 100 or not header.startswith(SQLITE_HEADER):
+        raise UploadError("File is not an SQLite database")
+    page_size = int.from_bytes(header[16:18], 'big')
+    page_size = 65536 if page_size == 1 else page_size
+    if page_size < 512 or page_size & (page_size - 1):
+        raise UploadError("Invalid SQLite page size")
+
+    try:
+        # immutable: nothing else writes the file yet, and a WAL-mode header
+        # would otherwise leave -wal and -shm files beside it
+        conn = sqlite3.connect(readonly_uri(path) + '&immutable=1', uri=True)
+        try:
+            tables = {name.lower() for (name,) in conn.execute(
+                "SELECT name FROM sqlite_master WHERE type IN ('table', 'view')")}
+            for table, columns in REQUIRED_SCHEMA.items():
+                if table not in tables:
+                    raise UploadError(f"Missing table: {table}")
+                present = {row[1].lower() for row in conn.execute(f'PRAGMA table_info({table})')}
+                missing = columns - present
+                if missing:
+                    raise UploadError(f"Table {table} is missing columns: {', '.join(sorted(missing))}")
+        finally:
+            conn.close()
+    except sqlite3.DatabaseError as e:
+        raise UploadError(f"Unreadable database: {e}")
+
+
+def copy_stream(stream, target, hasher=None, chunk_size=CHUNK_SIZE, limit=None):
+    """Copy a stream to an open file in chunks, hashing as it goes; returns bytes copied"""
+    copied = 0
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        copied += len(chunk)
+        if limit is not None and copied > limit:
+            raise UploadError("Upload exceeds the declared size")
+        target.write(chunk)
+        if hasher is not None:
+            hasher.update(chunk)
+    return copied
+
+
+def hash_file(path, chunk_size=CHUNK_SIZE):
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as source:
+        for chunk in iter(lambda: source.read(chunk_size), b''):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def original_path(upload_folder, content_hash):
+    """The file exactly as uploaded, read-only and never modified"""
+    return os.path.join(upload_folder, '.originals', f'{content_hash}.db')
+
+
+def database_path(upload_folder, content_hash):
+    """The working database derived from an upload, the one the analytics read.
+
+    It starts as a copy of the original and is then changed in place (WAL
+    mode, indexes), so its content no longer matches the hash in its name.
+    """
+    return os.path.join(upload_folder, f'{content_hash}.db')
+
+
+def _derive_database(upload_folder, content_hash):
+    """Create the working database of an upload from its original"""
+    final_path = database_path(upload_folder, content_hash)
+    tmp_path = f'{final_path}.{uuid.uuid4().hex}.tmp'
+    try:
+        shutil.copyfile(original_path(upload_folder, content_hash), tmp_path)
+        # Journal mode is set once here; readers never change the file
+        enable_wal(tmp_path)
+        os.replace(tmp_path, final_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    # Readers use the copy as uploaded until the indexed one is swapped in
+    schedule_optimization(final_path)
+    return final_path
+
+
+def _finalize(upload_folder, tmp_path, content_hash, expected_hash=None):
+    """Validate a fully received file and store it under its content hash.
+
+    The original is kept unchanged under .originals/ and the analytics work
+    on a derived copy, so a re-upload of the same content is deduplicated
+    against bytes that really have that hash.
+    """
+    if expected_hash and expected_hash.lower() != content_hash:
+        os.remove(tmp_path)
+        raise UploadError("Checksum mismatch")
+
+    stored_path = original_path(upload_folder, content_hash)
+    final_path = database_path(upload_folder, content_hash)
+    if os.path.exists(stored_path):
+        # Same content already uploaded: nothing to validate or store
+        os.remove(tmp_path)
+        if not os.path.exists(final_path):
+            _derive_database(upload_folder, content_hash)
+        return {'hash': content_hash, 'path': final_path,
+                'size': os.path.getsize(stored_path), 'deduplicated': True}
+
+    try:
+        validate_database(tmp_path)
+    except UploadError:
+        os.remove(tmp_path)
+        raise
+    os.makedirs(os.path.dirname(stored_path), exist_ok=True)
+    os.chmod(tmp_path, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+    os.replace(tmp_path, stored_path)
+    _derive_database(upload_folder, content_hash)
+    return {'hash': content_hash, 'path': final_path,
+            'size': os.path.getsize(stored_path), 'deduplicated': False}
+
+
+class HashingFile:
+    """A file under .incoming that hashes what is written to it.
+
+    Used as the multipart stream factory, so the form parser writes the
+    uploaded file straight to where it is finalized from, with no spooled
+    copy in between.
+    """
+
+    def __init__(self, upload_folder):
+        incoming = os.path.join(upload_folder, '.incoming')
+        os.makedirs(incoming, exist_ok=True)
+        self.path = os.path.join(incoming, f'{uuid.uuid4().hex}.part')
+        self.hasher = hashlib.sha256()
+        self._file = open(self.path, 'wb+')
+
+    def write(self, data):
+        self.hasher.update(data)
+        return self._file.write(data)
+
+    def __getattr__(self, name):
+        return getattr(self._file, name)
+
+
+def store_multipart(environ, upload_folder, expected_hash=None, max_content_length=None):
+    """Register the 'database' file field of a multipart request body.
+
+    The body is parsed from the WSGI input with a stream factory that
+    writes each file part into .incoming while hashing it, so the file is
+    read from the request once and never held in memory or in a temporary
+    file elsewhere. Other file parts are discarded.
+    """
+    targets = []
+
+    def stream_factory(total_content_length, content_type, filename, content_length=None):
+        targets.append(HashingFile(upload_folder))
+        return targets[-1]
+
+    try:
+        _, _, files = parse_form_data(environ, stream_factory=stream_factory,
+                                      max_content_length=max_content_length)
+        file = files.get('database')
+        if file is None:
+            raise UploadError("Missing 'database' file field")
+        target = file.stream
+        target.close()
+        targets.remove(target)
+        return _finalize(upload_folder, target.path, target.hasher.hexdigest(), expected_hash)
+    finally:
+        for target in targets:
+            target.close()
+            if os.path.exists(target.path):
+                os.remove(target.path)
+
+
+def store_upload(stream, upload_folder, expected_hash=None, chunk_size=CHUNK_SIZE):
+    """Stream a whole upload to disk and register it under its content hash.
+
+    Memory use is one chunk regardless of the file size. Returns a dict with
+    hash, path, size and whether an identical database already existed.
+    """
+    incoming = os.path.join(upload_folder, '.incoming')
+    os.makedirs(incoming, exist_ok=True)
+    tmp_path = os.path.join(incoming, f'{uuid.uuid4().hex}.part')
+    hasher = hashlib.sha256()
+    try:
+        with open(tmp_path, 'wb') as target:
+            copy_stream(stream, target, hasher, chunk_size)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return _finalize(upload_folder, tmp_path, hasher.hexdigest(), expected_hash)
+
+
+# Resumable uploads: the partial file's size is the resume offset, so an
+# interrupted client asks for the offset and continues from there.
+
+def _partial_paths(upload_folder, upload_id):
+    if not UPLOAD_ID_RE.match(upload_id):
+        raise UploadError("Unknown upload")
+    partial = os.path.join(upload_folder, '.partial')
+    return os.path.join(partial, f'{upload_id}.part'), os.path.join(partial, f'{upload_id}.json')
+
+
+def sweep_uploads(upload_folder, ttl=PARTIAL_TTL, now=None):
+    """Remove uploads abandoned for longer than ttl seconds; returns how many files were removed.
+
+    A resumable upload's age is that of its last chunk (the data file's
+    mtime). Files left in .incoming by a worker that died mid-request are
+    swept the same way.
+    """
+    cutoff = (now or time.time()) - ttl
+    partial = os.path.join(upload_folder, '.partial')
+    removed = 0
+    for folder in (partial, os.path.join(upload_folder, '.incoming')):
+        try:
+            entries = list(os.scandir(folder))
+        except FileNotFoundError:
+            continue
+        for entry in entries:
+            try:
+                if not entry.name.endswith('.part') or entry.stat().st_mtime >= cutoff:
+                    continue
+            except FileNotFoundError:
+                continue
+            # A resumable upload's metadata goes with its data
+            paths = [entry.path, entry.path[:-len('.part')] + '.json'] if folder == partial else [entry.path]
+            for path in paths:
+                try:
+                    os.remove(path)
+                    removed += 1
+                except FileNotFoundError:
+                    pass
+    return removed
+
+
+def begin_upload(upload_folder, total_size=None, expected_hash=None):
+    """Start a resumable upload and return its id"""
+    upload_id = uuid.uuid4().hex
+    data_path, meta_path = _partial_paths(upload_folder, upload_id)
+    os.makedirs(os.path.dirname(data_path), exist_ok=True)
+    open(data_path, 'wb').close()
+    with open(meta_path, 'w', encoding='utf-8') as meta_file:
+        json.dump({'total_size': total_size, 'expected_hash': expected_hash,
+                   'created': time.time()}, meta_file)
+    return upload_id
+
+
+def upload_offset(upload_folder, upload_id):
+    """Bytes received so far for a resumable upload"""
+    data_path, _ = _partial_paths(upload_folder, upload_id)
+    if not os.path.exists(data_path):
+        raise UploadError("Unknown upload")
+    return os.path.getsize(data_path)
+
+
+def append_chunk(upload_folder, upload_id, offset, stream, chunk_size=CHUNK_SIZE):
+    """Append a chunk at `offset`; returns the new offset.
+
+    A chunk whose offset does not match what was received is rejected so
+    the client can resume from upload_offset().
+    """
+    data_path, meta_path = _partial_paths(upload_folder, upload_id)
+    current = upload_offset(upload_folder, upload_id)
+    if offset != current:
+        raise UploadError(f"Offset mismatch: expected {current}")
+    with open(meta_path, encoding='utf-8') as meta_file:
+        total_size = json.load(meta_file).get('total_size')
+    limit = total_size - current if total_size is not None else None
+    with open(data_path, 'ab') as target:
+        copy_stream(stream, target, None, chunk_size, limit)
+    return os.path.getsize(data_path)
+
+
+def finish_upload(upload_folder, upload_id):
+    """Hash, validate and register a completed resumable upload"""
+    data_path, meta_path = _partial_paths(upload_folder, upload_id)
+    with open(meta_path, encoding='utf-8') as meta_file:
+        meta = json.load(meta_file)
+    size = upload_offset(upload_folder, upload_id)
+    if meta.get('total_size') is not None and size != meta['total_size']:
+        raise UploadError(f"Upload incomplete: {size} of {meta['total_size']} bytes")
+    try:
+        result = _finalize(upload_folder, data_path, hash_file(data_path), meta.get('expected_hash'))
+    except BaseException:
+        # A rejected upload cannot be resumed; drop what is left of it
+        abort_upload(upload_folder, upload_id)
+        raise
+    os.remove(meta_path)
+    return result
+
+
+def abort_upload(upload_folder, upload_id):
+    for path in _partial_paths(upload_folder, upload_id):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+uploads = Blueprint('uploads', __name__)
+
+
+def _upload_folder():
+    return current_app.config['UPLOAD_FOLDER']
+
+
+def _chunk_size():
+    return current_app.config.get('UPLOAD_CHUNK_SIZE', CHUNK_SIZE)
+
+
+def _sweep():
+    sweep_uploads(_upload_folder(), current_app.config.get('UPLOAD_PARTIAL_TTL', PARTIAL_TTL))
+
+
+@uploads.errorhandler(UploadError)
+def upload_error(error):
+    return jsonify({'error': str(error)}), 400
+
+
+@uploads.route('/upload', methods=['POST'])
+def upload_database():
+    """Single-request upload: a multipart 'database' field or the raw body.
+
+    request.files is never touched, since Werkzeug would spool the whole
+    body to a temporary file of its own before the upload is copied.
+    """
+    expected_hash = request.headers.get('X-Content-SHA256')
+    if request.mimetype == 'multipart/form-data':
+        result = store_multipart(request.environ, _upload_folder(), expected_hash,
+                                 current_app.config.get('MAX_CONTENT_LENGTH'))
+    else:
+        result = store_upload(request.stream, _upload_folder(), expected_hash, _chunk_size())
+    return jsonify(result), 200 if result['deduplicated'] else 201
+
+
+@uploads.route('/uploads', methods=['POST'])
+def create_upload():
+    _sweep()
+    total_size = request.headers.get('Upload-Length', type=int)
+    upload_id = begin_upload(_upload_folder(), total_size, request.headers.get('X-Content-SHA256'))
+    return jsonify({'upload_id': upload_id, 'offset': 0}), 201
+
+
+@uploads.route('/uploads/<upload_id>', methods=['HEAD', 'GET'])
+def get_upload_offset(upload_id):
+    offset = upload_offset(_upload_folder(), upload_id)
+    return jsonify({'upload_id': upload_id, 'offset': offset}), 200, {'Upload-Offset': str(offset)}
+
+
+@uploads.route('/uploads/<upload_id>', methods=['PATCH'])
+def patch_upload(upload_id):
+    offset = request.headers.get('Upload-Offset', type=int)
+    if offset is None:
+        raise UploadError("Upload-Offset header required")
+    new_offset = append_chunk(_upload_folder(), upload_id, offset, request.stream, _chunk_size())
+    return jsonify({'upload_id': upload_id, 'offset': new_offset}), 200, {'Upload-Offset': str(new_offset)}
+
+
+@uploads.route('/uploads/<upload_id>/complete', methods=['POST'])
+def complete_upload(upload_id):
+    result = finish_upload(_upload_folder(), upload_id)
+    return jsonify(result), 200 if result['deduplicated'] else 201
+
+
+@uploads.route('/uploads/<upload_id>', methods=['DELETE'])
+def delete_upload(upload_id):
+    abort_upload(_upload_folder(), upload_id)
+    return '', 204
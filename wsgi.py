@@ -0,0 +1,4 @@
+from app import create_app
+
+# gunicorn entry point: `gunicorn wsgi:app` (settings in gunicorn.conf.py)
+app = create_app()